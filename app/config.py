@@ -19,6 +19,8 @@ DEFAULT_MON_WINDOW    = os.getenv("DEFAULT_MON_WINDOW", "24h")
 
 # matching
 DEFAULT_MODE = os.getenv("DEFAULT_MODE", "exact_strict")
+# як шукати пост у каналі: search — messages.search за токенами needle (з fallback на скан), scan — скан історії
+DEFAULT_FIND_MODE = os.getenv("DEFAULT_FIND_MODE", "search")
 DEFAULT_FUZZ = int(os.getenv("DEFAULT_FUZZ", "85"))
 CASE_SENSITIVE = os.getenv("CASE_SENSITIVE", "false").lower() in ("1", "true", "yes")
 WHOLE_WORD     = os.getenv("WHOLE_WORD", "false").lower() in ("1", "true", "yes")
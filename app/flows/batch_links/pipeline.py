@@ -0,0 +1,196 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from app.utils.formatting import fmt_result_line
+from app.services.joiner import probe_channel_id, ensure_join, join_family
+from app.services.account_pool import (
+    ClientSlot, iter_pool_clients, acquire, release, bump_cooldown, mark_flood, mark_limit,
+)
+from app.services.membership_db import (
+    FINAL_PER_ACC, upsert_membership, get_membership, any_final_for_channel, url_put,
+)
+from app.services.link_queue import enqueue_async as lq_enqueue
+from .common import display_name
+from .plan import PlannedLink
+
+log = logging.getLogger("flow.batch_links.pipeline")
+
+# скільки чекати на вільний акаунт для лінка, перш ніж віддати його у link_queue
+BATCH_LEASE_TIMEOUT = float(os.getenv("BATCH_LEASE_TIMEOUT", "120"))
+# 0 — по одному воркеру на кожен слот пулу
+BATCH_PIPELINE_WORKERS = int(os.getenv("BATCH_PIPELINE_WORKERS", "0") or "0")
+
+# статус ensure_join -> статус для DebouncedProgress
+_PROGRESS = {
+    "joined": "joined",
+    "already": "already",
+    "requested": "already",  # успішне завершення без join
+    "invalid": "invalid",
+    "private": "invalid",
+}
+
+
+@dataclass
+class _Item:
+    idx: int
+    url: str
+    channel_id: Optional[int] = None
+    probed: bool = False
+    tried: Set[str] = field(default_factory=set)   # slot.name, що вже пробували цей лінк
+    line: Optional[str] = None                      # останній проміжний результат
+    progress: str = "invalid"                       # статус для прогресу, якщо акаунти закінчились
+
+
+class _Batch:
+    """
+    Спільний стан одного пакета: черга лінків, результати за індексом і прогрес.
+    Кожен воркер бере з черги лінк і орендує найраніше вільний акаунт; темп кожного
+    акаунта тримають його власні відра rate_limiter (замість глобального sleep).
+    """
+
+    def __init__(self, progress, results: List[Optional[str]]):
+        self.progress = progress
+        self.results = results
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.overflow: List[_Item] = []
+
+    def finish(self, item: _Item, line: str, status: str) -> None:
+        self.results[item.idx - 1] = line
+        self.progress.add_status(status)
+
+    async def worker(self) -> None:
+        while True:
+            item = await self.queue.get()
+            try:
+                await self._handle(item)
+            except Exception as e:
+                log.exception("pipeline item failed: %s: %s", item.url, e)
+                self.finish(item, fmt_result_line(item.idx, item.url, "temp", extra=str(e)), "error")
+            finally:
+                self.queue.task_done()
+
+    async def _handle(self, item: _Item) -> None:
+        pool_names = {s.name for s in iter_pool_clients()}
+        if pool_names and pool_names <= item.tried:
+            # усі акаунти вже пробували — фіксуємо останній проміжний результат
+            line = item.line or fmt_result_line(item.idx, item.url, "waiting")
+            self.finish(item, line, item.progress)
+            return
+
+        slot = await acquire(timeout=BATCH_LEASE_TIMEOUT, exclude=item.tried, family=join_family(item.url))
+        if slot is None:
+            self.overflow.append(item)
+            return
+
+        try:
+            await self._attempt(slot, item)
+        finally:
+            release(slot)
+
+    async def _attempt(self, slot: ClientSlot, item: _Item) -> None:
+        """
+        Одна спроба лінка одним акаунтом (темп RPC тримає rate_limiter у joiner).
+        Якщо лінк треба віддати іншому акаунту — повертає його у чергу.
+        """
+        client = slot.client
+        who = display_name(slot)
+        url, idx = item.url, item.idx
+        self.progress.set_current(url, actor=who)
+
+        if not item.probed:
+            item.probed = True
+            try:
+                cid, _, _, _ = await probe_channel_id(client, url)
+                item.channel_id = cid
+            except Exception:
+                item.channel_id = None
+
+            if item.channel_id is not None:
+                final = any_final_for_channel(item.channel_id)
+                if final:
+                    self.finish(item, fmt_result_line(idx, url, "cached", extra=final),
+                                "already" if final in ("joined", "already") else "invalid")
+                    return
+
+        if item.channel_id is not None and get_membership(who, item.channel_id) in FINAL_PER_ACC:
+            item.tried.add(slot.name)
+            self.queue.put_nowait(item)
+            return
+
+        status, title, kind, cid_after, _ = await ensure_join(client, url)
+        cid_eff = item.channel_id or cid_after
+
+        if cid_eff is not None and status in FINAL_PER_ACC:
+            upsert_membership(who, cid_eff, status)
+        if cid_eff is None and status in ("joined", "already", "requested", "invalid", "private"):
+            url_put(url, status)
+
+        if status in _PROGRESS:
+            self.finish(item, fmt_result_line(idx, url, status, who), _PROGRESS[status])
+            if status == "joined":
+                bump_cooldown(slot, 8 if kind == "invite" else 3)
+            elif status == "requested":
+                bump_cooldown(slot, 6)
+            return
+
+        if status == "blocked":
+            item.line = fmt_result_line(idx, url, "blocked", who)
+            item.progress = "invalid"
+        elif status == "too_many":
+            item.line = fmt_result_line(idx, url, "too_many", who)
+            item.progress = "invalid"
+            mark_limit(slot, days=2)
+        elif isinstance(status, str) and status.startswith("flood_wait"):
+            try:
+                sec = int(str(status).split("_")[-1])
+            except Exception:
+                sec = 60
+            item.line = fmt_result_line(idx, url, "flood_wait", who, extra=f"{sec}s")
+            item.progress = "flood_wait"
+            mark_flood(client, sec)
+        else:
+            item.line = fmt_result_line(idx, url, "temp", who, extra=status)
+            item.progress = "error"
+
+        # цей акаунт не впорався — віддаємо лінк іншим
+        item.tried.add(slot.name)
+        self.queue.put_nowait(item)
+
+
+async def process_links_pipeline(message, pending: List[PlannedLink], progress,
+                                 results: List[Optional[str]]) -> None:
+    """
+    Конкурентний режим process_links: N воркерів (по одному на акаунт пулу) розбирають
+    мережну частину плану паралельно, кожен акаунт — у власному темпі (rate_limiter).
+    Рядки пишуться у results за індексом лінка, тож порядок звіту зберігається.
+    """
+    batch = _Batch(progress, results)
+    for p in pending:
+        # probe потрібен лише публічним лінкам із невідомим channel_id
+        probed = not (p.kind == "public" and p.channel_id is None)
+        batch.queue.put_nowait(_Item(p.idx, p.url, channel_id=p.channel_id, probed=probed))
+
+    n_workers = BATCH_PIPELINE_WORKERS or len(iter_pool_clients())
+    n_workers = max(1, min(n_workers, batch.queue.qsize() or 1))
+    log.info("pipeline start: links=%d workers=%d", batch.queue.qsize(), n_workers)
+
+    workers = [asyncio.create_task(batch.worker()) for _ in range(n_workers)]
+    try:
+        await batch.queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    if batch.overflow:
+        rest = [it.url for it in sorted(batch.overflow, key=lambda it: it.idx)]
+        added, _ = await lq_enqueue(
+            rest, batch_id=f"batch:{message.id}",
+            origin_chat=message.chat_id, origin_msg=message.id
+        )
+        log.info("pipeline overflow: %d links -> link_queue (added=%d)", len(rest), added)
+        for it in batch.overflow:
+            batch.finish(it, fmt_result_line(it.idx, it.url, "waiting", extra="— у черзі"), "flood_wait")
@@ -0,0 +1,89 @@
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.services import entity_cache
+from app.services.joiner import extract_invite_hash
+from app.services.membership_db import final_for_channels, map_invite_get_many, url_get_many
+from app.utils.tg_links import username_from_url
+
+log = logging.getLogger("flow.batch_links.plan")
+
+URL_FINAL = ("joined", "already", "requested", "invalid", "private")
+
+
+@dataclass
+class PlannedLink:
+    idx: int
+    url: str
+    kind: str                          # 'public' | 'invite'
+    channel_id: Optional[int] = None
+    status: Optional[str] = None       # для final: 'duplicate' або кешований статус
+    invite_hash: Optional[str] = None
+
+    @property
+    def progress_status(self) -> str:
+        """Статус для DebouncedProgress.add_status (лише для final)."""
+        return "already" if self.status in ("duplicate", "joined", "already") else "invalid"
+
+
+@dataclass
+class LinkPlan:
+    final: List[PlannedLink] = field(default_factory=list)  # відомо локально — мережа не потрібна
+    probe: List[PlannedLink] = field(default_factory=list)  # треба дізнатись channel_id (get_entity)
+    join: List[PlannedLink] = field(default_factory=list)   # channel_id відомий або не потрібен — одразу join
+
+    def pending(self) -> List[PlannedLink]:
+        """probe + join у порядку пакета."""
+        return sorted(self.probe + self.join, key=lambda p: p.idx)
+
+
+def build_plan(links: List[str]) -> LinkPlan:
+    """
+    Класифікує весь пакет за локальним станом кількома пакетними запитами
+    (url_cache, invite_map, membership) — до будь-яких звернень до Telegram.
+    """
+    plan = LinkPlan()
+    seen: set[str] = set()
+    items: List[PlannedLink] = []
+    for idx, url in enumerate(links, start=1):
+        if url in seen:
+            plan.final.append(PlannedLink(idx, url, "public", status="duplicate"))
+            continue
+        seen.add(url)
+        h = extract_invite_hash(url)
+        items.append(PlannedLink(idx, url, "invite" if h else "public", invite_hash=h))
+
+    url_st = url_get_many(p.url for p in items)
+    invites = map_invite_get_many(p.invite_hash for p in items if p.invite_hash)
+    unames = {p.idx: username_from_url(p.url) for p in items if not p.invite_hash}
+    resolved = entity_cache.channel_ids_many(unames.values())
+    for p in items:
+        if p.invite_hash:
+            p.channel_id = invites.get(p.invite_hash)
+        elif unames.get(p.idx) in resolved:
+            p.channel_id = resolved[unames[p.idx]]
+            if p.channel_id is None:
+                p.status = "invalid"  # негативний кеш: username не зайнятий
+    finals = final_for_channels(p.channel_id for p in items if p.channel_id is not None)
+
+    for p in items:
+        st = url_st.get(p.url)
+        if p.status == "invalid":
+            plan.final.append(p)
+        elif st in URL_FINAL:
+            p.status = st
+            plan.final.append(p)
+        elif p.channel_id is not None and finals.get(p.channel_id):
+            p.status = finals[p.channel_id]
+            plan.final.append(p)
+        elif p.kind == "invite" or p.channel_id is not None:
+            # інвайт (probe лише локальний) або канал уже відомий з entity_cache — одразу у join
+            plan.join.append(p)
+        else:
+            plan.probe.append(p)
+
+    plan.final.sort(key=lambda p: p.idx)
+    log.info("plan: total=%d final=%d probe=%d join=%d",
+             len(links), len(plan.final), len(plan.probe), len(plan.join))
+    return plan
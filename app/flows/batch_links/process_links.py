@@ -1,31 +1,33 @@
+import os
 import logging
 from typing import List, Optional
 
 from app.plugins.progress_live import DebouncedProgress
 from app.utils.link_parser import extract_links
-from app.utils.throttle import throttle_between_links
 from app.utils.formatting import fmt_result_line, fmt_summary
 from app.services.joiner import probe_channel_id, ensure_join
 from app.services.account_pool import (
     iter_pool_clients, bump_cooldown, mark_flood, mark_limit,
 )
 from app.services.membership_db import (
-    upsert_membership, get_membership, any_final_for_channel, url_get, url_put,
+    upsert_membership, get_membership, any_final_for_channel, url_put,
 )
-from app.services.link_queue import enqueue as lq_enqueue
+from app.services.link_queue import enqueue_async as lq_enqueue
 from .common import display_name
+from .pipeline import process_links_pipeline
+from .plan import PlannedLink, build_plan
 
 log = logging.getLogger("flow.batch_links.process")
 
+# 1 — паралельний конвеєр по акаунтах пулу (див. pipeline.py), 0 — послідовний обхід
+BATCH_PIPELINE = os.getenv("BATCH_PIPELINE", "1").lower() in ("1", "true", "yes")
+
 async def process_links(message, text: str):
     links = extract_links(text)
     if not links:
         await message.reply("❌ Посилань не знайдено")
         return
 
-    used: set[str] = set()
-    results: List[str] = []
-
     progress = DebouncedProgress(
         client=message.client,
         peer=message.chat_id,
@@ -35,57 +37,65 @@ async def process_links(message, text: str):
     await progress.start()
     log.info("batch start: raw=%d uniq=%d", len(links), len(set(links)))
 
+    # 1) класифікація за локальним станом — без мережі і без пауз
+    plan = build_plan(links)
+    results: List[Optional[str]] = [None] * len(links)
+    for p in plan.final:
+        if p.status == "duplicate":
+            results[p.idx - 1] = fmt_result_line(p.idx, p.url, "duplicate")
+        else:
+            results[p.idx - 1] = fmt_result_line(p.idx, p.url, "cached", extra=p.status)
+        progress.add_status(p.progress_status)
+
+    # 2) мережна частина: probe + join
+    pending = plan.pending()
+    if pending:
+        if BATCH_PIPELINE and iter_pool_clients():
+            await process_links_pipeline(message, pending, progress, results)
+        else:
+            await _process_sequential(message, pending, progress, results)
+
+    lines = [r for r in results if r]
+    await progress.finish(footer=fmt_summary(lines[-10:]))
+    log.info("batch done: total=%d uniq=%d", len(links), len(set(links)))
+
+async def _process_sequential(message, pending: List[PlannedLink], progress, results: List[Optional[str]]):
     probe_client = None
     slots_probe = list(iter_pool_clients())
     if slots_probe:
         probe_client = getattr(slots_probe[0], "client", slots_probe[0])
 
-    for idx, url in enumerate(links, start=1):
+    for n, p in enumerate(pending):
+        idx, url = p.idx, p.url
         progress.set_current(url)
 
-        if url in used:
-            results.append(fmt_result_line(idx, url, "duplicate"))
-            progress.add_status("already")
-            await throttle_between_links(None, url)
-            continue
-        used.add(url)
-
-        channel_id: Optional[int] = None
-        if probe_client is not None:
+        channel_id: Optional[int] = p.channel_id
+        if channel_id is None and p.kind == "public" and probe_client is not None:
             try:
                 cid, _, _, _ = await probe_channel_id(probe_client, url)
                 channel_id = cid
             except Exception:
                 channel_id = None
 
-        if channel_id is not None:
-            final = any_final_for_channel(channel_id)
-            if final:
-                results.append(fmt_result_line(idx, url, "cached", extra=final))
-                progress.add_status("already" if final in ("joined", "already") else "invalid")
-                await throttle_between_links(None, url)
-                continue
-        else:
-            ust = url_get(url)
-            if ust in ("joined", "already", "requested", "invalid", "private"):
-                results.append(fmt_result_line(idx, url, "cached", extra=ust))
-                progress.add_status("already" if ust in ("joined", "already") else "invalid")
-                await throttle_between_links(None, url)
-                continue
+            if channel_id is not None:
+                final = any_final_for_channel(channel_id)
+                if final:
+                    results[idx - 1] = fmt_result_line(idx, url, "cached", extra=final)
+                    progress.add_status("already" if final in ("joined", "already") else "invalid")
+                    continue
 
         slots = list(iter_pool_clients())
         if not slots:
-            rest = [url] + [u for u in links[idx:] if u not in used]
-            added = lq_enqueue(
+            rest = [q.url for q in pending[n:]]
+            added, _ = await lq_enqueue(
                 rest, batch_id=f"batch:{message.id}",
                 origin_chat=message.chat_id, origin_msg=message.id
             )
-            results.append(f"{idx}. {url} — 💤 Немає вільних акаунтів; додано у чергу: {added} URL")
+            results[idx - 1] = f"{idx}. {url} — 💤 Немає вільних акаунтів; додано у чергу: {added} URL"
             progress.add_status("flood_wait")
             break
 
         line = None
-        last_kind = None
 
         for slot in slots:
             client = getattr(slot, "client", slot)
@@ -98,7 +108,6 @@ async def process_links(message, text: str):
                     continue
 
             status, title, kind, cid_after, _ = await ensure_join(client, url)
-            last_kind = kind
             cid_eff = channel_id or cid_after
 
             if cid_eff is not None and status in ("joined","already","requested","invalid","private","blocked","too_many"):
@@ -166,8 +175,4 @@ async def process_links(message, text: str):
         if not line:
             line = fmt_result_line(idx, url, "waiting")
 
-        results.append(line)
-        await throttle_between_links(last_kind, url)
-
-    await progress.finish(footer=fmt_summary(results[-10:]))
-    log.info("batch done: total=%d uniq=%d", len(links), len(set(links)))
\ No newline at end of file
+        results[idx - 1] = line
\ No newline at end of file
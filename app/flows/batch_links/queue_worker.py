@@ -1,107 +1,181 @@
+import os
+import time
+import socket
+import asyncio
 import logging
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, Set
 
-from app.utils.throttle import throttle_between_links
-from app.services.joiner import probe_channel_id, ensure_join
+from app.services.joiner import probe_channel_id, ensure_join, join_family
 from app.services.account_pool import (
-    iter_pool_clients, mark_flood, mark_limit, session_name as _session_name,
+    ClientSlot, account_key, iter_pool_clients, ready_slots, wait_ready, acquire, release,
+    mark_flood, mark_limit,
 )
 from app.services.membership_db import (
-    upsert_membership, get_membership, any_final_for_channel, url_get, url_put,
+    FINAL_PER_ACC, upsert_membership, get_membership, any_final_for_channel, url_get, url_put,
 )
 from app.services.link_queue import (
-    fetch_due as lq_fetch_due, mark_processing as lq_mark_processing,
+    claim_due as lq_claim_due, extend_claim as lq_extend_claim, reap_expired as lq_reap_expired,
     mark_done as lq_mark_done, mark_failed as lq_mark_failed,
+    next_due_ts as lq_next_due_ts, wait_for_work as lq_wait_for_work,
 )
 
 log = logging.getLogger("flow.batch_links.worker")
 
-async def run_link_queue_worker(client):
-    log.info("link_queue worker started")
+# верхня межа сну без подій (страховка від загублених сигналів)
+LQ_IDLE_MAX = float(os.getenv("LQ_IDLE_MAX", "300"))
+# скільки паралельних воркерів-корутин розбирають чергу в цьому процесі
+LQ_WORKERS = int(os.getenv("LQ_WORKERS", "2") or "2")
+# як часто reaper повертає прострочені claim-и у queued
+LQ_REAP_INTERVAL = float(os.getenv("LQ_REAP_INTERVAL", "60"))
+# скільки чекати на вільний акаунт для взятого запису
+LQ_SLOT_WAIT = float(os.getenv("LQ_SLOT_WAIT", "60"))
+
+
+@dataclass
+class _Job:
+    item_id: int
+    url: str
+    owner: str
+    channel_id: Optional[int] = None
+    probed: bool = False
+    tried: Set[str] = field(default_factory=set)  # slot.name, що вже пробували
+
+
+async def run_link_queue_worker(client, workers: int = LQ_WORKERS):
+    """
+    Запускає `workers` корутин, що паралельно забирають записи link_queue атомарним claim-ом,
+    і reaper, який повертає у чергу записи з простроченою орендою (напр. після падіння процесу).
+    """
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    n = max(1, int(workers))
+    log.info("link_queue worker started: workers=%d owner=%s:*", n, prefix)
+    tasks = [asyncio.create_task(_reaper())]
+    tasks += [asyncio.create_task(_worker_loop(f"{prefix}:{i}")) for i in range(n)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+
+async def _reaper():
     while True:
         try:
-            slots_now = list(iter_pool_clients())
-            if not slots_now:
-                await _sleep(5); continue
+            n = lq_reap_expired()
+            if n:
+                log.warning("link_queue reaper: %d expired claims returned to queue", n)
+        except Exception as e:
+            log.exception("link_queue reaper error: %s", e)
+        await asyncio.sleep(LQ_REAP_INTERVAL)
+
+async def _worker_loop(owner: str):
+    while True:
+        try:
+            if not ready_slots():
+                # спимо до next_ready найранішого слоту (або доки слот повернуть/додадуть)
+                await wait_ready(timeout=LQ_IDLE_MAX); continue
 
-            items = lq_fetch_due(limit=10)
+            items = lq_claim_due(owner, limit=1)
             if not items:
-                await _sleep(3); continue
+                # спимо до найближчого next_try_ts або до сигналу enqueue
+                due = lq_next_due_ts()
+                timeout = LQ_IDLE_MAX if due is None else min(LQ_IDLE_MAX, max(0.0, due - time.time()))
+                reason = await lq_wait_for_work(timeout)
+                log.debug("link_queue worker %s woke up: %s", owner, reason)
+                continue
 
             for item_id, url, tries, origin_chat, origin_msg in items:
-                lq_mark_processing(item_id)
-
-                channel_id: Optional[int] = None
-                try:
-                    cid, _, _, _ = await probe_channel_id(getattr(slots_now[0], "client", slots_now[0]), url)
-                    channel_id = cid
-                except Exception:
-                    channel_id = None
-
-                if channel_id is not None:
-                    final = any_final_for_channel(channel_id)
-                    if final:
-                        lq_mark_done(item_id); continue
-                else:
-                    ust = url_get(url)
-                    if ust in ("joined","already","requested","invalid","private"):
-                        lq_mark_done(item_id); continue
-
-                slots_now = list(iter_pool_clients())
-                if not slots_now:
-                    lq_mark_failed(item_id, "no_slots", backoff_sec=15, max_retries=20); continue
-
-                processed = False
-                last_kind = None
-
-                for slot in slots_now:
-                    cli = getattr(slot, "client", slot)
-                    who = _session_name(cli)
-
-                    if channel_id is not None:
-                        acc_status = get_membership(who, channel_id)
-                        if acc_status in ("joined","already","requested","invalid","private","blocked","too_many"):
-                            continue
-
-                    status, title, kind, cid_after, _ = await ensure_join(cli, url)
-                    last_kind = kind
-                    cid_eff = channel_id or cid_after
-
-                    if cid_eff is not None and status in ("joined","already","requested","invalid","private","blocked","too_many"):
-                        upsert_membership(who, cid_eff, status)
-
-                    if cid_eff is None and status in ("joined","already","requested","invalid","private"):
-                        url_put(url, status)
-
-                    if status in ("already","joined","requested","invalid","private"):
-                        lq_mark_done(item_id)
-                        processed = True
-                        await throttle_between_links(last_kind, url)
-                        break
-                    elif status == "blocked":
-                        continue
-                    elif status == "too_many":
-                        try: mark_limit(slot, days=2)
-                        except Exception: pass
-                        continue
-                    elif isinstance(status, str) and status.startswith("flood_wait"):
-                        try: sec = int(str(status).split("_")[-1])
-                        except Exception: sec = 60
-                        try: mark_flood(cli, int(sec))
-                        except Exception: pass
-                        continue
-                    else:
-                        lq_mark_failed(item_id, f"temp:{status}", backoff_sec=20, max_retries=20)
-                        processed = True
-                        break
-
-                if not processed:
-                    lq_mark_failed(item_id, "no_slot_processed", backoff_sec=30, max_retries=20)
+                await _process(_Job(item_id=item_id, url=url, owner=owner))
 
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             log.exception("link_queue worker loop error: %s", e)
             await _sleep(5)
 
+async def _process(job: _Job):
+    """
+    Обробляє взятий запис: орендує акаунти по черзі, доки хтось не дасть фінальний статус.
+    """
+    while True:
+        slot = await acquire(timeout=LQ_SLOT_WAIT, exclude=job.tried, family=join_family(job.url))
+        if slot is None:
+            reason = "no_slot_processed" if job.tried else "no_slots"
+            lq_mark_failed(job.item_id, reason, backoff_sec=30, max_retries=20, owner=job.owner)
+            return
+        if not lq_extend_claim(job.item_id, job.owner):
+            release(slot)
+            log.warning("link_queue claim lost: id=%s url=%s", job.item_id, job.url)
+            return
+
+        finished = False
+        try:
+            finished = await _attempt(slot, job)
+        finally:
+            release(slot)
+        if finished:
+            return
+
+        job.tried.add(slot.name)
+        pool_names = {s.name for s in iter_pool_clients()}
+        if pool_names <= job.tried:
+            lq_mark_failed(job.item_id, "no_slot_processed", backoff_sec=30, max_retries=20, owner=job.owner)
+            return
+
+async def _attempt(slot: ClientSlot, job: _Job) -> bool:
+    """
+    Одна спроба запису одним акаунтом. Повертає True, якщо запис завершено (done/failed).
+    """
+    cli = slot.client
+    who = account_key(slot)   # ключ membership — як у pipeline/membership_sync/subscription_check
+    url = job.url
+
+    if not job.probed:
+        job.probed = True
+        try:
+            cid, _, _, _ = await probe_channel_id(cli, url)
+            job.channel_id = cid
+        except Exception:
+            job.channel_id = None
+
+        if job.channel_id is not None:
+            if any_final_for_channel(job.channel_id):
+                lq_mark_done(job.item_id, owner=job.owner); return True
+        else:
+            ust = url_get(url)
+            if ust in ("joined","already","requested","invalid","private"):
+                lq_mark_done(job.item_id, owner=job.owner); return True
+
+    if job.channel_id is not None and get_membership(who, job.channel_id) in FINAL_PER_ACC:
+        return False
+
+    status, title, kind, cid_after, _ = await ensure_join(cli, url)
+    cid_eff = job.channel_id or cid_after
+
+    if cid_eff is not None and status in FINAL_PER_ACC:
+        upsert_membership(who, cid_eff, status)
+
+    if cid_eff is None and status in ("joined","already","requested","invalid","private"):
+        url_put(url, status)
+
+    if status in ("already","joined","requested","invalid","private"):
+        lq_mark_done(job.item_id, owner=job.owner)
+        return True
+    elif status == "blocked":
+        return False
+    elif status == "too_many":
+        try: mark_limit(slot, days=2)
+        except Exception: pass
+        return False
+    elif isinstance(status, str) and status.startswith("flood_wait"):
+        try: sec = int(str(status).split("_")[-1])
+        except Exception: sec = 60
+        try: mark_flood(cli, int(sec))
+        except Exception: pass
+        return False
+    else:
+        lq_mark_failed(job.item_id, f"temp:{status}", backoff_sec=20, max_retries=20, owner=job.owner)
+        return True
+
 async def _sleep(sec: int):
-    import asyncio
-    await asyncio.sleep(sec)
\ No newline at end of file
+    await asyncio.sleep(sec)
@@ -5,6 +5,8 @@ from telethon import events
 
 from app.services.membership_db import init as memb_init
 from app.services.link_queue import init as lq_init
+from app.services.membership_sync import MEMB_SYNC_ON_START, sync_pool
+from app.services.account_pool import iter_pool_clients, on_register
 from app.flows.batch_links import process_links, run_link_queue_worker
 
 log = logging.getLogger("plugin.batch_links")
@@ -46,6 +48,17 @@ def setup(client, control_peer=None, monitor_buffer=None, **kwargs):
             return
         await evt.reply(f"ℹ️ monitor_links: {'ON' if _MONITOR_ENABLED else 'OFF'}; chat={_MONITOR_CHAT_ID}")
 
+    @client.on(events.NewMessage(pattern=r'^/sync_membership$'))
+    async def _sync(evt):
+        if _CONTROL_PEER_ID is not None and evt.chat_id != _CONTROL_PEER_ID:
+            return
+        msg = await evt.reply("🔄 Синхронізую membership із діалогів акаунтів…")
+        res = await sync_pool()
+        ok = {k: v for k, v in res.items() if "error" not in v}
+        lines = [f"• {k}: каналів {v['channels']}, username {v['usernames']}" for k, v in sorted(ok.items())]
+        lines += [f"• {k}: ⚠️ помилка" for k in sorted(set(res) - set(ok))]
+        await msg.edit("✅ membership синхронізовано\n" + ("\n".join(lines) or "пул порожній"))
+
     @client.on(events.NewMessage())
     async def _msg(evt):
         if _CONTROL_PEER_ID is not None and evt.chat_id != _CONTROL_PEER_ID:
@@ -68,4 +81,16 @@ def setup(client, control_peer=None, monitor_buffer=None, **kwargs):
     except Exception:
         asyncio.create_task(run_link_queue_worker(client))
 
+    if MEMB_SYNC_ON_START:
+        # після цього build_plan відсіює канали, де пул уже є, без жодного RPC.
+        # Акаунти, що під'єднаються пізніше (POOL_START_WAIT=0, фонові ретраї), —
+        # синхронізуються, щойно потрапляють у пул.
+        on_register(lambda slot: sync_pool([slot]))
+        slots = iter_pool_clients()
+        if slots:
+            try:
+                client.loop.create_task(sync_pool(slots))
+            except Exception:
+                asyncio.create_task(sync_pool(slots))
+
     log.info("batch_links plugin loaded")
\ No newline at end of file
@@ -8,6 +8,7 @@ HELP_TEXT_MD = """\
 - `/monitor_links_on` — увімкнути збір посилань (просто кидай повідомлення з лінками)
 - `/monitor_links_off` — вимкнути збір та показати скільки назбирали
 - `/debug_links` — показати зібрані посилання
+- `/sync_membership` — оновити membership з діалогів усіх акаунтів пулу
 
 *Needle (пост для пошуку)*
 - `/needle_from_reply` — зроби *reply* на повідомлення з текстом/фото (підпис) — збережемо як needle
@@ -15,9 +16,13 @@ HELP_TEXT_MD = """\
 - `/needle_clear` — очистити needle
 
 *Моніторинг*
-- `/mon_new owner=@username cpm=120` — створити монітор із поточних зібраних лінків + needle
-- `/mon_start` — запустити монітор (перевіряє кожну годину протягом вікна)
+- `/mon_new owner=@username cpm=120 [mode=...] [find=search|scan]` — створити монітор із поточних зібраних лінків + needle
+- `/mon_start` — запустити монітори: перегляди знайдених постів кожен mon_interval (1 запит на канал, до 100 постів)
+- `/mon_views id=1 [h=24]` — перегляди знайдених постів монітора на N-ту годину після публікації (з часового ряду)
 - `/mon_status` — поточний стан: де вийшло/видалено/охоплення
+- `/arm_job id=1 find_interval=30m find_window=72h mon_interval=1h mon_window=24h [mode=...] [fuzz=85]` — розклад монітора: пошук поста, потім перегляди (переживає рестарт)
+- `/jobs` — черга планувальника: скільки задач, найближчий запуск, відкладені через бюджет RPC
+- `/find_stats` — скільки RPC/трафіку зекономив пошук (search) проти скану історії
 
 *Технічне*
 - `/help` — показати цю довідку
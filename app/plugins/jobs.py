@@ -0,0 +1,86 @@
+# app/plugins/jobs.py
+# /arm_job — озброєння монітора в персистентному планувальнику (find + mon задачі);
+# /jobs — стан черги. Планувальник стартує разом із ботом і піднімає задачі з БД.
+import re
+import time
+import logging
+from telethon import events
+
+from app.config import DEFAULT_FIND_INTERVAL, DEFAULT_FIND_WINDOW, DEFAULT_MON_INTERVAL, DEFAULT_MON_WINDOW
+from app.services import monitor_db
+from app.services.job_scheduler import SCHEDULER, SCHED_RPC_BUDGET
+from app.services.monitor_jobs import arm_monitor
+from app.services.needle_matcher import MODES
+from app.utils.durations import parse_duration
+
+log = logging.getLogger("plugin.jobs")
+
+
+def _arg(args: str, name: str):
+    m = re.search(rf"\b{name}=(\S+)", args)
+    return m.group(1) if m else None
+
+
+def setup(client, control_peer, monitor_buffer):
+    dec_filter = {}
+    if control_peer:
+        dec_filter = dict(from_users=control_peer)
+
+    @client.on(events.NewMessage(pattern=r'^/arm_job(?:\s+(.*))?$', **dec_filter))
+    async def arm_job(event):
+        args = event.pattern_match.group(1) or ""
+        try:
+            mon_id = int(_arg(args, "id") or "")
+        except ValueError:
+            await event.reply("❗ Формат: /arm_job id=1 find_interval=30m find_window=72h "
+                              "mon_interval=1h mon_window=24h [mode=...] [fuzz=...]")
+            return
+        if monitor_db.get_monitor(mon_id) is None:
+            await event.reply(f"❗ Монітора #{mon_id} немає.")
+            return
+        mode = _arg(args, "mode")
+        if mode is not None and mode not in MODES:
+            await event.reply(f"❗ mode: {' | '.join(MODES)}")
+            return
+        try:
+            fuzz = float(_arg(args, "fuzz")) if _arg(args, "fuzz") else None
+        except ValueError:
+            await event.reply("❗ fuzz має бути числом, напр. fuzz=85")
+            return
+        find_interval = parse_duration(_arg(args, "find_interval") or DEFAULT_FIND_INTERVAL, 1800.0)
+        find_window = parse_duration(_arg(args, "find_window") or DEFAULT_FIND_WINDOW, 72 * 3600.0)
+        mon_interval = parse_duration(_arg(args, "mon_interval") or DEFAULT_MON_INTERVAL, 3600.0)
+        mon_window = parse_duration(_arg(args, "mon_window") or DEFAULT_MON_WINDOW, 24 * 3600.0)
+        try:
+            armed, found = arm_monitor(mon_id, find_interval, find_window, mon_interval, mon_window, mode, fuzz)
+        except ValueError as e:
+            await event.reply(f"❗ {e}")
+            return
+        await event.reply(
+            f"⏱ Монітор #{mon_id} озброєно: пошук у {armed} канал(ах) кожні {int(find_interval // 60)} хв "
+            f"протягом {find_window / 3600:g} год; перегляди кожні {int(mon_interval // 60)} хв "
+            f"протягом {mon_window / 3600:g} год після публікації.\nУже знайдено: {found}"
+        )
+
+    @client.on(events.NewMessage(pattern=r'^/jobs$', **dec_filter))
+    async def jobs(event):
+        now = time.time()
+        lines = []
+        for kind in ("find", "mon"):
+            js = SCHEDULER.jobs(kind)
+            if js:
+                nxt = min(j.next_fire for j in js)
+                lines.append(f"{kind}: {len(js)}, найближча через {max(0, int(nxt - now))} с")
+            else:
+                lines.append(f"{kind}: 0")
+        s = SCHEDULER.stats
+        await event.reply(
+            "⏱ Планувальник:\n" + "\n".join(lines) + "\n"
+            f"запущено: {s['fired']}, завершено: {s['done']}, помилок: {s['failed']}, "
+            f"тіків понад бюджет ({SCHED_RPC_BUDGET} RPC): {s['deferred']}"
+        )
+
+    # задачі з БД продовжуються після рестарту
+    SCHEDULER.start()
+
+    log.info("jobs plugin loaded")
@@ -1,5 +1,39 @@
 from telethon import events
 import re
+import asyncio
+import logging
+from datetime import date
+
+from app.config import DEFAULT_FIND_MODE, DEFAULT_MON_INTERVAL
+from app.services import post_corpus, monitor_db, views_series
+from app.services.views_poller import poll_views
+from app.services.job_scheduler import SCHEDULER
+from app.services.monitor_jobs import needle_key
+from app.utils.durations import parse_duration
+from app.services.needle_matcher import MATCHER, MODES, BUFFER_KEY
+from app.services.post_finder import FIND_MODES, STATS as FIND_STATS
+
+log = logging.getLogger("plugin.metrics_watch")
+
+MON_INTERVAL = parse_duration(DEFAULT_MON_INTERVAL, 3600.0)
+
+
+def _arg(args: str, name: str):
+    m = re.search(rf"\b{name}=(\S+)", args)
+    return m.group(1) if m else None
+
+
+async def _views_loop(interval: float) -> None:
+    """Кожен mon_interval — один тік опитування переглядів усіх активних моніторів."""
+    while True:
+        await asyncio.sleep(interval)   # перший тік робить сам /mon_start
+        try:
+            # монітори з mon-задачею (/arm_job) опитує планувальник
+            ids = [i for i in monitor_db.monitors_by_status("active") if SCHEDULER.get(f"mon:{i}") is None]
+            if ids:
+                await poll_views(ids)
+        except Exception as e:
+            log.exception("views loop tick failed: %s", e)
 
 
 def setup(client, control_peer, monitor_buffer):
@@ -14,8 +48,36 @@ def setup(client, control_peer, monitor_buffer):
             await event.reply("❗ Формат: /mon_new owner=@user cpm=123")
             return
         args = m.group(1)
-        monitor_buffer.monitors.append({"args": args})
-        await event.reply(f"✅ Новий монітор додано: <code>{args}</code>", parse_mode="html")
+        mm = re.search(r"\bmode=(\w+)", args)
+        mode = mm.group(1) if mm and mm.group(1) in MODES else None
+        fm = re.search(r"\bfind=(\w+)", args)
+        find_mode = fm.group(1) if fm and fm.group(1) in FIND_MODES else DEFAULT_FIND_MODE
+        try:
+            cpm = float(_arg(args, "cpm") or 0)
+        except ValueError:
+            await event.reply("❗ cpm має бути числом: /mon_new owner=@user cpm=123")
+            return
+        owner = _arg(args, "owner")
+        mon_id = monitor_db.create_monitor(
+            admin=_arg(args, "admin") or owner or "-", start_date=_arg(args, "start") or date.today().isoformat(),
+            cpm=cpm, owner=owner, subset=_arg(args, "subset"),
+        )
+        n_links = monitor_db.add_channels(mon_id, sorted(monitor_buffer.collected_links))
+        key = needle_key(mon_id)
+        monitor_buffer.monitors.append({"args": args, "key": key, "needle": monitor_buffer.needle,
+                                        "find_mode": find_mode, "id": mon_id})
+        # needle монітора потрапляє у спільний автомат — скан тексту не залежить від к-сті моніторів;
+        # оригінал і відбиток посилань беремо з needle буфера (/needle_from_reply)
+        buf = MATCHER.get(BUFFER_KEY)
+        origin, links = (buf.origin, buf.links) if buf else (None, ())
+        MATCHER.set(key, monitor_buffer.needle, mode=mode, origin=origin, links=links)
+        # копія в БД — для /arm_job і задач планувальника після рестарту
+        monitor_db.save_needle(mon_id, monitor_buffer.needle, mode=mode, origin=origin, links=links,
+                               find_mode=find_mode)
+        hits = await post_corpus.rematch_async([key])
+        note = f"\n📦 Уже є у збережених постах: {len(hits)}" if hits else ""
+        await event.reply(f"✅ Новий монітор #{mon_id} додано: <code>{args}</code>\nКаналів: {n_links}{note}",
+                          parse_mode="html")
 
     @client.on(events.NewMessage(pattern=r'^/mon_status$', **dec_filter))
     async def mon_status(event):
@@ -24,12 +86,56 @@ def setup(client, control_peer, monitor_buffer):
             return
         lines = []
         for i, mon in enumerate(monitor_buffer.monitors, 1):
-            lines.append(f"{i}. {mon['args']}")
+            lines.append(f"{i}. {mon['args']} [find={mon.get('find_mode', DEFAULT_FIND_MODE)}]")
         await event.reply("📊 Монітори:\n" + "\n".join(lines))
 
+    @client.on(events.NewMessage(pattern=r'^/find_stats$', **dec_filter))
+    async def find_stats(event):
+        s = FIND_STATS
+        await event.reply(
+            "🔎 Пошук постів:\n"
+            f"search: {s['searches']} (знайдено: {s['search_hits']}, fallback на скан: {s['fallbacks']})\n"
+            f"скани: {s['scans']}\n"
+            f"RPC: {s['rpc']}, отримано: {s['bytes'] / 1024:.1f} KB\n"
+            f"зекономлено проти повного скану: ~{s['saved_rpc']} RPC, ~{s['saved_bytes'] / 1024:.1f} KB"
+        )
+
+    @client.on(events.NewMessage(pattern=r'^/mon_views(?:\s+(.*))?$', **dec_filter))
+    async def mon_views(event):
+        args = event.pattern_match.group(1) or ""
+        try:
+            mon_id = int(_arg(args, "id") or "")
+            hour = float(_arg(args, "h") or 24)
+        except ValueError:
+            await event.reply("❗ Формат: /mon_views id=1 [h=24]")
+            return
+        lines = []
+        for row in monitor_db.channels(mon_id):
+            if row["found_msg_id"] is None:
+                continue
+            published = monitor_db.iso_ts(row["published_at"])
+            at = views_series.views_at(row["id"], published + hour * 3600) if published else None
+            name = row["username"] and f"@{row['username']}" or row["title"] or row["input"]
+            lines.append(f"• {name}: {at if at is not None else '—'} на {hour:g} год, max {row['max_views'] or 0}"
+                         + (" (видалено)" if row["deleted_at"] else ""))
+        await event.reply(f"👁 Монітор #{mon_id}, перегляди:\n" + ("\n".join(lines) or "постів ще не знайдено"))
+
+    loop_task = {}
+
     @client.on(events.NewMessage(pattern=r'^/mon_start$', **dec_filter))
     async def mon_start(event):
         if not monitor_buffer.monitors:
             await event.reply("ℹ️ Спершу створи монітор через /mon_new ...")
             return
-        await event.reply("▶️ Моніторинг запущено (умовно).")
\ No newline at end of file
+        ids = [mon["id"] for mon in monitor_buffer.monitors if mon.get("id")]
+        for mon_id in ids:
+            monitor_db.set_status(mon_id, "active")
+        res = await poll_views(ids)
+        task = loop_task.get("views")
+        if task is None or task.done():
+            loop_task["views"] = asyncio.create_task(_views_loop(MON_INTERVAL))
+        await event.reply(
+            f"▶️ Моніторинг запущено: моніторів {len(ids)}, перегляди кожні {int(MON_INTERVAL // 60)} хв.\n"
+            f"Зараз: постів {res.posts} у {res.channels} канал(ах), оновлено {res.updated}, "
+            f"видалено {res.deleted}, RPC {res.rpc}"
+        )
\ No newline at end of file
@@ -1,5 +1,20 @@
+import time
+
 from telethon import events
 
+from app.services import post_corpus
+from app.services.needle_matcher import MATCHER, BUFFER_KEY, message_origin, message_links
+
+
+async def _rematch_note(key) -> str:
+    """Перевірка нового needle по локальному корпусу постів — без запитів до Telegram."""
+    t0 = time.monotonic()
+    hits = await post_corpus.rematch_async([key])
+    if not hits:
+        return ""
+    chats = len({h[0] for h in hits})
+    return f"\n📦 У збережених постах: {len(hits)} збіг(ів) у {chats} канал(ах) ({time.monotonic() - t0:.1f}s)"
+
 
 def setup(client, control_peer, monitor_buffer):
     dec_filter = {}
@@ -9,6 +24,7 @@ def setup(client, control_peer, monitor_buffer):
     @client.on(events.NewMessage(pattern=r'^/needle_clear$', **dec_filter))
     async def needle_clear(event):
         monitor_buffer.needle = None
+        MATCHER.remove(BUFFER_KEY)
         await event.reply("🧹 Needle очищено.")
 
     @client.on(events.NewMessage(pattern=r'^/needle_show$', **dec_filter))
@@ -24,5 +40,18 @@ def setup(client, control_peer, monitor_buffer):
             await event.reply("❗ Зроби reply на повідомлення з текстом.")
             return
         reply = await event.get_reply_message()
+        # для пересланого поста запам'ятовуємо оригінал і приховані посилання —
+        # репости і копії з тими ж посиланнями знаходяться без порівняння тексту
+        origin, links = message_origin(reply), message_links(reply)
+        if not (reply.raw_text or origin or links):
+            await event.reply("❗ У reply немає тексту, посилань чи джерела репосту.")
+            return
         monitor_buffer.needle = reply.raw_text or ""
-        await event.reply(f"✅ Needle взято з reply:\n<code>{monitor_buffer.needle}</code>", parse_mode="html")
\ No newline at end of file
+        MATCHER.set(BUFFER_KEY, monitor_buffer.needle, origin=origin, links=links)  # інкрементально оновлює лише цей needle
+        extra = ""
+        if origin:
+            extra += f"\nОригінал: <code>{origin[0]}/{origin[1]}</code>"
+        if links:
+            extra += f"\nПосилань у відбитку: {len(links)}"
+        extra += await _rematch_note(BUFFER_KEY)
+        await event.reply(f"✅ Needle взято з reply:\n<code>{monitor_buffer.needle}</code>{extra}", parse_mode="html")
\ No newline at end of file
@@ -3,16 +3,18 @@ from __future__ import annotations
 
 import os
 import time
+import heapq
 import asyncio
+import itertools
 import logging
 import sqlite3
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
-from typing import Optional, List, Union
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Optional, List, Set, Union, Collection, Tuple
 
 from telethon import TelegramClient
-from telethon.tl import types
-from telethon.tl.functions.channels import GetParticipantRequest
+
+from app.services import rate_limiter, account_state
 
 log = logging.getLogger("services.account_pool")
 
@@ -41,18 +43,44 @@ def _parse_accounts_env() -> List[str]:
 
 POOL_SESSIONS = _parse_accounts_env()
 
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(_env(name, str(default)) or default)
+    except ValueError:
+        return default
+
+# паралельність під'єднання слотів на старті та бекоф фонових ретраїв
+POOL_CONNECT_CONCURRENCY = _int_env("POOL_CONNECT_CONCURRENCY", 8)
+POOL_START_WAIT = _env("POOL_START_WAIT", "1").lower() in ("1", "true", "yes")
+POOL_RETRY_BASE = _int_env("POOL_RETRY_BASE", 30)
+POOL_RETRY_MAX  = _int_env("POOL_RETRY_MAX", 600)
+# кулдауни від цієї тривалості (сек) зберігаються в SQLite і переживають рестарт
+POOL_PERSIST_MIN = _int_env("POOL_PERSIST_MIN", 30)
+
 # ---------- structures ----------
-@dataclass
+@dataclass(eq=False)
 class ClientSlot:
     name: str
     client: TelegramClient
     next_ready: float = 0.0     # unix-ts, коли клієнт знову доступний
     busy: bool = False
-    lock: asyncio.Lock = asyncio.Lock()
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)  # власний лок кожного слота
+    heap_ver: int = 0           # версія актуального запису в _READY (старіші — ігноруємо)
+
+class SessionNotAuthorized(RuntimeError):
+    """Сесія не авторизована, а інтерактивний client.start() заборонено."""
 
 _POOL: List[ClientSlot] = []
-_POOL_LOCK = asyncio.Lock()
-_rr = 0  # round-robin індекс
+_IN_POOL: Set[ClientSlot] = set()     # членство в _POOL за O(1) (release/_register_slot)
+_SLOTS: List[ClientSlot] = []         # усі створені слоти, зокрема ті, що ще під'єднуються/ретраять
+_BG_TASKS: List[asyncio.Future] = []  # фонові під'єднання/ретраї слотів
+_ON_REGISTER: List[Callable[[ClientSlot], Optional[Awaitable]]] = []  # хуки на появу слота в пулі
+
+# min-heap вільних слотів за next_ready: (next_ready, seq, heap_ver, slot).
+# Записи видаляємо ліниво: якщо heap_ver не збігається або слот зайнятий — запис застарів.
+_READY: List[Tuple[float, int, int, ClientSlot]] = []
+_SEQ = itertools.count()
+_WAKE = asyncio.Event()  # будить тих, хто чекає в lease(); замінюється після кожного set()
 
 # ---------- utils ----------
 def session_name(client: TelegramClient) -> str:
@@ -69,6 +97,13 @@ def session_name(client: TelegramClient) -> str:
     except Exception:
         return "unknown.session"
 
+def account_key(slot: ClientSlot) -> str:
+    """
+    Ключ акаунта в membership — як пише batch_links (display_name): файл сесії, інакше ім'я слота.
+    """
+    fn = getattr(getattr(slot.client, "session", None), "filename", None)
+    return str(fn) if fn else slot.name
+
 def _find_slot(obj: Union[TelegramClient, ClientSlot]) -> Optional[ClientSlot]:
     if isinstance(obj, ClientSlot):
         return obj
@@ -77,20 +112,26 @@ def _find_slot(obj: Union[TelegramClient, ClientSlot]) -> Optional[ClientSlot]:
             return s
     return None
 
-def _set_ready_after(slot: ClientSlot, seconds: int) -> None:
+def _set_ready_after(slot: ClientSlot, seconds: float, reason: Optional[str] = None) -> None:
     now = time.time()
-    until = now + max(0, int(seconds))
-    if until > slot.next_ready:
-        slot.next_ready = until
+    until = now + max(0.0, float(seconds))
+    if until <= slot.next_ready:
+        return
+    slot.next_ready = until
+    if seconds >= POOL_PERSIST_MIN:
+        try:
+            account_state.save_cooldown(slot.name, until, reason)
+        except Exception as e:
+            log.warning("save_cooldown failed for %s: %s", slot.name, e)
 
-def bump_cooldown(client: TelegramClient, seconds: int) -> None:
+def bump_cooldown(client: Union[TelegramClient, ClientSlot], seconds: float) -> None:
     """
     Короткий локальний кулдаун для клієнта (не FLOOD).
     """
     slot = _find_slot(client)
     if not slot: return
-    _set_ready_after(slot, max(0, int(seconds)))
-    log.debug("bump_cooldown: %s +%ss (ready @ %.0f)", slot.name, seconds, slot.next_ready)
+    _set_ready_after(slot, seconds, "cooldown")
+    log.debug("bump_cooldown: %s +%.1fs (ready @ %.0f)", slot.name, seconds, slot.next_ready)
 
 def mark_flood(client: TelegramClient, seconds: int) -> None:
     """
@@ -98,7 +139,7 @@ def mark_flood(client: TelegramClient, seconds: int) -> None:
     """
     slot = _find_slot(client)
     if not slot: return
-    _set_ready_after(slot, max(0, int(seconds)))
+    _set_ready_after(slot, max(0, int(seconds)), "flood")
     log.warning("mark_flood: %s sleeps until %.0f (+%ss)", slot.name, slot.next_ready, seconds)
 
 def mark_limit(client_or_slot: Union[TelegramClient, ClientSlot], days: int = 2) -> None:
@@ -108,13 +149,16 @@ def mark_limit(client_or_slot: Union[TelegramClient, ClientSlot], days: int = 2)
     slot = _find_slot(client_or_slot)
     if not slot: return
     seconds = int(days * 86400)
-    _set_ready_after(slot, seconds)
+    _set_ready_after(slot, seconds, "too_many")
     log.warning("mark_limit: %s sleeps until %.0f (+%ss, ~%d days)", slot.name, slot.next_ready, seconds, days)
 
-async def _ensure_connected(slot: ClientSlot) -> None:
+async def _ensure_connected(slot: ClientSlot, interactive: bool = True) -> int:
     """
     Переконуємось, що клієнт під'єднаний та авторизований.
     З ретраями від sqlite 'database is locked'.
+    interactive=False — не викликаємо client.start() (він питає телефон/код у stdin),
+    а падаємо з SessionNotAuthorized, якщо сесія не авторизована.
+    Повертає кількість використаних спроб.
     """
     retries = 5; delay = 0.6
     for attempt in range(retries):
@@ -122,8 +166,12 @@ async def _ensure_connected(slot: ClientSlot) -> None:
             if not slot.client.is_connected():
                 await slot.client.connect()
             if not await slot.client.is_user_authorized():
+                if not interactive:
+                    raise SessionNotAuthorized(f"session {slot.name} is not authorized")
                 await slot.client.start()
-            return
+            return attempt + 1
+        except SessionNotAuthorized:
+            raise
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e).lower() and attempt < retries-1:
                 wait = delay * (attempt + 1)
@@ -136,11 +184,93 @@ async def _ensure_connected(slot: ClientSlot) -> None:
                 log.warning("connect failed for %s: %s; retry in %.1fs", slot.name, e, wait)
                 await asyncio.sleep(wait); continue
             raise
+    return retries
+
+def _register_slot(slot: ClientSlot) -> None:
+    """
+    Додає під'єднаний слот у пул — з цього моменту його можна орендувати.
+    """
+    if slot not in _IN_POOL:
+        _POOL.append(slot)
+        _IN_POOL.add(slot)
+        _push_ready(slot)
+        for hook in _ON_REGISTER:
+            try:
+                res = hook(slot)
+                if asyncio.iscoroutine(res):
+                    _BG_TASKS.append(asyncio.ensure_future(res))
+            except Exception as e:
+                log.warning("on_register hook failed for %s: %s", slot.name, e)
+
+def on_register(hook: Callable[[ClientSlot], Optional[Awaitable]]) -> None:
+    """
+    Хук на кожен слот, що потрапляє в пул (на старті, пізніше у фоні чи після ретраю).
+    Корутини запускаються фоново. Слоти, що вже в пулі, хук не бачить — див. iter_pool_clients().
+    """
+    if hook not in _ON_REGISTER:
+        _ON_REGISTER.append(hook)
+
+async def _connect_slot(slot: ClientSlot, sem: asyncio.Semaphore) -> Optional[bool]:
+    """
+    Одна спроба підняти слот (з ретраями _ensure_connected) під спільним семафором.
+    Логує час під'єднання, щоб було видно, хто гальмує старт.
+    None — сесія не авторизована: ретрай не допоможе, потрібен новий логін.
+    """
+    async with sem:
+        t0 = time.monotonic()
+        try:
+            attempts = await _ensure_connected(slot, interactive=False)
+        except SessionNotAuthorized:
+            log.error("pool client %s is not authorized — log in again; skipped until restart", slot.name)
+            try: await slot.client.disconnect()
+            except Exception: pass
+            return None
+        except Exception as e:
+            log.warning("pool client failed: %s after %.2fs: %s", slot.name, time.monotonic() - t0, e)
+            return False
+    _register_slot(slot)
+    log.info("pool client ready: %s (%.2fs, attempts=%d, pool=%d)",
+             slot.name, time.monotonic() - t0, attempts, len(_POOL))
+    return True
+
+async def _retry_in_background(slot: ClientSlot, sem: asyncio.Semaphore) -> None:
+    """
+    Фоновий перепідйом слоту, що не піднявся на старті. Бекоф росте до POOL_RETRY_MAX.
+    """
+    wait = max(1, POOL_RETRY_BASE)
+    while True:
+        await asyncio.sleep(wait)
+        if await _connect_slot(slot, sem) is not False:
+            return
+        wait = min(POOL_RETRY_MAX, wait * 2)
+
+def _restore_state(slots: List[ClientSlot]) -> None:
+    """
+    Підтягує збережені кулдауни (FLOOD_WAIT, too_many) і навчені інтервали rate_limiter,
+    щоб після рестарту не смикати акаунти, які ще мають спати.
+    """
+    try:
+        saved = account_state.load_cooldowns()
+        restored = rate_limiter.restore()
+    except Exception as e:
+        log.warning("account_state restore failed: %s", e)
+        return
+    for slot in slots:
+        if slot.name in saved:
+            slot.next_ready, reason = saved[slot.name]
+            log.info("pool client %s sleeps until %.0f (%s, restored)", slot.name, slot.next_ready, reason)
+    if restored:
+        log.info("rate_limiter: restored %d learned intervals", restored)
 
 async def start_pool() -> None:
     """
     Створює та піднімає клієнти для ACCOUNTS.
     PRIMARY (SESSION) не додаємо у пул.
+
+    Слоти під'єднуються паралельно (не більше POOL_CONNECT_CONCURRENCY одночасно),
+    кожен потрапляє у пул одразу після авторизації. Ті, що не піднялись, —
+    перепідіймаються у фоні. POOL_START_WAIT=0 — не чекаємо навіть першого проходу.
+    Збережені кулдауни акаунтів відновлюються до під'єднання (див. account_state).
     """
     global _POOL
     if not POOL_SESSIONS:
@@ -148,21 +278,38 @@ async def start_pool() -> None:
     if not API_ID or not API_HASH:
         raise RuntimeError("API_ID/API_HASH must be set in .env for pool")
 
-    pool: List[ClientSlot] = []
-    for sess in POOL_SESSIONS:
-        client = TelegramClient(sess, API_ID, API_HASH)
-        slot = ClientSlot(name=sess, client=client)
-        await _ensure_connected(slot)
-        pool.append(slot)
-        log.info("pool client ready: %s", sess)
-    _POOL = pool
-    log.info("account_pool started: %d clients", len(_POOL))
+    _POOL = []
+    _IN_POOL.clear()
+    t0 = time.monotonic()
+    sem = asyncio.Semaphore(max(1, POOL_CONNECT_CONCURRENCY))
+    slots = [ClientSlot(name=sess, client=TelegramClient(sess, API_ID, API_HASH)) for sess in POOL_SESSIONS]
+    _SLOTS[:] = slots
+    _restore_state(slots)
+
+    async def _first_pass(slot: ClientSlot) -> None:
+        if await _connect_slot(slot, sem) is False:
+            _BG_TASKS.append(asyncio.create_task(_retry_in_background(slot, sem)))
+
+    first = asyncio.gather(*(_first_pass(s) for s in slots))
+    if not POOL_START_WAIT:
+        _BG_TASKS.append(asyncio.ensure_future(first))
+        log.info("account_pool starting in background: %d sessions (concurrency=%d)",
+                 len(slots), POOL_CONNECT_CONCURRENCY)
+        return
+    await first
+    log.info("account_pool started: %d/%d clients in %.2fs",
+             len(_POOL), len(slots), time.monotonic() - t0)
 
 async def stop_pool() -> None:
-    for s in _POOL:
+    for t in _BG_TASKS:
+        t.cancel()
+    _BG_TASKS.clear()
+    # і ті, що ще під'єднувались або чекали ретраю, — не лише зареєстровані
+    for s in _SLOTS or _POOL:
         try: await s.client.disconnect()
         except Exception: pass
-    _POOL.clear(); log.info("account_pool stopped")
+    _POOL.clear(); _IN_POOL.clear(); _SLOTS.clear(); _READY.clear(); _notify()
+    log.info("account_pool stopped")
 
 def iter_pool_clients() -> List[ClientSlot]:
     """
@@ -170,46 +317,161 @@ def iter_pool_clients() -> List[ClientSlot]:
     """
     return list(_POOL)
 
+# ---------- scheduler ----------
+def _notify() -> None:
+    global _WAKE
+    _WAKE.set()
+    _WAKE = asyncio.Event()
+
+def _push_ready(slot: ClientSlot) -> None:
+    """
+    Кладе вільний слот у купу з ключем next_ready (O(log n)) і будить очікувачів.
+    """
+    slot.heap_ver += 1
+    heapq.heappush(_READY, (slot.next_ready, next(_SEQ), slot.heap_ver, slot))
+    _notify()
+
+def _pop_ready(now: float, exclude: Optional[Collection[str]] = None,
+               pop: bool = True, family: Optional[str] = None) -> Tuple[Optional[ClientSlot], Optional[float]]:
+    """
+    Знімає з купи найраніший готовий слот (pop=False — лише підглядає).
+    family — сімейство RPC, під яке беремо слот: акаунт, чиє відро rate_limiter ще порожнє,
+    пропускаємо (він чекав би вже орендованим, поки інші простоюють).
+    Повертає (slot, None) або (None, секунд_до_найближчого|None, якщо вільних немає).
+    """
+    skipped = []
+    throttled: Optional[float] = None
+    try:
+        while _READY:
+            key, _, ver, slot = _READY[0]
+            if ver != slot.heap_ver or slot.busy:
+                heapq.heappop(_READY); continue
+            if key < slot.next_ready:
+                # кулдаун подовжили (mark_flood/bump_cooldown), поки слот лежав у купі
+                heapq.heapreplace(_READY, (slot.next_ready, next(_SEQ), ver, slot)); continue
+            if exclude and slot.name in exclude:
+                skipped.append(heapq.heappop(_READY)); continue
+            if key > now:
+                return None, key - now if throttled is None else min(key - now, throttled)
+            if family:
+                d = rate_limiter.delay(slot.name, family)
+                if d > 0:
+                    throttled = d if throttled is None else min(throttled, d)
+                    skipped.append(heapq.heappop(_READY)); continue
+            if pop:
+                heapq.heappop(_READY)
+            return slot, None
+        return None, throttled
+    finally:
+        for e in skipped:
+            heapq.heappush(_READY, e)
+
+async def acquire(timeout: Optional[float] = 0.0,
+                  exclude: Optional[Collection[str]] = None,
+                  family: Optional[str] = None) -> Optional[ClientSlot]:
+    """
+    Забирає найраніше готовий слот і позначає його busy.
+    timeout=0 — не чекаємо; None — чекаємо без обмеження.
+    Прокидаємось рівно тоді, коли звільняється найближчий слот (або його повертають через release()).
+    exclude — імена сесій, які не підходять (напр. вже пробували цей лінк).
+    family — сімейство RPC (rate_limiter): беремо лише акаунт, чиє відро вже має токен.
+    """
+    deadline = None if timeout is None else time.monotonic() + max(0.0, timeout)
+    while True:
+        slot, wait = _pop_ready(time.time(), exclude, family=family)
+        if slot is not None:
+            slot.busy = True
+            return slot
+        left = None if deadline is None else deadline - time.monotonic()
+        if left is not None and left <= 0:
+            return None
+        delays = [d for d in (wait, left) if d is not None]
+        ev = _WAKE
+        try:
+            await asyncio.wait_for(ev.wait(), min(delays) if delays else None)
+        except asyncio.TimeoutError:
+            pass
+
+def ready_slots(family: Optional[str] = None) -> List[ClientSlot]:
+    """
+    Слоти, що вільні і не в кулдауні просто зараз (без оренди).
+    family — ще й з токеном у відрі rate_limiter цього сімейства RPC.
+    """
+    now = time.time()
+    return [s for s in _POOL if not s.busy and s.next_ready <= now
+            and not (family and rate_limiter.delay(s.name, family) > 0)]
+
+async def wait_ready(timeout: Optional[float] = None) -> bool:
+    """
+    Чекає (не орендуючи), доки якийсь слот стане готовим: прокидається на next_ready
+    найранішого слоту або коли слот повертають/додають у пул. False — вийшов timeout.
+    """
+    deadline = None if timeout is None else time.monotonic() + max(0.0, timeout)
+    while True:
+        slot, wait = _pop_ready(time.time(), pop=False)
+        if slot is not None:
+            return True
+        left = None if deadline is None else deadline - time.monotonic()
+        if left is not None and left <= 0:
+            return False
+        delays = [d for d in (wait, left) if d is not None]
+        ev = _WAKE
+        try:
+            await asyncio.wait_for(ev.wait(), min(delays) if delays else None)
+        except asyncio.TimeoutError:
+            pass
+
+def release(slot: ClientSlot) -> None:
+    """
+    Повертає слот у купу (O(log n)). Новий кулдаун має бути виставлений до виклику.
+    """
+    slot.busy = False
+    if slot in _IN_POOL:
+        _push_ready(slot)
+
 @asynccontextmanager
-async def _lease_ctx(slot: ClientSlot):
+async def lease(timeout: Optional[float] = 0.0,
+                exclude: Optional[Collection[str]] = None,
+                family: Optional[str] = None) -> AsyncIterator[Optional[TelegramClient]]:
     """
-    Контекст для позначки busy під час короткої «оренди» клієнта.
+    Оренда "найближчого" готового клієнта: `async with lease(timeout=5) as client:`.
+    Слот забирається лише при вході в контекст (не при виклику lease()), тримає свій лок
+    і повертається в купу на виході. Чекає до timeout секунд (None — без обмеження);
+    client — None, якщо не дочекались.
     """
-    slot.busy = True
-    try: yield slot.client
-    finally: slot.busy = False
+    slot = await acquire(timeout, exclude, family)
+    if slot is None:
+        yield None
+        return
+    try:
+        async with slot.lock:
+            yield slot.client
+    finally:
+        release(slot)
 
-async def lease() -> Optional[asyncio.AbstractAsyncContextManager]:
+@asynccontextmanager
+async def lease_slots(slots: Collection[ClientSlot]) -> AsyncIterator[List[ClientSlot]]:
     """
-    Видає async context manager з "найближчим" готовим клієнтом.
-    Повертає None, якщо наразі *усі* сплять або зайняті.
+    Оренда конкретних слотів (напр. з ready_slots(), розподілених під канали) на час контексту:
+    `async with lease_slots(ready_slots()) as held:`. Слоти, які вже хтось орендував, що тим
+    часом пішли в кулдаун або яких немає в пулі, пропускаються; решта позначаються busy і
+    повертаються в купу на виході.
     """
-    if not _POOL: return None
     now = time.time()
-    async with _POOL_LOCK:
-        n = len(_POOL); global _rr
-        for k in range(n):
-            idx = (_rr + k) % n
-            s = _POOL[idx]
-            if s.busy: continue
-            if s.next_ready > now: continue
-            _rr = (idx + 1) % n
-            return _lease_ctx(s)
-    return None
+    held = [s for s in slots if s in _IN_POOL and not s.busy and s.next_ready <= now]
+    for s in held:
+        s.busy = True
+    try:
+        yield held
+    finally:
+        for s in held:
+            release(s)
 
 async def is_already_subscribed(url: str) -> Optional[str]:
     """
     Перевіряє, чи хоча б один акаунт з пулу вже підписаний на канал (за url).
     Повертає session_name клієнта, якщо знайдено, інакше None.
+    Делегує subscription_check.check_subscribed (membership-кеш + паралельні перевірки).
     """
-    if not _POOL: return None
-    for slot in _POOL:
-        try:
-            client = slot.client
-            entity = await client.get_entity(url)
-            res = await client(GetParticipantRequest(entity, 'me'))
-            if hasattr(res, "participant") and isinstance(res.participant, types.ChannelParticipant):
-                return session_name(client)
-        except Exception:
-            continue
-    return None
\ No newline at end of file
+    from app.services.subscription_check import check_subscribed  # лінивий імпорт: той модуль імпортує нас
+    return await check_subscribed(url)
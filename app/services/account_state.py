@@ -0,0 +1,104 @@
+# app/services/account_state.py
+# Стан акаунтів пулу, що має пережити рестарт: дедлайни кулдаунів (FLOOD_WAIT, too_many),
+# журнал FLOOD-подій і навчені інтервали rate_limiter.
+import os, time, logging
+from typing import Dict, List, Optional, Tuple
+
+from app.services.db.core import _conn, _ensure_tables, register_schema
+
+log = logging.getLogger("services.account_state")
+
+DDL = """
+-- до якого моменту акаунт не можна використовувати (unix-ts) і чому
+CREATE TABLE IF NOT EXISTS account_cooldown (
+  account    TEXT    PRIMARY KEY,
+  next_ready REAL    NOT NULL,
+  reason     TEXT,
+  ts         INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- кожен отриманий FLOOD_WAIT (для адаптивного темпу і статистики)
+CREATE TABLE IF NOT EXISTS flood_events (
+  account TEXT    NOT NULL,
+  family  TEXT    NOT NULL,
+  seconds INTEGER NOT NULL,
+  ts      INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_flood_events_acc_ts ON flood_events(account, ts);
+
+-- навчений інтервал між токенами для (акаунт, сімейство RPC)
+CREATE TABLE IF NOT EXISTS rate_model (
+  account  TEXT    NOT NULL,
+  family   TEXT    NOT NULL,
+  interval REAL    NOT NULL,
+  ts       INTEGER NOT NULL,
+  PRIMARY KEY (account, family)
+) WITHOUT ROWID;
+"""
+
+register_schema(DDL)
+
+# скільки днів тримати журнал FLOOD-подій
+FLOOD_EVENTS_KEEP_DAYS = int(os.getenv("FLOOD_EVENTS_KEEP_DAYS", "30"))
+
+
+def save_cooldown(account: str, next_ready: float, reason: Optional[str] = None) -> None:
+    """Записує дедлайн кулдауну; коротший за вже збережений не перетирає його."""
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "INSERT INTO account_cooldown(account, next_ready, reason, ts) VALUES (?,?,?,?) "
+            "ON CONFLICT(account) DO UPDATE SET next_ready=excluded.next_ready, reason=excluded.reason, ts=excluded.ts "
+            "WHERE excluded.next_ready > account_cooldown.next_ready",
+            (account, float(next_ready), reason, int(time.time())),
+        )
+
+
+def load_cooldowns(now: Optional[float] = None) -> Dict[str, Tuple[float, Optional[str]]]:
+    """
+    {account: (next_ready, reason)} лише для кулдаунів, що ще не минули.
+    Прострочені записи і старі FLOOD-події заодно прибираються.
+    """
+    _ensure_tables()
+    now = time.time() if now is None else now
+    with _conn() as c:
+        c.execute("DELETE FROM account_cooldown WHERE next_ready <= ?", (now,))
+        c.execute("DELETE FROM flood_events WHERE ts < ?", (int(now) - FLOOD_EVENTS_KEEP_DAYS * 86400,))
+        rows = c.execute("SELECT account, next_ready, reason FROM account_cooldown").fetchall()
+    return {acc: (float(nr), reason) for acc, nr, reason in rows}
+
+
+def record_flood(account: str, family: str, seconds: int) -> None:
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "INSERT INTO flood_events(account, family, seconds, ts) VALUES (?,?,?,?)",
+            (account, family, int(seconds), int(time.time())),
+        )
+
+
+def flood_stats(since_sec: int = 86400) -> List[tuple]:
+    """[(account, family, к-сть, сума секунд, max секунд)] за останні since_sec."""
+    _ensure_tables()
+    with _conn() as c:
+        return c.execute(
+            "SELECT account, family, COUNT(*), SUM(seconds), MAX(seconds) FROM flood_events "
+            "WHERE ts >= ? GROUP BY account, family ORDER BY account, family",
+            (int(time.time()) - int(since_sec),),
+        ).fetchall()
+
+
+def save_interval(account: str, family: str, interval: float) -> None:
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO rate_model(account, family, interval, ts) VALUES (?,?,?,?)",
+            (account, family, float(interval), int(time.time())),
+        )
+
+
+def load_intervals() -> Dict[Tuple[str, str], float]:
+    _ensure_tables()
+    with _conn() as c:
+        rows = c.execute("SELECT account, family, interval FROM rate_model").fetchall()
+    return {(acc, fam): float(iv) for acc, fam, iv in rows}
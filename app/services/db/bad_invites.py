@@ -3,9 +3,14 @@ from __future__ import annotations
 import time
 from typing import Optional, Tuple
 
-from .core import _conn, _ensure_tables, _has_table, _has_column
+from .core import _conn, _ensure_tables, _has_column
+from . import core
+
+_READY: set = set()  # DB_PATH, для яких таблицю вже перевірено
 
 def _ensure_bad_invites_table() -> None:
+    if core.DB_PATH in _READY:
+        return
     _ensure_tables()
     with _conn() as c:
         # створюємо таблицю, якщо немає
@@ -19,6 +24,7 @@ def _ensure_bad_invites_table() -> None:
         # м’які міграції
         if not _has_column(c, "bad_invites", "reason"):
             c.execute("ALTER TABLE bad_invites ADD COLUMN reason TEXT;")
+    _READY.add(core.DB_PATH)
 
 def mark_bad(invite_hash: str, ttl_seconds: int = 43200, reason: str = "") -> None:
     """
@@ -45,14 +51,14 @@ def is_bad(invite_hash: str) -> Tuple[bool, Optional[int], Optional[str]]:
     _ensure_bad_invites_table()
     now = int(time.time())
     with _conn() as c:
-        cur = c.execute("SELECT until, reason FROM bad_invites WHERE invite=", (invite_hash,))
+        cur = c.execute("SELECT until, reason FROM bad_invites WHERE invite=?", (invite_hash,))
         row = cur.fetchone()
         if not row:
             return False, None, None
         until, reason = int(row[0]), row[1]
         if until <= now:
             # просте авто-очищення протухлих
-            c.execute("DELETE FROM bad_invites WHERE invite=", (invite_hash,))
+            c.execute("DELETE FROM bad_invites WHERE invite=?", (invite_hash,))
             return False, None, None
         return True, until - now, reason
 
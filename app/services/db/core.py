@@ -0,0 +1,103 @@
+# app/services/db/core.py
+# Спільний шар доступу до SQLite.
+# Одне довгоживуче з'єднання на (потік, DB_PATH): прагми виставляємо один раз при
+# відкритті, підготовлені запити кешує сам sqlite3 (cached_statements) — тому SQL
+# у модулях тримаємо константними рядками.
+import os
+import sqlite3
+import threading
+import logging
+from typing import Dict, List, Optional
+
+log = logging.getLogger("services.db.core")
+
+DB_PATH = os.getenv("DB_PATH", "post_watchdog.sqlite3")
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+DB_BUSY_TIMEOUT_MS = _int_env("DB_BUSY_TIMEOUT_MS", 3000)
+DB_MMAP_SIZE       = _int_env("DB_MMAP_SIZE", 64 * 1024 * 1024)
+DB_CACHE_KB        = _int_env("DB_CACHE_KB", 16 * 1024)
+DB_STMT_CACHE      = _int_env("DB_STMT_CACHE", 256)
+
+_local = threading.local()
+_SCHEMAS: List[str] = []       # DDL модулів-сервісів (реєструються при імпорті)
+_ENSURED: set = set()          # (db_path, к-сть схем), для яких DDL вже виконано
+_ENSURE_LOCK = threading.Lock()
+
+
+def configure(db_path: Optional[str] = None) -> str:
+    """Перемикає шлях до БД (для init(db_path) у сервісах). Повертає актуальний DB_PATH."""
+    global DB_PATH
+    if db_path and db_path != DB_PATH:
+        DB_PATH = db_path
+    return DB_PATH
+
+
+def _open(path: str) -> sqlite3.Connection:
+    c = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0, cached_statements=DB_STMT_CACHE)
+    c.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS};")
+    c.execute("PRAGMA journal_mode=WAL;")
+    c.execute("PRAGMA synchronous=NORMAL;")
+    c.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE};")
+    c.execute(f"PRAGMA cache_size=-{DB_CACHE_KB};")
+    c.execute("PRAGMA temp_store=MEMORY;")
+    log.debug("sqlite connection opened: %s (thread=%s)", path, threading.get_ident())
+    return c
+
+
+def _conn() -> sqlite3.Connection:
+    """
+    Повертає довгоживуче з'єднання поточного потоку.
+    Використовується як `with _conn() as c:` — контекст лише комітить/відкочує, не закриває.
+    """
+    conns: Optional[Dict[str, sqlite3.Connection]] = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    c = conns.get(DB_PATH)
+    if c is None:
+        c = conns[DB_PATH] = _open(DB_PATH)
+    return c
+
+
+def close_all() -> None:
+    """Закриває з'єднання поточного потоку (тести/бенчмарки, завершення роботи)."""
+    conns = getattr(_local, "conns", None) or {}
+    for c in conns.values():
+        try:
+            c.close()
+        except Exception:
+            pass
+    conns.clear()
+
+
+def register_schema(ddl: str) -> None:
+    """Реєструє DDL модуля; виконується у _ensure_tables() для кожної БД один раз."""
+    if ddl not in _SCHEMAS:
+        _SCHEMAS.append(ddl)
+
+
+def _ensure_tables() -> None:
+    key = (DB_PATH, len(_SCHEMAS))
+    if key in _ENSURED:
+        return
+    with _ENSURE_LOCK:
+        if key in _ENSURED:
+            return
+        c = _conn()
+        for ddl in _SCHEMAS:
+            c.executescript(ddl)
+        _ENSURED.add(key)
+
+
+def _has_table(c: sqlite3.Connection, table: str) -> bool:
+    row = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=? LIMIT 1", (table,)).fetchone()
+    return row is not None
+
+
+def _has_column(c: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(r[1] == column for r in c.execute(f"PRAGMA table_info({table})"))
@@ -0,0 +1,141 @@
+# app/services/entity_cache.py
+import os, time, logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from app.services.db.core import _conn, _ensure_tables, register_schema
+
+log = logging.getLogger("services.entity_cache")
+
+DDL = """
+-- username -> канал, окремо для кожного акаунта (access_hash у кожного свій)
+CREATE TABLE IF NOT EXISTS entity_cache (
+  account     TEXT    NOT NULL,
+  username    TEXT    NOT NULL,   -- нижній регістр, без @
+  channel_id  INTEGER,            -- NULL = негативний запис (UsernameNotOccupied)
+  access_hash INTEGER,
+  title       TEXT,
+  ts          INTEGER NOT NULL,
+  PRIMARY KEY (account, username)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entity_cache_username ON entity_cache(username);
+"""
+
+register_schema(DDL)
+
+ENTITY_CACHE_TTL = int(os.getenv("ENTITY_CACHE_TTL", str(7 * 86400)))
+ENTITY_NEG_TTL   = int(os.getenv("ENTITY_NEG_TTL", str(86400)))
+
+_IN_CHUNK = 500
+
+
+@dataclass
+class CachedEntity:
+    channel_id: Optional[int]
+    access_hash: Optional[int]
+    title: Optional[str]
+    ts: int
+
+    @property
+    def negative(self) -> bool:
+        return self.channel_id is None
+
+
+def _fresh(channel_id: Optional[int], ts: int, now: int) -> bool:
+    ttl = ENTITY_NEG_TTL if channel_id is None else ENTITY_CACHE_TTL
+    return now - int(ts) < ttl
+
+
+def lookup(account: str, username: str) -> Optional[CachedEntity]:
+    """
+    Свіжий запис для (account, username) або None (немає/протух).
+    Негативний запис повертається з channel_id=None.
+    """
+    _ensure_tables()
+    with _conn() as c:
+        row = c.execute(
+            "SELECT channel_id, access_hash, title, ts FROM entity_cache WHERE account=? AND username=?",
+            (account, username),
+        ).fetchone()
+    if not row or not _fresh(row[0], row[3], int(time.time())):
+        return None
+    return CachedEntity(row[0], row[1], row[2], int(row[3]))
+
+
+def put(account: str, username: str, channel_id: int, access_hash: Optional[int], title: Optional[str]) -> None:
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO entity_cache(account,username,channel_id,access_hash,title,ts) VALUES (?,?,?,?,?,?)",
+            (account, username, int(channel_id), access_hash, title, int(time.time())),
+        )
+
+
+def put_many(account: str, rows: List[tuple]) -> int:
+    """rows: [(username, channel_id, access_hash, title), ...] — одна транзакція."""
+    if not rows:
+        return 0
+    _ensure_tables()
+    now = int(time.time())
+    with _conn() as c:
+        c.executemany(
+            "INSERT OR REPLACE INTO entity_cache(account,username,channel_id,access_hash,title,ts) VALUES (?,?,?,?,?,?)",
+            [(account, u, int(cid), ah, t, now) for u, cid, ah, t in rows],
+        )
+    return len(rows)
+
+
+def put_negative(account: str, username: str) -> None:
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO entity_cache(account,username,channel_id,access_hash,title,ts) VALUES (?,?,NULL,NULL,NULL,?)",
+            (account, username, int(time.time())),
+        )
+
+
+def forget(account: str, username: str) -> None:
+    """Прибирає запис (напр. access_hash став невалідним)."""
+    _ensure_tables()
+    with _conn() as c:
+        c.execute("DELETE FROM entity_cache WHERE account=? AND username=?", (account, username))
+
+
+def channel_ids_many(usernames: Iterable[str]) -> Dict[str, Optional[int]]:
+    """
+    {username: channel_id | None(негативний)} за будь-яким акаунтом — channel_id не залежить від акаунта.
+    Відсутній ключ — нічого свіжого не знаємо.
+    """
+    names = list(dict.fromkeys(u for u in usernames if u))
+    out: Dict[str, Optional[int]] = {}
+    if not names:
+        return out
+    _ensure_tables()
+    now = int(time.time())
+    with _conn() as c:
+        for i in range(0, len(names), _IN_CHUNK):
+            part = names[i:i + _IN_CHUNK]
+            q = f"SELECT username, channel_id, ts FROM entity_cache WHERE username IN ({','.join('?'*len(part))})"
+            for uname, cid, ts in c.execute(q, part):
+                if not _fresh(cid, ts, now):
+                    continue
+                if cid is not None or uname not in out:
+                    out[uname] = cid  # позитивний запис будь-якого акаунта переважає негативний
+    return out
+
+
+def access_hashes(account: str, channel_ids: Iterable[int]) -> Dict[int, int]:
+    """{channel_id: access_hash} цього акаунта (з будь-якого username каналу)."""
+    ids = list(dict.fromkeys(int(x) for x in channel_ids))
+    out: Dict[int, int] = {}
+    if not ids:
+        return out
+    _ensure_tables()
+    with _conn() as c:
+        for i in range(0, len(ids), _IN_CHUNK):
+            part = ids[i:i + _IN_CHUNK]
+            q = (f"SELECT channel_id, access_hash FROM entity_cache WHERE account=? AND access_hash IS NOT NULL "
+                 f"AND channel_id IN ({','.join('?'*len(part))})")
+            for cid, ah in c.execute(q, [account, *part]):
+                out[int(cid)] = int(ah)
+    return out
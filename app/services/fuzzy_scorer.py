@@ -0,0 +1,84 @@
+# app/services/fuzzy_scorer.py
+# Пакетний фаззі-скоринг постів проти fuzzy-needle. Великі пакети йдуть у
+# ProcessPoolExecutor чанками (чистий Python тримає GIL — потік не допоміг би),
+# тож цикл Telethon лишається чуйним; дрібні — рахуються на місці.
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+from app.config import DEFAULT_FUZZ
+from app.utils.fuzzy import Prepared, prepare, score_prepared
+
+log = logging.getLogger("services.fuzzy_scorer")
+
+# к-сть процесів пулу (0 — os.cpu_count())
+FUZZY_WORKERS = int(os.getenv("FUZZY_WORKERS", "0") or "0")
+# постів в одному завданні пулу
+FUZZY_CHUNK = int(os.getenv("FUZZY_CHUNK", "500") or "500")
+# до скількох пар (пост x needle) рахуємо без пулу
+FUZZY_INLINE_PAIRS = int(os.getenv("FUZZY_INLINE_PAIRS", "2000") or "0")
+
+Item = Tuple[Hashable, str]            # (ключ, текст)
+Match = Tuple[Hashable, Hashable, float]  # (ключ поста, ключ needle, схожість)
+
+_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def score_batch(posts: Sequence[Item], needles: Sequence[Item], threshold: float = DEFAULT_FUZZ) -> List[Match]:
+    """
+    Синхронно: усі пари (пост, needle) зі схожістю >= threshold.
+    needles готуються (нормалізація + гістограма) один раз на пакет.
+    """
+    prepared = [(nk, prepare(nt)) for nk, nt in needles]
+    return _score_prepared(posts, prepared, threshold)
+
+
+def _score_prepared(posts: Sequence[Item], needles: Sequence[Tuple[Hashable, Prepared]],
+                    threshold: float) -> List[Match]:
+    out: List[Match] = []
+    for pk, text in posts:
+        p = prepare(text)
+        if not p.text:
+            continue
+        for nk, n in needles:
+            sc = score_prepared(p, n, threshold)
+            if sc is not None:
+                out.append((pk, nk, sc))
+    return out
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=FUZZY_WORKERS or None)
+        log.info("fuzzy scorer pool started: workers=%s", FUZZY_WORKERS or os.cpu_count())
+    return _POOL
+
+
+def shutdown(wait: bool = True) -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=wait, cancel_futures=True)
+        _POOL = None
+
+
+async def score_batch_async(posts: Sequence[Item], needles: Sequence[Item],
+                            threshold: float = DEFAULT_FUZZ) -> List[Match]:
+    """
+    Те саме, що score_batch, але не блокує event loop: пакет ріжеться на чанки
+    по FUZZY_CHUNK постів і рахується паралельно в процесах.
+    """
+    if not posts or not needles:
+        return []
+    prepared = [(nk, prepare(nt)) for nk, nt in needles]
+    if len(posts) * len(prepared) <= FUZZY_INLINE_PAIRS:
+        return _score_prepared(posts, prepared, threshold)
+    loop = asyncio.get_running_loop()
+    pool = _executor()
+    chunks = [list(posts[i:i + FUZZY_CHUNK]) for i in range(0, len(posts), FUZZY_CHUNK)]
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(pool, _score_prepared, ch, prepared, threshold) for ch in chunks
+    ))
+    return [m for part in parts for m in part]
@@ -0,0 +1,219 @@
+# app/services/history_scanner.py
+# Інкрементальний скан історії каналів моніторингу. Для кожної пари (канал, акаунт)
+# зберігаємо курсор: останній переглянутий msg_id, нижню межу вікна правок і найпізніший
+# бачений edit_date. Тік читає messages.GetHistory з min_id = межа вікна правок сторінками
+# по SCAN_PAGE — тож у звичайному тіку це один RPC, а трафік пропорційний новим постам
+# плюс обмежене вікно правок, а не всьому find_window. Якщо тік уперся в SCAN_MAX_PAGES,
+# непрочитаний проміжок (resume_floor, resume_id) дочитується наступними тіками.
+import os, time, logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from telethon import utils
+from telethon.tl import types
+from telethon.tl.functions.messages import GetHistoryRequest
+from telethon.errors import FloodWaitError
+
+from app.services import rate_limiter
+from app.services.account_pool import ClientSlot, account_key, mark_flood
+from app.services.db import core
+from app.services.db.core import _conn, _ensure_tables, _has_column, register_schema
+from app.utils.durations import parse_duration
+
+log = logging.getLogger("services.history_scanner")
+
+DDL = """
+-- курсор скану історії: що вже бачив цей акаунт у цьому каналі
+CREATE TABLE IF NOT EXISTS scan_cursors (
+  channel_id INTEGER NOT NULL,
+  account    TEXT    NOT NULL,
+  last_id    INTEGER NOT NULL,   -- найбільший переглянутий msg_id
+  edit_floor INTEGER NOT NULL,   -- min_id наступного тіку: пости вище ще в межах вікна правок
+  edit_ts    INTEGER NOT NULL,   -- найпізніший бачений edit_date (unix-ts)
+  ts         INTEGER NOT NULL,
+  resume_id    INTEGER NOT NULL DEFAULT 0,  -- >0: offset_id, з якого дочитати пропущений проміжок
+  resume_floor INTEGER NOT NULL DEFAULT 0,  -- min_id цього проміжку
+  resume_last  INTEGER NOT NULL DEFAULT 0,  -- last_id на момент розриву: вище нього в проміжку — нові
+  PRIMARY KEY (channel_id, account)
+) WITHOUT ROWID;
+"""
+
+register_schema(DDL)
+
+_MIGRATED: set = set()
+
+# повідомлень на сторінку GetHistory (максимум Telegram — 100)
+SCAN_PAGE = max(1, min(100, int(os.getenv("SCAN_PAGE", "100") or "100")))
+# запобіжник: сторінок за тік на канал
+SCAN_MAX_PAGES = max(1, int(os.getenv("SCAN_MAX_PAGES", "20") or "20"))
+# скільки часу після публікації ще ловимо правки (0 — правки не відстежуємо)
+SCAN_EDIT_LOOKBACK = parse_duration(os.getenv("SCAN_EDIT_LOOKBACK", "2h"), 7200.0)
+# і не більше стількох останніх постів
+SCAN_EDIT_MAX = int(os.getenv("SCAN_EDIT_MAX", "30") or "0")
+
+
+@dataclass
+class ScanResult:
+    channel_id: int
+    new: List[types.Message] = field(default_factory=list)      # id > попереднього last_id
+    edited: List[types.Message] = field(default_factory=list)   # уже бачені, з новим edit_date
+    rpc: int = 0
+    fetched: int = 0       # повідомлень отримано (разом із вікном правок)
+    bytes: int = 0         # розмір відповідей (серіалізований TL)
+    span: float = 0.0      # секунд між найстаршим і найновішим отриманим постом
+    last_id: int = 0
+    flood: int = 0         # FLOOD_WAIT, сек (курсор тоді не зсувається)
+
+
+def _ensure_cursors() -> None:
+    if core.DB_PATH in _MIGRATED:
+        return
+    _ensure_tables()
+    with _conn() as c:
+        # м'які міграції для курсорів, створених до появи дочитування
+        for col in ("resume_id", "resume_floor", "resume_last"):
+            if not _has_column(c, "scan_cursors", col):
+                c.execute(f"ALTER TABLE scan_cursors ADD COLUMN {col} INTEGER NOT NULL DEFAULT 0;")
+    _MIGRATED.add(core.DB_PATH)
+
+
+def _load_cursor(channel_id: int, account: str) -> Optional[Tuple[int, ...]]:
+    _ensure_cursors()
+    with _conn() as c:
+        row = c.execute(
+            "SELECT last_id, edit_floor, edit_ts, resume_id, resume_floor, resume_last "
+            "FROM scan_cursors WHERE channel_id=? AND account=?",
+            (int(channel_id), account),
+        ).fetchone()
+    return tuple(row) if row else None
+
+
+def get_cursor(channel_id: int, account: str) -> Optional[Tuple[int, int, int]]:
+    """(last_id, edit_floor, edit_ts) або None — канал цим акаунтом ще не сканувався."""
+    row = _load_cursor(channel_id, account)
+    return row[:3] if row else None
+
+
+def get_resume(channel_id: int, account: str) -> Optional[Tuple[int, int, int]]:
+    """(resume_id, resume_floor, resume_last) недочитаного проміжку або None."""
+    row = _load_cursor(channel_id, account)
+    return row[3:] if row and row[3] > 0 else None
+
+
+def save_cursor(channel_id: int, account: str, last_id: int, edit_floor: int, edit_ts: int,
+                resume: Tuple[int, int, int] = (0, 0, 0)) -> None:
+    _ensure_cursors()
+    resume_id, resume_floor, resume_last = resume
+    with _conn() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO scan_cursors(channel_id, account, last_id, edit_floor, edit_ts, ts, "
+            "resume_id, resume_floor, resume_last) VALUES (?,?,?,?,?,?,?,?,?)",
+            (int(channel_id), account, int(last_id), int(edit_floor), int(edit_ts), int(time.time()),
+             int(resume_id), int(resume_floor), int(resume_last)),
+        )
+
+
+def reset_cursor(channel_id: int, account: Optional[str] = None) -> int:
+    """Забуває курсор(и) каналу — наступний тік перечитає find_window з нуля."""
+    _ensure_tables()
+    with _conn() as c:
+        if account is None:
+            cur = c.execute("DELETE FROM scan_cursors WHERE channel_id=?", (int(channel_id),))
+        else:
+            cur = c.execute("DELETE FROM scan_cursors WHERE channel_id=? AND account=?", (int(channel_id), account))
+    return cur.rowcount
+
+
+def _ts(dt) -> int:
+    return int(dt.timestamp()) if dt is not None else 0
+
+
+async def scan_channel(slot: ClientSlot, peer, since: Optional[float] = None,
+                       page: int = SCAN_PAGE) -> ScanResult:
+    """
+    Нове (і відредаговане в межах SCAN_EDIT_LOOKBACK) з каналу peer від імені slot.
+    Перший скан без курсору читає історію до since (unix-ts; None — лише останню сторінку).
+    Повідомлення — сирі types.Message (text/entities/fwd_from/views), від новіших до старіших.
+    Якщо попередній тік уперся в SCAN_MAX_PAGES, цей спершу дочитує пропущений проміжок
+    (нові пости вгорі каналу чекають, доки проміжок не закриється).
+    """
+    client = slot.client
+    account = account_key(slot)
+    channel_id = utils.get_peer_id(peer, add_mark=False)
+    res = ScanResult(channel_id)
+    row = _load_cursor(channel_id, account)
+    cursor = row[:3] if row else None
+    last_id, floor, edit_ts = cursor if cursor else (0, 0, 0)
+    resume_id, resume_floor, resume_last = row[3:] if row else (0, 0, 0)
+    resuming = resume_id > 0
+    # межі цього тіку: (lo, offset_id) і поріг "нового" seen
+    lo, offset_id, seen = (resume_floor, resume_id, resume_last) if resuming else (floor, 0, last_id)
+    # перший скан (або дочитування після нього) обмежуємо since
+    first = cursor is None or (resuming and resume_last == 0)
+    now = time.time()
+
+    msgs: List[types.Message] = []
+    truncated = False
+    try:
+        while res.rpc < SCAN_MAX_PAGES:
+            await rate_limiter.acquire(slot.name, rate_limiter.HISTORY)
+            r = await client(GetHistoryRequest(
+                peer=peer, offset_id=offset_id, offset_date=None, add_offset=0,
+                limit=page, max_id=0, min_id=lo, hash=0,
+            ))
+            res.rpc += 1
+            res.bytes += len(bytes(r))
+            batch = getattr(r, "messages", None) or []
+            if not batch:
+                break
+            msgs.extend(m for m in batch if isinstance(m, types.Message))
+            offset_id = min(m.id for m in batch)
+            if len(batch) < page or offset_id <= lo + 1:
+                break
+            if first and (since is None or _ts(getattr(batch[-1], "date", None)) < since):
+                break
+        else:
+            truncated = True
+            log.warning("history scan: %s channel=%s hit SCAN_MAX_PAGES=%d, resuming below id=%d next tick",
+                        slot.name, channel_id, SCAN_MAX_PAGES, offset_id)
+    except FloodWaitError as e:
+        log.warning("FLOOD in history scan: %s channel=%s seconds=%s", slot.name, channel_id, e.seconds)
+        mark_flood(client, e.seconds)
+        rate_limiter.on_flood(slot.name, rate_limiter.HISTORY, e.seconds)
+        res.flood = e.seconds
+        res.last_id = last_id
+        return res
+    rate_limiter.on_success(slot.name, rate_limiter.HISTORY)
+
+    res.fetched = len(msgs)
+    if len(msgs) > 1:
+        res.span = float(_ts(msgs[0].date) - _ts(msgs[-1].date))
+    new_last, new_edit_ts = last_id, edit_ts
+    lookback_from = now - SCAN_EDIT_LOOKBACK if SCAN_EDIT_LOOKBACK > 0 else now + 1
+    recent_min = None  # найменший id поста, що ще в межах вікна правок
+    for m in msgs:
+        date, edited = _ts(m.date), _ts(m.edit_date)
+        if m.id > seen:
+            if not first or since is None or date >= since:
+                res.new.append(m)
+        elif edited > edit_ts:
+            res.edited.append(m)
+        new_last = max(new_last, m.id)
+        new_edit_ts = max(new_edit_ts, edited)
+        if date >= lookback_from and (recent_min is None or m.id < recent_min):
+            recent_min = m.id
+
+    new_floor = new_last if recent_min is None else recent_min - 1
+    if SCAN_EDIT_MAX > 0:
+        new_floor = max(new_floor, new_last - SCAN_EDIT_MAX)
+    new_floor = max(floor, min(new_floor, new_last))
+    if resuming:
+        # проміжок лежить нижче last_id: вікно правок рахувалося тіком, що його залишив
+        new_floor = floor
+    # пропущене між lo і найстаршим отриманим id дочитає наступний тік
+    resume = (offset_id, lo, seen) if truncated else (0, 0, 0)
+    save_cursor(channel_id, account, new_last, new_floor, new_edit_ts, resume)
+    res.last_id = new_last
+    log.debug("history scan: %s channel=%s new=%d edited=%d fetched=%d rpc=%d",
+              slot.name, channel_id, len(res.new), len(res.edited), res.fetched, res.rpc)
+    return res
@@ -0,0 +1,322 @@
+# app/services/job_scheduler.py
+# Персистентний планувальник періодичних задач (find / mon). Черга — min-heap за next_fire
+# у пам'яті, копія кожної задачі — у SQLite (scheduled_jobs), тож після рестарту задачі
+# продовжуються з тих самих моментів: прострочені запускаються одразу (розмазано), вікно
+# не губиться — остання перевірка завжди припадає на його кінець.
+# Кожен запуск зсувається на випадковий jitter, щоб тисячі перевірок каналів не збігались
+# в одну секунду; jitter іде лише в ключ heap (next_fire) — сітка planned від нього не дрейфує; за тік запускається не більше SCHED_RPC_BUDGET оціночних RPC — решта
+# чекає наступного тіку, а не б'є в FLOOD_WAIT. Обробники йдуть окремими тасками (не більше
+# SCHED_CONCURRENCY одночасно): повільна задача не затримує інші, а наступний запуск
+# планується й зберігається, щойно завершиться саме вона.
+import os, json, time, heapq, random, asyncio, itertools, logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.db import core
+from app.services.db.core import _conn, _ensure_tables, _has_column, register_schema
+
+log = logging.getLogger("services.job_scheduler")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+  job_id    TEXT    PRIMARY KEY,   -- "<kind>:<ref>"
+  kind      TEXT    NOT NULL,      -- find | mon
+  ref       INTEGER NOT NULL,      -- monitor_channels.id / monitors.id
+  interval  REAL    NOT NULL,      -- сек між запусками
+  until     REAL    NOT NULL,      -- кінець вікна (unix-ts); останній запуск — рівно тут
+  next_fire REAL    NOT NULL,      -- фактичний запуск (planned + jitter)
+  planned   REAL,                  -- запланований момент без jitter; від нього рахується наступний
+  cost      INTEGER NOT NULL DEFAULT 1,   -- оцінка RPC одного запуску
+  payload   TEXT,                  -- JSON параметрів задачі
+  ts        INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_next ON scheduled_jobs(next_fire);
+"""
+
+register_schema(DDL)
+
+_MIGRATED: Set[str] = set()
+
+def _f(name: str, default: str) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return float(default)
+
+SCHED_TICK        = max(0.1, _f("SCHED_TICK", "1"))          # сек між тіками
+SCHED_RPC_BUDGET  = max(1, int(_f("SCHED_RPC_BUDGET", "10")))  # оціночних RPC за тік на всі задачі
+SCHED_JITTER      = max(0.0, _f("SCHED_JITTER", "0.1"))      # частка інтервалу
+SCHED_JITTER_MAX  = _f("SCHED_JITTER_MAX", "300")            # але не більше, сек
+SCHED_CATCHUP     = _f("SCHED_CATCHUP", "60")                # прострочені після рестарту — розмазати на стільки сек
+SCHED_CONCURRENCY = max(1, int(_f("SCHED_CONCURRENCY", "8")))
+
+# обробник: async fn(job) -> False, щоб завершити задачу достроково; cost може оновити сам
+Handler = Callable[["Job"], Awaitable[Optional[bool]]]
+
+
+@dataclass(eq=False)
+class Job:
+    job_id: str
+    kind: str
+    ref: int
+    interval: float
+    until: float
+    next_fire: float
+    cost: int = 1
+    payload: Dict[str, Any] = field(default_factory=dict)
+    planned: Optional[float] = None   # next_fire без jitter (None — такий самий, як next_fire)
+    ver: int = 0          # версія актуального запису в heap (старіші — ігноруємо)
+    running: bool = False
+
+    def __post_init__(self):
+        if self.planned is None:
+            self.planned = self.next_fire
+
+
+def _jitter(interval: float) -> float:
+    j = min(interval * SCHED_JITTER, SCHED_JITTER_MAX)
+    return random.uniform(-j, j) if j > 0 else 0.0
+
+
+class JobScheduler:
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[float, int, int, str]] = []   # (next_fire, seq, ver, job_id)
+        self._seq = itertools.count()
+        self._handlers: Dict[str, Handler] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()   # запущені обробники
+        self._loaded = False
+        self.stats: Dict[str, int] = {"fired": 0, "deferred": 0, "failed": 0, "done": 0}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self, kind: Optional[str] = None) -> List[Job]:
+        return [j for j in self._jobs.values() if kind is None or j.kind == kind]
+
+    # ---------- persistence ----------
+
+    @staticmethod
+    def _ensure_schema() -> None:
+        if core.DB_PATH in _MIGRATED:
+            return
+        _ensure_tables()
+        with _conn() as c:
+            # м'яка міграція для задач, збережених до появи planned
+            if not _has_column(c, "scheduled_jobs", "planned"):
+                c.execute("ALTER TABLE scheduled_jobs ADD COLUMN planned REAL;")
+        _MIGRATED.add(core.DB_PATH)
+
+    def _save(self, jobs: List[Job]) -> None:
+        if not jobs:
+            return
+        self._ensure_schema()
+        now = int(time.time())
+        with _conn() as c:
+            c.executemany(
+                "INSERT OR REPLACE INTO scheduled_jobs(job_id, kind, ref, interval, until, next_fire, planned, "
+                "cost, payload, ts) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                [(j.job_id, j.kind, j.ref, j.interval, j.until, j.next_fire, j.planned, j.cost,
+                  json.dumps(j.payload, ensure_ascii=False), now) for j in jobs],
+            )
+
+    def _delete(self, job_ids: List[str]) -> None:
+        if not job_ids:
+            return
+        _ensure_tables()
+        with _conn() as c:
+            c.executemany("DELETE FROM scheduled_jobs WHERE job_id=?", [(x,) for x in job_ids])
+
+    def load(self, now: Optional[float] = None) -> int:
+        """
+        Піднімає задачі з SQLite. Прострочені (процес не працював) — на найближчі
+        SCHED_CATCHUP сек у випадковому порядку; кінець вікна вони не проскакують.
+        """
+        now = time.time() if now is None else now
+        self._loaded = True
+        self._ensure_schema()
+        rows = _conn().execute(
+            "SELECT job_id, kind, ref, interval, until, next_fire, planned, cost, payload FROM scheduled_jobs"
+        ).fetchall()
+        overdue = []
+        for job_id, kind, ref, interval, until, next_fire, planned, cost, payload in rows:
+            job = Job(job_id, kind, int(ref), float(interval), float(until), float(next_fire), int(cost),
+                      json.loads(payload) if payload else {}, None if planned is None else float(planned))
+            if job.next_fire < now:
+                job.next_fire = now + random.uniform(0, max(0.0, SCHED_CATCHUP))
+                overdue.append(job)
+            self._jobs[job_id] = job
+            self._push(job)
+        self._save(overdue)
+        log.info("scheduler: loaded %d jobs (%d overdue)", len(rows), len(overdue))
+        return len(rows)
+
+    # ---------- queue ----------
+
+    def _push(self, job: Job) -> None:
+        job.ver += 1
+        heapq.heappush(self._heap, (job.next_fire, next(self._seq), job.ver, job.job_id))
+        self._wake.set()
+
+    def schedule(self, kind: str, ref: int, interval: float, until: float, cost: int = 1,
+                 payload: Optional[Dict[str, Any]] = None, first_fire: Optional[float] = None) -> Job:
+        """
+        Додає або переозброює задачу "<kind>:<ref>". Перший запуск — first_fire або
+        випадково в межах [зараз, зараз + min(interval, SCHED_JITTER_MAX)], щоб
+        масове озброєння не стріляло одночасно.
+        """
+        now = time.time()
+        if first_fire is None:
+            first_fire = now + random.uniform(0, min(interval, max(SCHED_JITTER_MAX, SCHED_TICK)))
+        job_id = f"{kind}:{ref}"
+        job = self._jobs.get(job_id) or Job(job_id, kind, int(ref), interval, until, first_fire)
+        job.interval, job.until, job.cost = float(interval), float(until), max(1, int(cost))
+        fire = min(float(first_fire), job.until)
+        if fire != job.next_fire:
+            job.planned = fire   # переозброєння з тим самим next_fire лишає сітку planned
+        job.next_fire = fire
+        job.payload = dict(payload or {})
+        self._jobs[job_id] = job
+        self._push(job)
+        self._save([job])
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job.ver += 1   # запис у heap застаріває
+        self._delete([job_id])
+        return True
+
+    def _pop_due(self, now: float, limit: Optional[int] = None) -> List[Job]:
+        """
+        Задачі, яким настав час, у межах SCHED_RPC_BUDGET (і не більше limit); решта лишається в heap.
+        Бюджет списується в момент запуску — за оцінкою cost, а не після завершення.
+        """
+        due: List[Job] = []
+        budget = SCHED_RPC_BUDGET
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+            fire, _, ver, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is None or job.ver != ver or job.running:
+                heapq.heappop(self._heap)
+                continue
+            if due and job.cost > budget:
+                self.stats["deferred"] += 1   # тіків, що вперлися в бюджет
+                break
+            heapq.heappop(self._heap)
+            budget -= job.cost
+            due.append(job)
+        return due
+
+    def _advance(self, job: Job, now: float) -> bool:
+        """
+        Наступний запуск (без дрейфу: від planned, а не фактичного часу чи next_fire з jitter —
+        інакше jitter накопичувався б випадковим блуканням). False — вікно вичерпано.
+        """
+        if max(job.planned, job.next_fire) >= job.until:
+            return False
+        nxt = job.planned + job.interval
+        while nxt <= now:            # пропущені інтервали не наздоганяємо пачкою
+            nxt += job.interval
+        job.planned = min(nxt, job.until)
+        # останній запуск — рівно в кінці вікна, без jitter
+        fire = job.until if job.planned >= job.until else min(nxt + _jitter(job.interval), job.until)
+        job.next_fire = max(now + SCHED_TICK, fire)
+        return True
+
+    async def _fire(self, job: Job) -> Optional[bool]:
+        handler = self._handlers.get(job.kind)
+        if handler is None:
+            log.warning("scheduler: no handler for %s", job.job_id)
+            return None
+        try:
+            return await handler(job)
+        except Exception as e:
+            self.stats["failed"] += 1
+            log.exception("scheduler: job %s failed: %s", job.job_id, e)
+            return None
+
+    def _finished(self, job: Job, ver: int, task: asyncio.Task) -> None:
+        """Колбек завершення обробника: наступний запуск (або кінець задачі) — лише для цієї задачі."""
+        self._running.discard(task)
+        job.running = False
+        self._wake.set()   # звільнилось місце під SCHED_CONCURRENCY
+        if task.cancelled() or self._jobs.get(job.job_id) is not job:
+            return   # зупинка / скасовано під час запуску
+        if job.ver != ver:
+            # переозброєно під час запуску (schedule) — лишаємо новий next_fire
+            self._push(job)
+            return
+        if task.result() is False or not self._advance(job, time.time()):
+            self._jobs.pop(job.job_id, None)
+            self._delete([job.job_id])
+            self.stats["done"] += 1
+            return
+        self._push(job)
+        self._save([job])
+
+    async def tick(self, now: Optional[float] = None) -> int:
+        """
+        Запускає задачі, яким настав час (в межах бюджету і вільних місць SCHED_CONCURRENCY),
+        окремими тасками й не чекає їх. Повертає к-сть запущених.
+        """
+        now = time.time() if now is None else now
+        free = SCHED_CONCURRENCY - len(self._running)
+        due = self._pop_due(now, free) if free > 0 else []
+        for job in due:
+            job.running = True
+            task = asyncio.ensure_future(self._fire(job))
+            self._running.add(task)
+            task.add_done_callback(lambda t, job=job, ver=job.ver: self._finished(job, ver, t))
+        self.stats["fired"] += len(due)
+        return len(due)
+
+    async def join(self) -> None:
+        """Чекає, доки завершаться всі запущені обробники (тести / зупинка)."""
+        while self._running:
+            await asyncio.gather(*list(self._running), return_exceptions=True)
+            await asyncio.sleep(0)   # колбеки завершення
+
+    async def run(self) -> None:
+        """
+        Основний цикл: спить до найближчого next_fire (або SCHED_TICK), далі tick().
+        Прокидається й тоді, коли обробник завершився і звільнив місце.
+        """
+        if not self._loaded:
+            self.load()
+        try:
+            while True:
+                self._wake.clear()
+                fired = await self.tick(time.time())
+                if fired:
+                    await asyncio.sleep(SCHED_TICK)   # бюджет — на тік, не частіше
+                    continue
+                wait = SCHED_TICK * 30
+                if self._heap:
+                    wait = min(wait, max(SCHED_TICK, self._heap[0][0] - time.time()))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in list(self._running):
+                task.cancel()
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+
+# спільний планувальник процесу
+SCHEDULER = JobScheduler()
@@ -3,16 +3,20 @@ import logging
 from telethon.errors import (
     InviteHashInvalidError, InviteHashExpiredError,
     UserAlreadyParticipantError, FloodWaitError,
-    UsernameNotOccupiedError, ChannelPrivateError,
+    UsernameNotOccupiedError, UsernameInvalidError, ChannelPrivateError, ChannelInvalidError,
 )
+from telethon.tl import types
 from telethon.tl.functions.channels import JoinChannelRequest
 from telethon.tl.functions.messages import ImportChatInviteRequest
 
+from app.services import entity_cache, rate_limiter
+from app.services.account_pool import session_name
 from app.services.membership_db import map_invite_set, map_invite_get
+from app.utils.tg_links import username_from_url
 
 log = logging.getLogger("services.joiner")
 
-def _extract_invite_hash(url: str) -> str | None:
+def extract_invite_hash(url: str) -> str | None:
     """
     Витягує інвайт-хеш із URL (формати t.me/+HASH або .../joinchat/HASH).
     Повертає None, якщо не схоже.
@@ -21,7 +25,7 @@ def _extract_invite_hash(url: str) -> str | None:
         if not url:
             return None
         if ("/+" in url) or ("joinchat" in url):
-            part = url.rstrip("/").split("")[-1]
+            part = url.rstrip("/").split("/")[-1]
             part = part.replace("+", "")
             return part or None
         return None
@@ -43,6 +47,10 @@ def _plausible_invite_hash(h: str | None) -> bool:
             return False
     return True
 
+def join_family(url: str) -> str:
+    """Сімейство rate_limiter, яке витрачає ensure_join для url (інвайт — IMPORT, інакше JOIN)."""
+    return rate_limiter.IMPORT if extract_invite_hash(url) else rate_limiter.JOIN
+
 async def probe_channel_id(client, url: str):
     """
     Повертає (channel_id, title, kind, invite_hash)
@@ -50,7 +58,7 @@ async def probe_channel_id(client, url: str):
 
     Для інвайтів: лише локальні/кеш перевірки (жодних мережевих CheckChatInviteRequest).
     """
-    invite_hash = _extract_invite_hash(url)
+    invite_hash = extract_invite_hash(url)
     if invite_hash:
         # 0) локальна форма
         if not _plausible_invite_hash(invite_hash):
@@ -59,9 +67,9 @@ async def probe_channel_id(client, url: str):
 
         # 1) кеш відповідності
         try:
-            cid_cached, title_cached = map_invite_get(invite_hash)
+            cid_cached = map_invite_get(invite_hash)
             if cid_cached:
-                return int(cid_cached), (title_cached or None), "invite", invite_hash
+                return int(cid_cached), None, "invite", invite_hash
         except Exception:
             pass
 
@@ -73,22 +81,74 @@ async def probe_channel_id(client, url: str):
         s = (url or "").strip()
         if not s or " " in s:
             return None, None, "public", None
-        # TODO throttle_probe if/when introduced
+        account = session_name(client)
+        username = username_from_url(s)
+        if username:
+            cached = entity_cache.lookup(account, username)
+            if cached:
+                return cached.channel_id, cached.title, "public", None
+        # темп resolve тримає rate_limiter усередині _get_entity_cached
         log.debug("probe_channel_id: get_entity for %s", url)
-        ent = await client.get_entity(url)
+        ent = await _get_entity_cached(client, account, username, url)
         cid = int(getattr(ent, "id", 0) or 0)
         title = getattr(ent, "title", None)
         return cid if cid else None, title, "public", None
     except FloodWaitError as e:
         log.warning("FLOOD in probe_channel_id(get_entity): url=%s seconds=%s", url, e.seconds)
         raise
-    except UsernameNotOccupiedError:
+    except (UsernameNotOccupiedError, UsernameInvalidError):
         return None, None, "public", None
     except ChannelPrivateError:
         return None, None, "public", None
     except Exception:
         return None, None, "public", None
 
+async def _get_entity_cached(client, account: str, username: str | None, url: str):
+    """
+    client.get_entity(url) з записом результату в entity_cache (позитивним — для каналів,
+    негативним — для UsernameNotOccupied).
+    """
+    try:
+        await rate_limiter.acquire(account, rate_limiter.RESOLVE)
+        ent = await client.get_entity(url)
+    except FloodWaitError as e:
+        rate_limiter.on_flood(account, rate_limiter.RESOLVE, e.seconds)
+        raise
+    except (UsernameNotOccupiedError, UsernameInvalidError):
+        if username:
+            entity_cache.put_negative(account, username)
+        raise
+    rate_limiter.on_success(account, rate_limiter.RESOLVE)
+    if username and isinstance(ent, types.Channel):
+        entity_cache.put(account, username, ent.id, ent.access_hash, getattr(ent, "title", None))
+    return ent
+
+async def resolve_channel(client, url: str):
+    """
+    Повертає (peer, title, channel_id) для JoinChannelRequest.
+    Якщо є свіжий кеш — InputChannel без жодного RPC; негативний кеш → UsernameNotOccupiedError.
+    """
+    account = session_name(client)
+    username = username_from_url(url)
+    if username:
+        cached = entity_cache.lookup(account, username)
+        if cached and cached.negative:
+            raise UsernameNotOccupiedError(request=None)
+        if cached and cached.access_hash is not None:
+            return types.InputChannel(cached.channel_id, cached.access_hash), cached.title, cached.channel_id
+    ent = await _get_entity_cached(client, account, username, url)
+    return ent, getattr(ent, "title", None), int(getattr(ent, "id", 0) or 0)
+
+async def _join_channel(client, account: str, peer) -> None:
+    """JoinChannelRequest у темпі відра JOIN; FLOOD_WAIT/успіх підживлюють адаптивну модель."""
+    await rate_limiter.acquire(account, rate_limiter.JOIN)
+    try:
+        await client(JoinChannelRequest(peer))
+    except FloodWaitError as e:
+        rate_limiter.on_flood(account, rate_limiter.JOIN, e.seconds)
+        raise
+    rate_limiter.on_success(account, rate_limiter.JOIN)
+
 async def ensure_join(client, url: str):
     """
     Реальна спроба приєднання.
@@ -97,17 +157,21 @@ async def ensure_join(client, url: str):
     status: joined / already / invalid / private / flood_wait_<sec> / too_many /
             blocked / requested / error
     """
-    invite_hash = _extract_invite_hash(url)
+    invite_hash = extract_invite_hash(url)
     is_invite = bool(invite_hash)
+    account = session_name(client)
 
     try:
         if is_invite:
             try:
                 log.debug("ensure_join: ImportChatInviteRequest for %s", url)
+                await rate_limiter.acquire(account, rate_limiter.IMPORT)
                 updates = await client(ImportChatInviteRequest(invite_hash))
             except FloodWaitError as e:
                 log.warning("FLOOD in ensure_join(ImportChatInviteRequest): url=%s seconds=%s", url, e.seconds)
+                rate_limiter.on_flood(account, rate_limiter.IMPORT, e.seconds)
                 raise
+            rate_limiter.on_success(account, rate_limiter.IMPORT)
             ch = updates.chats[0] if getattr(updates, "chats", None) else None
             cid = int(ch.id) if ch else None
             title = getattr(ch, "title", "?") if ch else "?"
@@ -118,16 +182,26 @@ async def ensure_join(client, url: str):
                     pass
             return "joined", title, "invite", cid, invite_hash
 
-        ent = await client.get_entity(url)
+        peer, title, cid = await resolve_channel(client, url)
         try:
-            await client(JoinChannelRequest(ent))
-            return "joined", getattr(ent, "title", "?"), "public", int(getattr(ent, "id", 0) or 0), invite_hash
+            try:
+                await _join_channel(client, account, peer)
+            except ChannelInvalidError:
+                if not isinstance(peer, types.InputChannel):
+                    raise
+                # access_hash із кешу застарів — забуваємо і резолвимо заново
+                username = username_from_url(url)
+                if username:
+                    entity_cache.forget(account, username)
+                peer, title, cid = await resolve_channel(client, url)
+                await _join_channel(client, account, peer)
+            return "joined", title or "?", "public", cid or None, invite_hash
         except UserAlreadyParticipantError:
-            return "already", getattr(ent, "title", None), "public", int(getattr(ent, "id", 0) or 0), invite_hash
+            return "already", title, "public", cid or None, invite_hash
 
     except UserAlreadyParticipantError:
         return "already", None, "invite" if is_invite else "public", None, invite_hash
-    except (InviteHashInvalidError, InviteHashExpiredError, UsernameNotOccupiedError):
+    except (InviteHashInvalidError, InviteHashExpiredError, UsernameNotOccupiedError, UsernameInvalidError):
         return "invalid", None, "invite" if is_invite else "public", None, invite_hash
     except ChannelPrivateError:
         return "private", None, "invite" if is_invite else "public", None, invite_hash
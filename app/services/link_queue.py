@@ -1,11 +1,9 @@
-import os, sqlite3, time
+import os, time, asyncio
 from typing import List, Optional, Tuple
 
-DB_PATH = os.getenv("DB_PATH", "post_watchdog.sqlite3")
+from app.services.db.core import _conn, _ensure_tables, _has_column, configure, register_schema
 
 DDL = """
-PRAGMA journal_mode=WAL;
-
 CREATE TABLE IF NOT EXISTS link_queue (
   id            INTEGER PRIMARY KEY AUTOINCREMENT,
   url           TEXT NOT NULL,
@@ -16,7 +14,9 @@ CREATE TABLE IF NOT EXISTS link_queue (
   last_error    TEXT,
   batch_id      TEXT,                     -- опційний тег партії/сеансу
   origin_chat   INTEGER,                  -- звідки прийшло (для нотифів)
-  origin_msg    INTEGER
+  origin_msg    INTEGER,
+  claim_owner   TEXT,                     -- хто взяв у роботу (processing)
+  claim_until   INTEGER                   -- дедлайн оренди; після нього reaper повертає у queued
 );
 CREATE INDEX IF NOT EXISTS idx_lq_state_next ON link_queue(state, next_try_ts);
 CREATE UNIQUE INDEX IF NOT EXISTS uq_lq_url_active
@@ -24,37 +24,69 @@ CREATE UNIQUE INDEX IF NOT EXISTS uq_lq_url_active
   WHERE state IN ('queued','processing');
 """
 
-def _conn():
-    c = sqlite3.connect(DB_PATH)
-    c.execute("PRAGMA busy_timeout=3000;")
-    return c
+register_schema(DDL)
+
+# як часто (сек) перевіряти PRAGMA data_version, щоб помітити enqueue з інших процесів
+LQ_WATCH_INTERVAL = float(os.getenv("LQ_WATCH_INTERVAL", "2"))
+
+_WAKE: Optional[asyncio.Event] = None               # сигнал "щось додали" для воркера
+_WAKE_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+# скільки триває оренда claim (сек); воркер подовжує її перед кожною спробою
+LQ_CLAIM_LEASE = int(os.getenv("LQ_CLAIM_LEASE", "300"))
 
 def init(db_path: Optional[str] = None):
-    global DB_PATH
-    if db_path:
-        DB_PATH = db_path
+    configure(db_path)
+    _ensure_tables()
     with _conn() as c:
-        for stmt in filter(None, DDL.split(";")):
-            s = stmt.strip()
-            if s: c.execute(s)
+        # м'які міграції для БД, створених до появи claim-ів
+        for col, typ in (("claim_owner", "TEXT"), ("claim_until", "INTEGER")):
+            if not _has_column(c, "link_queue", col):
+                c.execute(f"ALTER TABLE link_queue ADD COLUMN {col} {typ};")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_lq_state_claim ON link_queue(state, claim_until);")
 
-def enqueue(urls: List[str], batch_id: Optional[str], origin_chat: Optional[int], origin_msg: Optional[int], delay_sec: int = 0) -> int:
-    """Додає у чергу нові URL (яких немає у стані queued/processing). Повертає к-сть доданих."""
+ENQUEUE_CHUNK = 500
+
+# ON CONFLICT з WHERE — ціль конфлікту саме частковий індекс uq_lq_url_active
+_SQL_ENQUEUE = """INSERT INTO link_queue(url,state,tries,added_ts,next_try_ts,last_error,batch_id,origin_chat,origin_msg)
+                  VALUES(?,?,?,?,?,?,?,?,?)
+                  ON CONFLICT(url) WHERE state IN ('queued','processing') DO NOTHING"""
+
+def enqueue_bulk(urls: List[str], batch_id: Optional[str], origin_chat: Optional[int], origin_msg: Optional[int],
+                 delay_sec: int = 0, chunk: int = ENQUEUE_CHUNK) -> Tuple[int, int]:
+    """
+    Пакетне додавання URL у чергу: по chunk рядків в одній транзакції,
+    дублікати (вже queued/processing або повтори всередині пакета) пропускає індекс.
+    Повертає (added, skipped). Лічильники точні і при паралельних enqueue з інших
+    потоків/процесів: рахуємо лише зміни власного з'єднання (total_changes).
+    """
     if not urls:
-        return 0
+        return 0, 0
     now = int(time.time())
-    count = 0
-    with _conn() as c:
-        for u in urls:
-            try:
-                c.execute("""INSERT INTO link_queue(url,state,tries,added_ts,next_try_ts,last_error,batch_id,origin_chat,origin_msg)
-                             VALUES(?,?,?,?,?,?,?,?,?)""",
-                          (u, "queued", 0, now, now + max(0, int(delay_sec)), None, batch_id, origin_chat, origin_msg))
-                count += 1
-            except sqlite3.IntegrityError:
-                # вже queued/processing — пропускаємо
-                pass
-    return count
+    next_try = now + max(0, int(delay_sec))
+    added = 0
+    for i in range(0, len(urls), max(1, chunk)):
+        rows = [(u, "queued", 0, now, next_try, None, batch_id, origin_chat, origin_msg)
+                for u in urls[i:i + chunk]]
+        # як і решта шару БД: контекст з'єднання комітить чанк (і незакриту неявну
+        # транзакцію цього ж потоку) або відкочує його
+        with _conn() as c:
+            before = c.total_changes
+            c.executemany(_SQL_ENQUEUE, rows)
+            added += c.total_changes - before
+    if added:
+        _signal_enqueued()
+    return added, len(urls) - added
+
+async def enqueue_async(urls: List[str], batch_id: Optional[str], origin_chat: Optional[int], origin_msg: Optional[int],
+                        delay_sec: int = 0) -> Tuple[int, int]:
+    """enqueue_bulk поза event loop (у потоці зі своїм з'єднанням). Повертає (added, skipped)."""
+    return await asyncio.to_thread(enqueue_bulk, urls, batch_id, origin_chat, origin_msg, delay_sec)
+
+def enqueue(urls: List[str], batch_id: Optional[str], origin_chat: Optional[int], origin_msg: Optional[int], delay_sec: int = 0) -> int:
+    """Додає у чергу нові URL (яких немає у стані queued/processing). Повертає к-сть доданих."""
+    added, _ = enqueue_bulk(urls, batch_id, origin_chat, origin_msg, delay_sec)
+    return added
 
 def fetch_due(limit: int = 20) -> List[Tuple[int,str,int,Optional[int],Optional[int]]]:
     """Повертає список записів, що час їх обробити: [(id, url, tries, origin_chat, origin_msg), ...]"""
@@ -67,26 +99,127 @@ def fetch_due(limit: int = 20) -> List[Tuple[int,str,int,Optional[int],Optional[
                            LIMIT ?""", (now, limit))
         return [(int(r[0]), r[1], int(r[2]), r[3], r[4]) for r in cur.fetchall()]
 
-def mark_processing(item_id: int):
+def mark_processing(item_id: int, owner: Optional[str] = None, lease_sec: int = LQ_CLAIM_LEASE):
+    with _conn() as c:
+        c.execute("UPDATE link_queue SET state='processing', claim_owner=?, claim_until=? WHERE id=?",
+                  (owner, int(time.time()) + max(1, int(lease_sec)), item_id))
+
+_SQL_CLAIM = """UPDATE link_queue
+                SET state='processing', claim_owner=?, claim_until=?
+                WHERE id IN (SELECT id FROM link_queue
+                             WHERE state='queued' AND next_try_ts<=?
+                             ORDER BY added_ts ASC
+                             LIMIT ?)
+                RETURNING id,url,tries,origin_chat,origin_msg"""
+
+def claim_due(owner: str, limit: int = 1, lease_sec: int = LQ_CLAIM_LEASE) -> List[Tuple[int,str,int,Optional[int],Optional[int]]]:
+    """
+    Атомарно бере у роботу до limit записів, яким час (одним UPDATE ... RETURNING):
+    state=processing, claim_owner=owner, claim_until=now+lease_sec.
+    Безпечно для кількох воркерів/процесів на одній БД — запис отримає лише один.
+    """
+    now = int(time.time())
+    with _conn() as c:
+        rows = c.execute(_SQL_CLAIM, (owner, now + max(1, int(lease_sec)), now, int(limit))).fetchall()
+    rows.sort(key=lambda r: r[0])
+    return [(int(r[0]), r[1], int(r[2]), r[3], r[4]) for r in rows]
+
+def extend_claim(item_id: int, owner: str, lease_sec: int = LQ_CLAIM_LEASE) -> bool:
+    """Подовжує оренду; False — claim уже втрачено (reaper повернув запис у чергу)."""
     with _conn() as c:
-        c.execute("UPDATE link_queue SET state='processing' WHERE id=?", (item_id,))
+        cur = c.execute("""UPDATE link_queue SET claim_until=?
+                           WHERE id=? AND state='processing' AND claim_owner=?""",
+                        (int(time.time()) + max(1, int(lease_sec)), item_id, owner))
+        return cur.rowcount > 0
 
-def mark_done(item_id: int):
+def reap_expired() -> int:
+    """
+    Повертає у queued записи, чия оренда минула (або взяті без оренди — напр. після падіння процесу).
+    Повертає кількість повернутих.
+    """
+    now = int(time.time())
     with _conn() as c:
-        c.execute("UPDATE link_queue SET state='done', last_error=NULL WHERE id=?", (item_id,))
+        cur = c.execute("""UPDATE link_queue
+                           SET state='queued', claim_owner=NULL, claim_until=NULL,
+                               last_error='claim_expired', next_try_ts=MIN(next_try_ts, ?)
+                           WHERE state='processing' AND (claim_until IS NULL OR claim_until<?)""",
+                        (now, now))
+        n = cur.rowcount or 0
+    if n:
+        _signal_enqueued()
+    return n
+
+# owner=None — без перевірки власника (старі виклики); інакше оновлюємо лише свій claim
+_SQL_DONE = """UPDATE link_queue SET state='done', last_error=NULL, claim_owner=NULL, claim_until=NULL
+               WHERE id=? AND (? IS NULL OR claim_owner=?)"""
 
-def mark_failed(item_id: int, error: str, backoff_sec: int, max_retries: int = 5):
+_SQL_FAILED = """UPDATE link_queue
+                 SET tries=tries+1, last_error=?,
+                     state=CASE WHEN tries+1>=? THEN 'failed' ELSE 'queued' END,
+                     next_try_ts=CASE WHEN tries+1>=? THEN next_try_ts ELSE ? END,
+                     claim_owner=NULL, claim_until=NULL
+                 WHERE id=? AND (? IS NULL OR claim_owner=?)"""
+
+def mark_done(item_id: int, owner: Optional[str] = None) -> bool:
+    with _conn() as c:
+        return c.execute(_SQL_DONE, (item_id, owner, owner)).rowcount > 0
+
+def mark_failed(item_id: int, error: str, backoff_sec: int, max_retries: int = 5, owner: Optional[str] = None) -> bool:
     """Позначає failed з бекофом; якщо tries >= max_retries → переводимо у final failed (не перевкладаємо)."""
     now = int(time.time())
     with _conn() as c:
-        cur = c.execute("SELECT tries FROM link_queue WHERE id=?", (item_id,)).fetchone()
-        tries = int(cur[0]) if cur else 0
-        tries += 1
-        if tries >= max_retries:
-            c.execute("UPDATE link_queue SET state='failed', tries=?, last_error=? WHERE id=?",
-                      (tries, error[:500], item_id))
-        else:
-            c.execute("""UPDATE link_queue
-                         SET state='queued', tries=?, last_error=?, next_try_ts=?
-                         WHERE id=?""",
-                      (tries, error[:500], now + max(5, int(backoff_sec)), item_id))
\ No newline at end of file
+        cur = c.execute(_SQL_FAILED, (error[:500], int(max_retries), int(max_retries),
+                                      now + max(5, int(backoff_sec)), item_id, owner, owner))
+        return cur.rowcount > 0
+
+# ---------- очікування роботи (замість фіксованого polling) ----------
+
+def _signal_enqueued() -> None:
+    """Будить воркер; безпечно викликати з будь-якого потоку."""
+    ev, loop = _WAKE, _WAKE_LOOP
+    if ev is None or loop is None or loop.is_closed():
+        return
+    try:
+        loop.call_soon_threadsafe(ev.set)
+    except RuntimeError:
+        pass
+
+def next_due_ts() -> Optional[int]:
+    """Найраніший next_try_ts серед queued (індекс idx_lq_state_next), або None, якщо черга порожня."""
+    with _conn() as c:
+        row = c.execute("SELECT MIN(next_try_ts) FROM link_queue WHERE state='queued'").fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+def _data_version() -> int:
+    # змінюється, коли БД закомітило *інше* з'єднання (інший потік/процес)
+    return int(_conn().execute("PRAGMA data_version").fetchone()[0])
+
+async def wait_for_work(timeout: Optional[float]) -> str:
+    """
+    Спить, доки не станеться одне з:
+      - enqueue у цьому процесі ('enqueued'),
+      - коміт у БД з іншого з'єднання/процесу, помічений через data_version ('external'),
+      - минув timeout, напр. до найближчого next_try_ts ('timeout').
+    """
+    global _WAKE, _WAKE_LOOP
+    loop = asyncio.get_running_loop()
+    if _WAKE is None or _WAKE_LOOP is not loop:
+        _WAKE, _WAKE_LOOP = asyncio.Event(), loop
+    ev = _WAKE
+    deadline = None if timeout is None else loop.time() + max(0.0, timeout)
+    version = _data_version()
+    while True:
+        step = LQ_WATCH_INTERVAL
+        if deadline is not None:
+            left = deadline - loop.time()
+            if left <= 0:
+                return "timeout"
+            step = min(step, left)
+        try:
+            await asyncio.wait_for(ev.wait(), step)
+            ev.clear()
+            return "enqueued"
+        except asyncio.TimeoutError:
+            pass
+        if _data_version() != version:
+            return "external"
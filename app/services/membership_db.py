@@ -1,15 +1,15 @@
-import os, sqlite3, time
-from typing import Optional
+import os, time, logging
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional
 
-DB_PATH = os.getenv("DB_PATH", "post_watchdog.sqlite3")
+from app.services.db.core import _conn, _ensure_tables, configure, register_schema
 
 DDL = """
-PRAGMA journal_mode=WAL;
-
 CREATE TABLE IF NOT EXISTS membership (
   channel_id INTEGER NOT NULL,
   account    TEXT    NOT NULL,
-  status     TEXT    NOT NULL,   -- joined/already/requested/invalid/private/blocked/too_many
+  status     TEXT    NOT NULL,   -- joined/already/requested/invalid/private/blocked/too_many/not_member
   ts         INTEGER NOT NULL,
   PRIMARY KEY (channel_id, account)
 );
@@ -30,57 +30,256 @@ CREATE TABLE IF NOT EXISTS url_cache (
 CREATE INDEX IF NOT EXISTS idx_urlcache_status ON url_cache(status);
 """
 
+register_schema(DDL)
+
+log = logging.getLogger("services.membership_db")
+
 FINAL_GLOBAL = ("joined", "already", "requested", "invalid", "private")
 FINAL_PER_ACC = ("joined", "already", "requested", "invalid", "private", "blocked", "too_many")
 
+# межі in-memory кешу (к-сть каналів / URL / інвайтів)
+MEMB_CACHE_CHANNELS = int(os.getenv("MEMB_CACHE_CHANNELS", "200000"))
+URL_CACHE_MAX       = int(os.getenv("URL_CACHE_MAX", "200000"))
+INVITE_CACHE_MAX    = int(os.getenv("INVITE_CACHE_MAX", "100000"))
+# як часто (сек) звіряти PRAGMA data_version (сама звірка коштує як запит у БД);
+# 0 — перед кожним читанням
+MEMB_CACHE_CHECK    = float(os.getenv("MEMB_CACHE_CHECK", "1") or "0")
 
-def _conn():
-    c = sqlite3.connect(DB_PATH)
-    c.execute("PRAGMA busy_timeout=3000;")
-    return c
 
+# ---------- in-memory кеш (write-through) ----------
+# Читання йдуть у SQLite лише на промахах. Записи цього процесу оновлюють кеш одразу;
+# коміти інших з'єднань (інший процес чи потік на тій самій БД — напр. кілька воркерів
+# link_queue) помічаємо через PRAGMA data_version перед читанням і скидаємо кеш.
 
-def init(db_path: Optional[str] = None):
-    """Створює таблиці (якщо їх ще нема)."""
-    global DB_PATH
-    if db_path:
-        DB_PATH = db_path
+class _LRU(OrderedDict):
+    """OrderedDict із межею розміру; complete=True — у кеші вся таблиця, промах означає «нема запису»."""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = max(1, int(maxsize))
+        self.complete = False
+
+    def put(self, key, value) -> None:
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+            self.complete = False
+
+
+_CHANNELS = _LRU(MEMB_CACHE_CHANNELS)  # channel_id -> {account: status} (усі рядки каналу)
+_URLS     = _LRU(URL_CACHE_MAX)        # url -> status | None
+_INVITES  = _LRU(INVITE_CACHE_MAX)     # invite_hash -> channel_id | None
+_STATS: Dict[str, int] = dict.fromkeys(
+    ("memb_hits", "memb_misses", "url_hits", "url_misses", "invite_hits", "invite_misses", "invalidations"), 0
+)
+_VERSIONS: Dict[int, int] = {}   # id(з'єднання) -> data_version, з яким узгоджено кеш
+_last_check = 0.0
+
+
+def _data_version(c) -> int:
+    # змінюється, коли БД закомітило *інше* з'єднання (інший потік/процес)
+    return int(c.execute("PRAGMA data_version").fetchone()[0])
+
+
+def _sync() -> None:
+    """
+    Скидає кеш, якщо з моменту останньої звірки БД змінило інше з'єднання: інакше промах
+    при complete=True відповів би «запису нема», хоча інший процес його вже записав.
+    """
+    global _last_check
+    if MEMB_CACHE_CHECK > 0:
+        now = time.monotonic()
+        if now - _last_check < MEMB_CACHE_CHECK:
+            return
+        _last_check = now
+    c = _conn()
+    v = _data_version(c)
+    if _VERSIONS.get(id(c)) == v:
+        return
+    _VERSIONS[id(c)] = v
+    if _CHANNELS or _URLS or _INVITES or _CHANNELS.complete or _URLS.complete or _INVITES.complete:
+        _STATS["invalidations"] += 1
+        cache_clear()
+        log.debug("membership cache invalidated: db changed by another connection")
+
+
+def _preload() -> None:
     with _conn() as c:
-        for stmt in filter(None, DDL.strip().split(";")):
-            s = stmt.strip()
-            if s:
-                c.execute(s)
+        rows = c.execute("SELECT channel_id, account, status FROM membership ORDER BY channel_id").fetchall()
+        for cid, acc, st in rows:
+            ch = _CHANNELS.get(cid)
+            if ch is None:
+                ch = {}
+                _CHANNELS.put(cid, ch)
+            ch[acc] = st
+        _CHANNELS.complete = len(_CHANNELS) >= len({r[0] for r in rows})
+
+        n = 0
+        for url, st in c.execute("SELECT url, status FROM url_cache"):
+            _URLS.put(url, st); n += 1
+        _URLS.complete = len(_URLS) >= n
+
+        n = 0
+        for h, cid in c.execute("SELECT invite_hash, channel_id FROM invite_map"):
+            _INVITES.put(h, int(cid) if cid is not None else None); n += 1
+        _INVITES.complete = len(_INVITES) >= n
+
+
+def cache_clear() -> None:
+    for cache in (_CHANNELS, _URLS, _INVITES):
+        cache.clear()
+        cache.complete = False
+
+
+def cache_stats() -> Dict[str, int]:
+    """Лічильники hit/miss та розміри кешів."""
+    out = dict(_STATS)
+    out.update(channels=len(_CHANNELS), urls=len(_URLS), invites=len(_INVITES))
+    return out
+
+
+def init(db_path: Optional[str] = None):
+    """Створює таблиці (якщо їх ще нема) і прогріває кеш."""
+    configure(db_path)
+    _ensure_tables()
+    cache_clear()
+    _preload()
+    c = _conn()
+    _VERSIONS.clear()
+    _VERSIONS[id(c)] = _data_version(c)
+    log.info("membership cache preloaded: channels=%d (complete=%s) urls=%d invites=%d",
+             len(_CHANNELS), _CHANNELS.complete, len(_URLS), len(_INVITES))
+
+
+_IN_CHUNK = 500  # к-сть параметрів у IN (...) за один запит
+
+
+def _chunks(items: List, n: int = _IN_CHUNK):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
 
 
 # ---------- membership (пер-акаунтний стан у каналі) ----------
 
+def _channel(channel_id: int) -> Mapping[str, str]:
+    """
+    Усі статуси акаунтів для каналу — з кешу або одним запитом.
+    Повертає read-only view: запис у неї зіпсував би write-through кеш.
+    """
+    _sync()
+    ch = _CHANNELS.get(channel_id)
+    if ch is not None:
+        _STATS["memb_hits"] += 1
+        _CHANNELS.move_to_end(channel_id)
+        return MappingProxyType(ch)
+    if _CHANNELS.complete:
+        _STATS["memb_hits"] += 1
+        ch = {}
+    else:
+        _STATS["memb_misses"] += 1
+        with _conn() as c:
+            ch = dict(c.execute("SELECT account, status FROM membership WHERE channel_id=?", (channel_id,)))
+    _CHANNELS.put(channel_id, ch)
+    return MappingProxyType(ch)
+
+
 def upsert_membership(account: str, channel_id: int, status: str):
+    channel_id = int(channel_id)
     with _conn() as c:
         c.execute(
             "INSERT OR REPLACE INTO membership(channel_id,account,status,ts) VALUES (?,?,?,?)",
-            (int(channel_id), account, status, int(time.time())),
+            (channel_id, account, status, int(time.time())),
         )
+    ch = _CHANNELS.get(channel_id)
+    if ch is not None:
+        ch[account] = status
+    elif _CHANNELS.complete:
+        _CHANNELS.put(channel_id, {account: status})
+    # інакше канал не в кеші — наступне читання підтягне всі його рядки
 
 
-def get_membership(account: str, channel_id: int) -> Optional[str]:
+def upsert_membership_many(account: str, channel_ids: Iterable[int], status: str) -> int:
+    """
+    Пакетний upsert одного статусу для багатьох каналів акаунта (одна транзакція).
+    Наявний "joined" не перетирається — він інформативніший за "already".
+    """
+    ids = list(dict.fromkeys(int(x) for x in channel_ids))
+    if not ids:
+        return 0
+    now = int(time.time())
     with _conn() as c:
-        cur = c.execute(
-            "SELECT status FROM membership WHERE channel_id=? AND account=? LIMIT 1",
-            (int(channel_id), account),
+        c.executemany(
+            "INSERT INTO membership(channel_id,account,status,ts) VALUES (?,?,?,?) "
+            "ON CONFLICT(channel_id,account) DO UPDATE SET status=excluded.status, ts=excluded.ts "
+            "WHERE membership.status <> 'joined'",
+            [(cid, account, status, now) for cid in ids],
         )
-        row = cur.fetchone()
-        return row[0] if row else None
+    for cid in ids:
+        ch = _CHANNELS.get(cid)
+        if ch is not None:
+            if ch.get(account) != "joined":
+                ch[account] = status
+        elif _CHANNELS.complete:
+            _CHANNELS.put(cid, {account: status})
+    return len(ids)
+
+
+def get_membership(account: str, channel_id: int) -> Optional[str]:
+    return _channel(int(channel_id)).get(account)
 
 
 def any_final_for_channel(channel_id: int) -> Optional[str]:
     """Повертає один із FINAL_GLOBAL, якщо є у когось для цього каналу (глобальний блокер повторних спроб)."""
+    for st in _channel(int(channel_id)).values():
+        if st in FINAL_GLOBAL:
+            return st
+    return None
+
+
+def channels_many(channel_ids: Iterable[int]) -> Dict[int, Dict[str, str]]:
+    """
+    {channel_id: {account: status}} для набору каналів: кеш + один IN-запит на кожні _IN_CHUNK промахів.
+    Словники — копії: кеш змінюють лише upsert_*.
+    """
+    _sync()
+    out: Dict[int, Dict[str, str]] = {}
+    miss: List[int] = []
+    for cid in dict.fromkeys(int(x) for x in channel_ids):
+        ch = _CHANNELS.get(cid)
+        if ch is not None or _CHANNELS.complete:
+            _STATS["memb_hits"] += 1
+            out[cid] = ch if ch is not None else {}
+        else:
+            _STATS["memb_misses"] += 1
+            miss.append(cid)
+            out[cid] = {}
+    if miss:
+        with _conn() as c:
+            for part in _chunks(miss):
+                q = f"SELECT channel_id, account, status FROM membership WHERE channel_id IN ({','.join('?'*len(part))})"
+                for cid, acc, st in c.execute(q, part):
+                    out[cid][acc] = st
+    for cid in out:
+        if cid not in _CHANNELS:
+            _CHANNELS.put(cid, out[cid])
+    return {cid: dict(ch) for cid, ch in out.items()}
+
+
+def not_member_ts(channel_id: int) -> Dict[str, int]:
+    """{account: ts} рядків "not_member" каналу — для повторної перевірки за TTL (кеш ts не тримає)."""
     with _conn() as c:
-        cur = c.execute(
-            f"SELECT status FROM membership WHERE channel_id=? AND status IN ({','.join('?'*len(FINAL_GLOBAL))}) LIMIT 1",
-            (int(channel_id), *FINAL_GLOBAL),
-        )
-        row = cur.fetchone()
-        return row[0] if row else None
+        return dict(c.execute(
+            "SELECT account, ts FROM membership WHERE channel_id=? AND status='not_member'", (int(channel_id),)
+        ))
+
+
+def final_for_channels(channel_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+    """Пакетний any_final_for_channel: {channel_id: статус із FINAL_GLOBAL | None}."""
+    out: Dict[int, Optional[str]] = {}
+    for cid, ch in channels_many(channel_ids).items():
+        out[cid] = next((st for st in ch.values() if st in FINAL_GLOBAL), None)
+    return out
 
 
 # ---------- invite_map (інвайт-хеш → channel_id) ----------
@@ -91,13 +290,49 @@ def map_invite_set(invite_hash: str, channel_id: int):
             "INSERT OR REPLACE INTO invite_map(invite_hash, channel_id) VALUES (?,?)",
             (invite_hash, int(channel_id)),
         )
+    _INVITES.put(invite_hash, int(channel_id))
 
 
 def map_invite_get(invite_hash: str) -> Optional[int]:
+    _sync()
+    if invite_hash in _INVITES:
+        _STATS["invite_hits"] += 1
+        _INVITES.move_to_end(invite_hash)
+        return _INVITES[invite_hash]
+    if _INVITES.complete:
+        _STATS["invite_hits"] += 1
+        return None
+    _STATS["invite_misses"] += 1
     with _conn() as c:
         cur = c.execute("SELECT channel_id FROM invite_map WHERE invite_hash=? LIMIT 1", (invite_hash,))
         row = cur.fetchone()
-        return int(row[0]) if row and row[0] is not None else None
+        cid = int(row[0]) if row and row[0] is not None else None
+    _INVITES.put(invite_hash, cid)
+    return cid
+
+
+def map_invite_get_many(hashes: Iterable[str]) -> Dict[str, Optional[int]]:
+    """Пакетний map_invite_get: {invite_hash: channel_id | None}."""
+    _sync()
+    out: Dict[str, Optional[int]] = {}
+    miss: List[str] = []
+    for h in dict.fromkeys(hashes):
+        if h in _INVITES or _INVITES.complete:
+            _STATS["invite_hits"] += 1
+            out[h] = _INVITES.get(h)
+        else:
+            _STATS["invite_misses"] += 1
+            miss.append(h)
+            out[h] = None
+    if miss:
+        with _conn() as c:
+            for part in _chunks(miss):
+                q = f"SELECT invite_hash, channel_id FROM invite_map WHERE invite_hash IN ({','.join('?'*len(part))})"
+                for h, cid in c.execute(q, part):
+                    out[h] = int(cid) if cid is not None else None
+        for h in miss:
+            _INVITES.put(h, out[h])
+    return out
 
 
 # ---------- url_cache (коли немає channel_id, але вже є фінальний статус по URL) ----------
@@ -108,10 +343,46 @@ def url_put(url: str, status: str):
             "INSERT OR REPLACE INTO url_cache(url,status,ts) VALUES (?,?,?)",
             (url, status, int(time.time()))
         )
+    _URLS.put(url, status)
 
 
 def url_get(url: str) -> Optional[str]:
+    _sync()
+    if url in _URLS:
+        _STATS["url_hits"] += 1
+        _URLS.move_to_end(url)
+        return _URLS[url]
+    if _URLS.complete:
+        _STATS["url_hits"] += 1
+        return None
+    _STATS["url_misses"] += 1
     with _conn() as c:
         cur = c.execute("SELECT status FROM url_cache WHERE url=? LIMIT 1", (url,))
         row = cur.fetchone()
-        return row[0] if row else None
+        st = row[0] if row else None
+    _URLS.put(url, st)
+    return st
+
+
+def url_get_many(urls: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Пакетний url_get: {url: status | None}."""
+    _sync()
+    out: Dict[str, Optional[str]] = {}
+    miss: List[str] = []
+    for u in dict.fromkeys(urls):
+        if u in _URLS or _URLS.complete:
+            _STATS["url_hits"] += 1
+            out[u] = _URLS.get(u)
+        else:
+            _STATS["url_misses"] += 1
+            miss.append(u)
+            out[u] = None
+    if miss:
+        with _conn() as c:
+            for part in _chunks(miss):
+                q = f"SELECT url, status FROM url_cache WHERE url IN ({','.join('?'*len(part))})"
+                for u, st in c.execute(q, part):
+                    out[u] = st
+        for u in miss:
+            _URLS.put(u, out[u])
+    return out
@@ -0,0 +1,88 @@
+# app/services/membership_sync.py
+# Масова синхронізація membership із діалогів акаунтів пулу: один прохід GetDialogs
+# на акаунт замість JoinChannel/GetParticipant для кожного каналу окремо.
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from telethon.tl import types
+from telethon.errors import FloodWaitError
+
+from app.services import entity_cache, account_state
+from app.services.account_pool import ClientSlot, account_key, iter_pool_clients, mark_flood
+from app.services.membership_db import upsert_membership_many
+
+log = logging.getLogger("services.membership_sync")
+
+# синхронізувати membership при старті (у фоні)
+MEMB_SYNC_ON_START = os.getenv("MEMB_SYNC_ON_START", "1").lower() in ("1", "true", "yes")
+# скільки акаунтів гортають діалоги одночасно
+MEMB_SYNC_CONCURRENCY = int(os.getenv("MEMB_SYNC_CONCURRENCY", "2") or "2")
+
+_LOCK = asyncio.Lock()  # одна синхронізація за раз (старт і /sync_membership не перетинаються)
+
+
+def _usernames(ch: types.Channel) -> List[str]:
+    """Основний username і активні колекційні (Channel.usernames) — у нижньому регістрі."""
+    out = []
+    if getattr(ch, "username", None):
+        out.append(ch.username.lower())
+    for u in getattr(ch, "usernames", None) or []:
+        if getattr(u, "active", False) and u.username:
+            out.append(u.username.lower())
+    return list(dict.fromkeys(out))
+
+
+async def sync_account(slot: ClientSlot) -> Dict[str, int]:
+    """
+    Гортає всі діалоги акаунта (iter_dialogs — GetDialogs по 100 за сторінку) і
+    пише кожен канал/супергрупу в membership як "already", а username → канал — в entity_cache.
+    """
+    client = slot.client
+    channel_ids: List[int] = []
+    rows: List[tuple] = []
+    t0 = time.monotonic()
+    try:
+        async for d in client.iter_dialogs():
+            ent = d.entity
+            if not isinstance(ent, types.Channel) or getattr(ent, "left", False):
+                continue
+            channel_ids.append(int(ent.id))
+            for u in _usernames(ent):
+                rows.append((u, int(ent.id), ent.access_hash, getattr(ent, "title", None)))
+    except FloodWaitError as e:
+        log.warning("FLOOD in membership sync: %s seconds=%s (partial: %d channels)",
+                    slot.name, e.seconds, len(channel_ids))
+        mark_flood(client, e.seconds)
+        account_state.record_flood(slot.name, "dialogs", e.seconds)
+
+    n = upsert_membership_many(account_key(slot), channel_ids, "already")
+    cached = entity_cache.put_many(slot.name, rows)
+    log.info("membership sync: %s channels=%d usernames=%d (%.2fs)",
+             slot.name, n, cached, time.monotonic() - t0)
+    return {"channels": n, "usernames": cached}
+
+
+async def sync_pool(slots: Optional[List[ClientSlot]] = None,
+                    concurrency: int = MEMB_SYNC_CONCURRENCY) -> Dict[str, Dict[str, int]]:
+    """
+    Синхронізує всі (або передані) акаунти пулу. Повертає {slot.name: {"channels", "usernames"}};
+    акаунт, що впав, має {"error": 1}.
+    """
+    slots = iter_pool_clients() if slots is None else slots
+    sem = asyncio.Semaphore(max(1, int(concurrency)))
+    out: Dict[str, Dict[str, int]] = {}
+
+    async def _one(slot: ClientSlot) -> None:
+        async with sem:
+            try:
+                out[slot.name] = await sync_account(slot)
+            except Exception as e:
+                log.exception("membership sync failed: %s: %s", slot.name, e)
+                out[slot.name] = {"error": 1}
+
+    async with _LOCK:
+        await asyncio.gather(*(_one(s) for s in slots))
+    return out
@@ -0,0 +1,260 @@
+# app/services/monitor_db.py
+# Монітори (рекламні розміщення) і їхні канали: де знайдено пост, коли опубліковано,
+# перегляди. Схема сумісна з таблицями, які вже є в робочих БД.
+import json, logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.services.db.core import _conn, _ensure_tables, register_schema
+
+log = logging.getLogger("services.monitor_db")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS monitors(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  admin TEXT NOT NULL,
+  subset TEXT,
+  owner TEXT,
+  start_date TEXT NOT NULL,
+  cpm REAL NOT NULL,
+  created_at TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'collecting',   -- collecting / active / done
+  first_found_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS monitor_channels(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  monitor_id INTEGER NOT NULL,
+  input TEXT NOT NULL,
+  channel_id INTEGER,
+  username TEXT,
+  title TEXT,
+  note TEXT,
+  joined INTEGER DEFAULT 0,
+  found_msg_id INTEGER,
+  found_at TEXT,
+  published_at TEXT,
+  max_views INTEGER DEFAULT 0,
+  views24 INTEGER,
+  deleted_at TEXT,
+  created_at TEXT NOT NULL,
+  UNIQUE(monitor_id,input),
+  FOREIGN KEY(monitor_id) REFERENCES monitors(id)
+);
+-- опитування переглядів бере лише знайдені й не видалені пости
+CREATE INDEX IF NOT EXISTS idx_monitor_channels_found
+  ON monitor_channels(monitor_id, channel_id) WHERE found_msg_id IS NOT NULL AND deleted_at IS NULL;
+
+-- needle монітора: після рестарту задачі планувальника відновлюють його в MATCHER
+CREATE TABLE IF NOT EXISTS monitor_needles(
+  monitor_id INTEGER PRIMARY KEY,
+  text TEXT,
+  mode TEXT,
+  fuzz REAL,
+  origin_chat INTEGER,
+  origin_post INTEGER,
+  links TEXT,                 -- JSON [відбитки посилань]
+  find_mode TEXT,
+  FOREIGN KEY(monitor_id) REFERENCES monitors(id)
+);
+"""
+
+register_schema(DDL)
+
+VIEWS24_AFTER = 24 * 3600  # views24 — перегляди через добу після публікації
+
+
+class FoundPost(NamedTuple):
+    id: int                 # monitor_channels.id
+    monitor_id: int
+    channel_id: int
+    msg_id: int
+    published_at: Optional[str]
+    max_views: int
+    views24: Optional[int]
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def iso_ts(value: Optional[str]) -> Optional[float]:
+    """ISO-рядок з таблиць -> unix-ts (None, якщо порожньо/не розібрати)."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+# ---------- monitors ----------
+
+def create_monitor(admin: str, start_date: str, cpm: float, owner: Optional[str] = None,
+                   subset: Optional[str] = None) -> int:
+    _ensure_tables()
+    with _conn() as c:
+        cur = c.execute(
+            "INSERT INTO monitors(admin, subset, owner, start_date, cpm, created_at) VALUES (?,?,?,?,?,?)",
+            (admin, subset, owner, start_date, float(cpm), _now_iso()),
+        )
+    return int(cur.lastrowid)
+
+
+def set_status(monitor_id: int, status: str) -> None:
+    _ensure_tables()
+    with _conn() as c:
+        c.execute("UPDATE monitors SET status=? WHERE id=?", (status, int(monitor_id)))
+
+
+def get_monitor(monitor_id: int) -> Optional[Dict]:
+    _ensure_tables()
+    cur = _conn().execute("SELECT * FROM monitors WHERE id=?", (int(monitor_id),))
+    row = cur.fetchone()
+    return dict(zip([d[0] for d in cur.description], row)) if row else None
+
+
+def monitors_by_status(status: str) -> List[int]:
+    _ensure_tables()
+    return [r[0] for r in _conn().execute("SELECT id FROM monitors WHERE status=? ORDER BY id", (status,))]
+
+
+class MonitorNeedle(NamedTuple):
+    monitor_id: int
+    text: Optional[str]
+    mode: Optional[str]
+    fuzz: Optional[float]
+    origin: Optional[Tuple[int, int]]
+    links: Tuple[str, ...]
+    find_mode: Optional[str]
+
+
+def save_needle(monitor_id: int, text: Optional[str], mode: Optional[str] = None, fuzz: Optional[float] = None,
+                origin: Optional[Tuple[int, int]] = None, links: Iterable[str] = (),
+                find_mode: Optional[str] = None) -> None:
+    origin = origin or (None, None)
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO monitor_needles(monitor_id, text, mode, fuzz, origin_chat, origin_post, links, find_mode) "
+            "VALUES (?,?,?,?,?,?,?,?)",
+            (int(monitor_id), text, mode, fuzz, origin[0], origin[1], json.dumps(sorted(links)), find_mode),
+        )
+
+
+def load_needle(monitor_id: int) -> Optional[MonitorNeedle]:
+    _ensure_tables()
+    row = _conn().execute(
+        "SELECT text, mode, fuzz, origin_chat, origin_post, links, find_mode FROM monitor_needles WHERE monitor_id=?",
+        (int(monitor_id),),
+    ).fetchone()
+    if not row:
+        return None
+    text, mode, fuzz, oc, op, links, find_mode = row
+    origin = (oc, op) if oc is not None and op is not None else None
+    return MonitorNeedle(int(monitor_id), text, mode, fuzz, origin, tuple(json.loads(links or "[]")), find_mode)
+
+
+# ---------- monitor_channels ----------
+
+def add_channels(monitor_id: int, inputs: Iterable[str]) -> int:
+    """Додає канали (вхідні посилання) до монітора; дублікати ігноруються."""
+    rows = [(int(monitor_id), u, _now_iso()) for u in dict.fromkeys(inputs) if u]
+    if not rows:
+        return 0
+    _ensure_tables()
+    with _conn() as c:
+        before = c.total_changes
+        c.executemany(
+            "INSERT OR IGNORE INTO monitor_channels(monitor_id, input, created_at) VALUES (?,?,?)", rows
+        )
+        return c.total_changes - before
+
+
+def set_channel(row_id: int, channel_id: int, username: Optional[str] = None,
+                title: Optional[str] = None, joined: Optional[bool] = None) -> None:
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "UPDATE monitor_channels SET channel_id=?, username=COALESCE(?, username), "
+            "title=COALESCE(?, title), joined=COALESCE(?, joined) WHERE id=?",
+            (int(channel_id), username, title, None if joined is None else int(joined), int(row_id)),
+        )
+
+
+def channels(monitor_id: int) -> List[Dict]:
+    _ensure_tables()
+    cur = _conn().execute("SELECT * FROM monitor_channels WHERE monitor_id=? ORDER BY id", (int(monitor_id),))
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur]
+
+
+def get_channel(row_id: int) -> Optional[Dict]:
+    _ensure_tables()
+    cur = _conn().execute("SELECT * FROM monitor_channels WHERE id=?", (int(row_id),))
+    row = cur.fetchone()
+    return dict(zip([d[0] for d in cur.description], row)) if row else None
+
+
+def set_found(row_id: int, msg_id: int, published_ts: Optional[float] = None) -> None:
+    """Пост знайдено: found_msg_id/found_at/published_at; у моніторі — first_found_at (якщо ще нема)."""
+    now = _now_iso()
+    published = (datetime.fromtimestamp(published_ts, timezone.utc).isoformat(timespec="seconds")
+                 if published_ts else None)
+    _ensure_tables()
+    with _conn() as c:
+        c.execute(
+            "UPDATE monitor_channels SET found_msg_id=?, found_at=?, published_at=?, deleted_at=NULL WHERE id=?",
+            (int(msg_id), now, published, int(row_id)),
+        )
+        c.execute(
+            "UPDATE monitors SET first_found_at=? WHERE id=(SELECT monitor_id FROM monitor_channels WHERE id=?) "
+            "AND first_found_at IS NULL",
+            (now, int(row_id)),
+        )
+
+
+def found_posts(monitor_ids: Optional[Iterable[int]] = None) -> List[FoundPost]:
+    """Знайдені й не видалені пости (усіх моніторів або лише monitor_ids)."""
+    _ensure_tables()
+    sql = ("SELECT id, monitor_id, channel_id, found_msg_id, published_at, COALESCE(max_views, 0), views24 "
+           "FROM monitor_channels WHERE found_msg_id IS NOT NULL AND deleted_at IS NULL AND channel_id IS NOT NULL")
+    args: list = []
+    if monitor_ids is not None:
+        ids = [int(x) for x in monitor_ids]
+        if not ids:
+            return []
+        sql += f" AND monitor_id IN ({','.join('?' * len(ids))})"
+        args = ids
+    return [FoundPost(*r) for r in _conn().execute(sql, args)]
+
+
+def update_views_many(rows: Iterable[Tuple[int, int, Optional[int]]]) -> int:
+    """
+    rows: [(monitor_channels.id, views, views24 | None)] — одна транзакція.
+    max_views лише зростає; views24 пишеться один раз.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    _ensure_tables()
+    with _conn() as c:
+        c.executemany(
+            "UPDATE monitor_channels SET max_views=MAX(COALESCE(max_views, 0), ?), "
+            "views24=COALESCE(views24, ?) WHERE id=?",
+            [(int(v), v24, int(rid)) for rid, v, v24 in rows],
+        )
+    return len(rows)
+
+
+def mark_deleted_many(row_ids: Iterable[int]) -> int:
+    ids = [(_now_iso(), int(x)) for x in row_ids]
+    if not ids:
+        return 0
+    _ensure_tables()
+    with _conn() as c:
+        c.executemany("UPDATE monitor_channels SET deleted_at=? WHERE id=? AND deleted_at IS NULL", ids)
+    return len(ids)
@@ -0,0 +1,194 @@
+# app/services/monitor_jobs.py
+# Задачі моніторів для JobScheduler:
+#   find:<monitor_channels.id> — кожен find_interval шукаємо пост у каналі (post_finder),
+#       поки не знайдемо або не мине find_window; знайшли — задача завершується; спершу —
+#       локальний корпус постів (post_corpus), і лише потім RPC;
+#   mon:<monitors.id> — кожен mon_interval перегляди знайдених постів монітора (views_poller),
+#       до mon_window після публікації останнього знайденого; потім монітор -> done.
+import time, logging
+from datetime import datetime, timezone
+from typing import Hashable, Optional, Tuple
+
+from telethon import utils
+from telethon.errors import FloodWaitError, RPCError
+
+from app.config import DEFAULT_FIND_MODE
+from app.services import entity_cache, monitor_db, post_corpus, post_finder, rate_limiter, views_poller
+from app.services.account_pool import ClientSlot, lease_slots, mark_flood, ready_slots
+from app.services.job_scheduler import SCHEDULER, Job
+from app.services.joiner import resolve_channel
+from app.services.needle_matcher import MATCHER
+
+log = logging.getLogger("services.monitor_jobs")
+
+
+def needle_key(monitor_id: int) -> str:
+    return f"mon:{int(monitor_id)}"
+
+
+def ensure_needle(monitor_id: int, reload: bool = False) -> Optional[Hashable]:
+    """Ключ needle монітора в MATCHER; після рестарту — піднімає його з monitor_needles."""
+    key = needle_key(monitor_id)
+    if MATCHER.get(key) is not None and not reload:
+        return key
+    n = monitor_db.load_needle(monitor_id)
+    if n is None:
+        return None
+    return key if MATCHER.set(key, n.text, mode=n.mode, origin=n.origin, links=n.links, fuzz=n.fuzz) else None
+
+
+def _window_start(monitor_id: int, now: float) -> float:
+    """Початок find_window: start_date монітора (00:00 UTC), інакше — момент озброєння."""
+    mon = monitor_db.get_monitor(monitor_id) or {}
+    try:
+        d = datetime.fromisoformat(mon.get("start_date") or "")
+    except ValueError:
+        return now
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=timezone.utc)
+    return min(now, d.timestamp())
+
+
+def _pick_slot(row: dict) -> Optional[ClientSlot]:
+    """Акаунт для пошуку в каналі рядка: серед готових (з токеном SEARCH) — учасник каналу з найменшим навантаженням."""
+    slots = ready_slots(rate_limiter.SEARCH)
+    if not slots:
+        return None
+    cid = row.get("channel_id")
+    if not cid:
+        return slots[0]
+    plan = views_poller.assign_channels([int(cid)], slots)
+    return next(s for s in slots if s.name in plan)
+
+
+async def _input_peer(slot: ClientSlot, row: dict):
+    """
+    InputPeer каналу рядка: без RPC (кеш сесії / entity_cache), інакше резолв
+    input-посилання (channel_id -> БД). None — не вдалося.
+    """
+    cid = row.get("channel_id")
+    if cid:
+        peer = await views_poller.input_peer(slot, int(cid), entity_cache.access_hashes(slot.name, [int(cid)]))
+        if peer is not None:
+            return peer
+    try:
+        ent, title, cid = await resolve_channel(slot.client, row["input"])
+    except FloodWaitError as e:
+        log.warning("FLOOD resolving %s: %s seconds=%s", row["input"], slot.name, e.seconds)
+        mark_flood(slot.client, e.seconds)
+        return None
+    except (RPCError, ValueError, TypeError) as e:
+        log.info("find: cannot resolve %s via %s: %s", row["input"], slot.name, e)
+        return None
+    if cid and cid != row.get("channel_id"):
+        monitor_db.set_channel(row["id"], cid, title=title)
+    return utils.get_input_peer(ent)
+
+
+def arm_mon(monitor_id: int, interval: float, window: float, published_ts: Optional[float] = None) -> Job:
+    """mon:<id> до published + window; вже озброєна задача лише подовжується (новий знайдений пост)."""
+    now = time.time()
+    until = max(now, (published_ts or now) + window)
+    job = SCHEDULER.get(f"mon:{int(monitor_id)}")
+    if job is not None:
+        until = max(until, job.until)
+        if until == job.until:
+            return job
+    return SCHEDULER.schedule("mon", int(monitor_id), interval, until,
+                              cost=job.cost if job else 1, payload={"interval": interval, "window": window},
+                              first_fire=job.next_fire if job else None)
+
+
+def _set_found(job: Job, row: dict, msg_id: int, published: Optional[float]) -> None:
+    mon_id = int(row["monitor_id"])
+    monitor_db.set_found(row["id"], msg_id, published)
+    monitor_db.set_status(mon_id, "active")
+    arm_mon(mon_id, job.payload["mon_interval"], job.payload["mon_window"], published)
+
+
+async def _find_in_corpus(job: Job, row: dict, key: Hashable) -> bool:
+    """Пост уже є в локальному корпусі (його бачив скан/пошук іншого монітора) — без RPC."""
+    cid = row.get("channel_id")
+    if not cid:
+        return False
+    hits = await post_corpus.rematch_async([key], chats=[int(cid)], since=job.payload.get("since"))
+    if not hits:
+        return False
+    msg_id = min(h[1] for h in hits)
+    _set_found(job, row, msg_id, post_corpus.post_date(int(cid), msg_id))
+    log.info("find: monitor #%s post %s found in corpus of channel %s", row["monitor_id"], msg_id, cid)
+    return True
+
+
+async def _find_job(job: Job) -> Optional[bool]:
+    row = monitor_db.get_channel(job.ref)
+    if row is None or row["found_msg_id"] is not None:
+        return False
+    mon_id = int(row["monitor_id"])
+    key = ensure_needle(mon_id)
+    if key is None:
+        log.warning("find: monitor #%s has no needle, dropping %s", mon_id, job.job_id)
+        return False
+    if await _find_in_corpus(job, row, key):
+        return False
+    slot = _pick_slot(row)
+    async with lease_slots([slot] if slot is not None else []) as held:
+        peer = await _input_peer(slot, row) if held else None
+        if peer is None:
+            return None   # спробуємо наступним запуском
+        res = await post_finder.find_in_channel(slot, peer, key, since=job.payload.get("since"),
+                                                mode=job.payload.get("find_mode") or DEFAULT_FIND_MODE)
+    job.cost = max(1, res.rpc)
+    if not res.hits:
+        return None
+    post = min(res.hits, key=lambda m: m.id)
+    _set_found(job, row, post.id, post.date.timestamp() if post.date else None)
+    log.info("find: monitor #%s post %s found in channel %s", mon_id, post.id, res.channel_id)
+    return False
+
+
+async def _mon_job(job: Job) -> Optional[bool]:
+    res = await views_poller.poll_views([job.ref])
+    job.cost = max(1, res.rpc)
+    if job.next_fire >= job.until and not any(j.payload.get("monitor_id") == job.ref for j in SCHEDULER.jobs("find")):
+        monitor_db.set_status(job.ref, "done")
+        log.info("mon: monitor #%s done", job.ref)
+    return None
+
+
+def arm_monitor(monitor_id: int, find_interval: float, find_window: float, mon_interval: float,
+                mon_window: float, mode: Optional[str] = None, fuzz: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Озброює find-задачі на кожен ще не знайдений канал монітора і mon-задачу для вже знайдених.
+    mode/fuzz — перевизначити режим/поріг needle монітора. Повертає (find-задач, знайдених постів).
+    """
+    n = monitor_db.load_needle(monitor_id)
+    if n is None:
+        raise ValueError(f"monitor #{monitor_id} has no needle")
+    if mode is not None or fuzz is not None:
+        monitor_db.save_needle(monitor_id, n.text, mode or n.mode, n.fuzz if fuzz is None else fuzz,
+                               n.origin, n.links, n.find_mode)
+    if ensure_needle(monitor_id, reload=True) is None:
+        raise ValueError(f"monitor #{monitor_id} has an empty needle")
+
+    now = time.time()
+    since = _window_start(monitor_id, now)
+    until = max(now, since) + find_window
+    payload = {"monitor_id": int(monitor_id), "since": since, "find_mode": n.find_mode or DEFAULT_FIND_MODE,
+               "mon_interval": mon_interval, "mon_window": mon_window}
+    armed, found = 0, 0
+    for row in monitor_db.channels(monitor_id):
+        if row["found_msg_id"] is not None:
+            found += 1
+            continue
+        SCHEDULER.schedule("find", row["id"], find_interval, until, payload=payload)
+        armed += 1
+    if found:
+        monitor_db.set_status(monitor_id, "active")
+        published = [monitor_db.iso_ts(p.published_at) for p in monitor_db.found_posts([monitor_id])]
+        arm_mon(monitor_id, mon_interval, mon_window, max((p for p in published if p), default=None))
+    return armed, found
+
+
+SCHEDULER.register("find", _find_job)
+SCHEDULER.register("mon", _mon_job)
@@ -0,0 +1,211 @@
+# app/services/near_dup_index.py
+# LSH-індекс MinHash-підписів переглянутих постів для пошуку репостів із правками.
+# Пам'ять — плоский array('I') підписів + паралельні array chat_id/msg_id; підпис ділиться
+# на LSH_BANDS бендів, і запит дивиться лише на пости зі спільним бендом, а не на весь індекс.
+# Точний скорер потім запускається тільки на цих кандидатах.
+# SQLite (post_fingerprints) — персистентна копія; у пам'ять піднімається при першому зверненні.
+# Індекс живе рівно стільки, скільки пост у post_corpus: туди пишемо разом із корпусом,
+# витіснені з корпусу пости прибираємо (remove_many), мертві рядки періодично ущільнюємо.
+# Потокобезпечний: load/додавання/запити йдуть під локом, тож важку роботу (підняття з
+# SQLite, підписи, LSH-запити) викликачі виносять у потік, не блокуючи event loop.
+import os, time, logging, threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services.db.core import _conn, _ensure_tables, register_schema
+from app.services.db import core
+from app.utils.minhash import NUM_PERM, features, signature_features, similarity
+
+log = logging.getLogger("services.near_dup_index")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS post_fingerprints (
+  chat_id INTEGER NOT NULL,
+  msg_id  INTEGER NOT NULL,
+  sig     BLOB    NOT NULL,   -- MinHash-підпис: NUM_PERM x uint32 (array('I').tobytes())
+  ts      INTEGER NOT NULL,
+  PRIMARY KEY (chat_id, msg_id)
+) WITHOUT ROWID;
+"""
+
+register_schema(DDL)
+
+# 16 бендів x 4 рядки: поріг LSH ~ (1/16)^(1/4) ~ 0.5 схожості Жаккара
+LSH_BANDS = int(os.getenv("LSH_BANDS", "16"))
+# мінімальна оцінена схожість, з якою кандидат повертається
+NEAR_DUP_MIN_SIM = float(os.getenv("NEAR_DUP_MIN_SIM", "0.5"))
+# ущільнювати масиви, коли мертвих рядків більше, ніж живих (і не менше стількох)
+NEAR_DUP_COMPACT_MIN = int(os.getenv("NEAR_DUP_COMPACT_MIN", "4096") or "0")
+
+Hit = Tuple[int, int, float]  # (chat_id, msg_id, similarity)
+
+
+class NearDupIndex:
+    def __init__(self, bands: int = LSH_BANDS):
+        if NUM_PERM % bands:
+            raise ValueError(f"LSH bands must divide {NUM_PERM}")
+        self._rows_per_band = NUM_PERM // bands
+        self._lock = threading.RLock()
+        self._reset(bands)
+
+    def _reset(self, bands: int) -> None:
+        self._sig = array("I")                       # row * NUM_PERM .. (row+1) * NUM_PERM
+        self._chat = array("q")
+        self._msg = array("q")
+        self._alive = bytearray()                    # 0 — рядок перезаписаний (пост відредаговано)
+        self._rows: Dict[Tuple[int, int], int] = {}  # (chat_id, msg_id) -> номер рядка
+        self._bands: List[Dict[int, array]] = [{} for _ in range(bands)]
+        self._loaded: Optional[str] = None           # DB_PATH, з якого піднято індекс
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _band_keys(self, sig) -> List[int]:
+        r = self._rows_per_band
+        return [hash(tuple(sig[i:i + r])) for i in range(0, NUM_PERM, r)]
+
+    def _row_sig(self, row: int) -> array:
+        return self._sig[row * NUM_PERM:(row + 1) * NUM_PERM]
+
+    def _append(self, chat_id: int, msg_id: int, sig: array) -> None:
+        key = (chat_id, msg_id)
+        old = self._rows.get(key)
+        if old is not None:
+            if self._row_sig(old) == sig:
+                return
+            self._alive[old] = 0
+        row = len(self._chat)
+        self._sig.extend(sig)
+        self._chat.append(chat_id)
+        self._msg.append(msg_id)
+        self._alive.append(1)
+        self._rows[key] = row
+        for band, k in zip(self._bands, self._band_keys(sig)):
+            bucket = band.get(k)
+            if bucket is None:
+                bucket = band[k] = array("I")
+            bucket.append(row)
+
+    def load(self) -> int:
+        """Піднімає індекс з SQLite (один раз на DB_PATH). Повертає к-сть постів."""
+        if self._loaded == core.DB_PATH:
+            return len(self)
+        with self._lock:
+            if self._loaded == core.DB_PATH:
+                return len(self)
+            self._reset(len(self._bands))
+            _ensure_tables()
+            t0 = time.monotonic()
+            with _conn() as c:
+                for chat_id, msg_id, blob in c.execute("SELECT chat_id, msg_id, sig FROM post_fingerprints"):
+                    sig = array("I")
+                    sig.frombytes(blob)
+                    if len(sig) == NUM_PERM:
+                        self._append(chat_id, msg_id, sig)
+            self._loaded = core.DB_PATH
+            log.info("near-dup index loaded: %d posts (%.2fs)", len(self), time.monotonic() - t0)
+            return len(self)
+
+    def add(self, chat_id: int, msg_id: int, text: str) -> Optional[array]:
+        """
+        Рахує і зберігає підпис поста (write-through). Повертає підпис;
+        None — у тексті немає ознак (лише емодзі/медіа), такий пост не індексуємо.
+        """
+        feats = features(text)
+        if not feats:
+            return None
+        sig = signature_features(feats)
+        self.add_many([(chat_id, msg_id, sig)])
+        return sig
+
+    def add_texts(self, posts: Iterable[Tuple[int, int, str]]) -> int:
+        """posts: [(chat_id, msg_id, text)] — підписи рахуються тут; пости без ознак пропускаються."""
+        rows = []
+        for ch, m, text in posts:
+            feats = features(text)
+            if feats:
+                rows.append((ch, m, signature_features(feats)))
+        return self.add_many(rows)
+
+    def add_many(self, rows: List[Tuple[int, int, array]]) -> int:
+        """rows: [(chat_id, msg_id, sig)] — одна транзакція в SQLite."""
+        if not rows:
+            return 0
+        now = int(time.time())
+        with self._lock:
+            self.load()
+            with _conn() as c:
+                c.executemany(
+                    "INSERT OR REPLACE INTO post_fingerprints(chat_id, msg_id, sig, ts) VALUES (?,?,?,?)",
+                    [(int(ch), int(m), sig.tobytes(), now) for ch, m, sig in rows],
+                )
+            for ch, m, sig in rows:
+                self._append(int(ch), int(m), sig)
+        return len(rows)
+
+    def remove_many(self, keys: Iterable[Tuple[int, int]]) -> int:
+        """Прибирає пости [(chat_id, msg_id)] з індексу і з SQLite. Повертає к-сть прибраних з пам'яті."""
+        keys = [(int(ch), int(m)) for ch, m in keys]
+        if not keys:
+            return 0
+        with self._lock:
+            self.load()
+            with _conn() as c:
+                c.executemany("DELETE FROM post_fingerprints WHERE chat_id=? AND msg_id=?", keys)
+            n = 0
+            for key in keys:
+                row = self._rows.pop(key, None)
+                if row is not None:
+                    self._alive[row] = 0
+                    n += 1
+            dead = len(self._chat) - len(self._rows)
+            if dead > len(self._rows) and dead >= NEAR_DUP_COMPACT_MIN:
+                self._compact()
+        return n
+
+    def _compact(self) -> None:
+        """Перебудовує масиви й бенди лише з живих рядків (без перечитування SQLite)."""
+        live = [(self._chat[r], self._msg[r], self._row_sig(r)) for r in sorted(self._rows.values())]
+        loaded, dead = self._loaded, len(self._chat) - len(live)
+        self._reset(len(self._bands))
+        for ch, m, sig in live:
+            self._append(ch, m, sig)
+        self._loaded = loaded
+        log.info("near-dup index compacted: %d posts, %d dead rows dropped", len(live), dead)
+
+    def query_sig(self, sig, min_sim: float = NEAR_DUP_MIN_SIM) -> List[Hit]:
+        """
+        Кандидати-майже-дублі: пости зі спільним бендом, відфільтровані за оціненою
+        схожістю >= min_sim. Відсортовано від найсхожішого.
+        """
+        seen = set()
+        out: List[Hit] = []
+        with self._lock:
+            self.load()
+            for band, k in zip(self._bands, self._band_keys(sig)):
+                bucket = band.get(k)
+                if not bucket:
+                    continue
+                for row in bucket:
+                    if row in seen or not self._alive[row]:
+                        continue
+                    seen.add(row)
+                    sim = similarity(sig, self._row_sig(row))
+                    if sim >= min_sim:
+                        out.append((self._chat[row], self._msg[row], sim))
+        out.sort(key=lambda h: -h[2])
+        return out
+
+    def query(self, text: str, min_sim: float = NEAR_DUP_MIN_SIM) -> List[Hit]:
+        feats = features(text)
+        return self.query_sig(signature_features(feats), min_sim) if feats else []
+
+    def get_sig(self, chat_id: int, msg_id: int) -> Optional[array]:
+        with self._lock:
+            self.load()
+            row = self._rows.get((int(chat_id), int(msg_id)))
+            return self._row_sig(row) if row is not None else None
+
+
+# спільний індекс процесу
+INDEX = NearDupIndex()
@@ -0,0 +1,315 @@
+# app/services/needle_matcher.py
+# Один скомпільований матчер для всіх активних needle (буфер /needle_* і монітори).
+# exact_* needle живуть в автоматах Ахо–Корасік — текст сканується один раз на варіант
+# нормалізації, незалежно від кількості моніторів; regex — окремі скомпільовані шаблони.
+# match_message() перевіряє повідомлення від найдешевшого: походження репосту (fwd_from),
+# відбиток прихованих посилань, і лише потім текст.
+import re
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+from telethon.tl.types import MessageEntityTextUrl, PeerChannel
+
+from app.config import DEFAULT_MODE, DEFAULT_FUZZ, CASE_SENSITIVE, WHOLE_WORD
+from app.services.fuzzy_scorer import score_batch, score_batch_async
+from app.services.near_dup_index import INDEX as NEAR_DUPS, NEAR_DUP_MIN_SIM
+from app.utils.aho_corasick import AhoCorasick
+from app.utils.minhash import features
+from app.utils.text_norm import normalize_strict, collapse_ws
+from app.utils.tg_links import link_fingerprint
+
+log = logging.getLogger("services.needle_matcher")
+
+MODES = ("exact_strict", "exact_norm", "regex", "fuzzy")
+
+# ключ needle буфера (/needle_from_reply); монітори мають свої — mon:<n>
+BUFFER_KEY = "buffer"
+
+Origin = Tuple[int, int]  # (channel_id, channel_post) оригінального поста
+
+
+@dataclass
+class Needle:
+    key: Hashable
+    text: str
+    mode: str = DEFAULT_MODE
+    case_sensitive: bool = CASE_SENSITIVE
+    whole_word: bool = WHOLE_WORD
+    origin: Optional[Origin] = None
+    links: FrozenSet[str] = frozenset()
+    fuzz: Optional[float] = None      # поріг fuzzy саме цього needle (None — загальний)
+
+
+def message_origin(msg) -> Optional[Origin]:
+    """
+    Оригінал поста: для репосту з каналу — (fwd_from.from_id.channel_id, fwd_from.channel_post),
+    для власного поста каналу — (канал, id). Інакше None.
+    """
+    fwd = getattr(msg, "fwd_from", None)
+    if fwd is not None:
+        src = getattr(fwd, "from_id", None)
+        post = getattr(fwd, "channel_post", None)
+        if isinstance(src, PeerChannel) and post:
+            return src.channel_id, post
+        return None
+    peer = getattr(msg, "peer_id", None)
+    if isinstance(peer, PeerChannel) and getattr(msg, "id", None):
+        return peer.channel_id, msg.id
+    return None
+
+
+def message_text(msg) -> str:
+    return getattr(msg, "raw_text", None) or getattr(msg, "message", None) or ""
+
+
+def message_links(msg) -> FrozenSet[str]:
+    """Відбиток цілей MessageEntityTextUrl повідомлення (див. tg_links.link_fingerprint)."""
+    entities = getattr(msg, "entities", None)
+    if not entities:
+        return frozenset()
+    return link_fingerprint(e.url for e in entities if isinstance(e, MessageEntityTextUrl))
+
+
+def _variant(mode: str, case_sensitive: bool) -> Tuple[str, bool]:
+    """(нормалізація, з урахуванням регістру) — needle з однаковим варіантом ділять автомат."""
+    if mode == "exact_norm":
+        return "norm", False
+    return "strict", case_sensitive
+
+
+def _prepare(text: str, variant: Tuple[str, bool]) -> str:
+    norm, cs = variant
+    s = normalize_strict(text)
+    if norm == "norm":
+        s = collapse_ws(s)
+    return s if cs else s.casefold()
+
+
+def _is_word(s: str, start: int, end: int) -> bool:
+    before = s[start - 1] if start > 0 else ""
+    after = s[end] if end < len(s) else ""
+    return not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_")
+
+
+class NeedleMatcher:
+    """
+    Реєстр needle + автомати. set()/remove() оновлюють лише відповідний автомат
+    (інкрементально); match(text) — один прохід тексту на кожен задіяний варіант.
+    Походження і відбитки посилань — словники, тож ці етапи O(1) на повідомлення.
+    """
+
+    def __init__(self):
+        self._needles: Dict[Hashable, Needle] = {}
+        self._automata: Dict[Tuple[str, bool], AhoCorasick] = {}
+        self._regex: Dict[Hashable, re.Pattern] = {}
+        self._by_origin: Dict[Origin, Set[Hashable]] = {}
+        self._by_links: Dict[FrozenSet[str], Set[Hashable]] = {}
+        # на якому етапі знайдено збіги match_message: origin / links / text
+        self.stats: Dict[str, int] = {"origin": 0, "links": 0, "text": 0}
+
+    def __len__(self) -> int:
+        return len(self._needles)
+
+    def get(self, key: Hashable) -> Optional[Needle]:
+        return self._needles.get(key)
+
+    def needles(self) -> List[Needle]:
+        return list(self._needles.values())
+
+    def set(self, key: Hashable, text: Optional[str], mode: Optional[str] = None,
+            case_sensitive: Optional[bool] = None, whole_word: Optional[bool] = None,
+            origin: Optional[Origin] = None, links: Iterable[str] = (),
+            fuzz: Optional[float] = None) -> Optional[Needle]:
+        """
+        Додає/замінює needle. Без тексту, походження і посилань — те саме, що remove(key).
+        links — вже готовий відбиток (message_links) або сирі URL.
+        Невалідний regex піднімає re.error (needle не змінюється).
+        """
+        text = text if text and text.strip() else ""
+        links = links if isinstance(links, frozenset) else link_fingerprint(links)
+        if not text and not origin and not links:
+            self.remove(key)
+            return None
+        n = Needle(
+            key, text,
+            mode=(mode or DEFAULT_MODE),
+            case_sensitive=CASE_SENSITIVE if case_sensitive is None else case_sensitive,
+            whole_word=WHOLE_WORD if whole_word is None else whole_word,
+            origin=tuple(origin) if origin else None,
+            links=links,
+            fuzz=None if fuzz is None else float(fuzz),
+        )
+        if n.mode not in MODES:
+            raise ValueError(f"unknown needle mode: {n.mode}")
+        compiled = None
+        if text and n.mode == "regex":
+            compiled = re.compile(n.text, 0 if n.case_sensitive else re.IGNORECASE)
+        self.remove(key)
+        self._needles[key] = n
+        if compiled is not None:
+            self._regex[key] = compiled
+        elif text and n.mode != "fuzzy":
+            variant = _variant(n.mode, n.case_sensitive)
+            self._automata.setdefault(variant, AhoCorasick()).add(key, _prepare(n.text, variant))
+        if n.origin:
+            self._by_origin.setdefault(n.origin, set()).add(key)
+        if n.links:
+            self._by_links.setdefault(n.links, set()).add(key)
+        log.debug("needle set: %s mode=%s origin=%s links=%d", key, n.mode, n.origin, len(n.links))
+        return n
+
+    def snapshot(self, keys: Optional[Iterable[Hashable]] = None) -> "NeedleMatcher":
+        """
+        Незалежна копія матчера (лише keys) — для перевірок у потоці: set()/remove() на
+        спільному MATCHER з event loop не змінюють словники й автомати копії під час обходу.
+        """
+        wanted = None if keys is None else set(keys)
+        m = NeedleMatcher()
+        for n in list(self._needles.values()):
+            if wanted is None or n.key in wanted:
+                m.set(n.key, n.text, mode=n.mode, case_sensitive=n.case_sensitive, whole_word=n.whole_word,
+                      origin=n.origin, links=n.links, fuzz=n.fuzz)
+        return m
+
+    def remove(self, key: Hashable) -> bool:
+        n = self._needles.pop(key, None)
+        if n is None:
+            return False
+        self._regex.pop(key, None)
+        for variant, ac in list(self._automata.items()):
+            if ac.remove(key) and not len(ac):
+                del self._automata[variant]
+        for index, fp in ((self._by_origin, n.origin), (self._by_links, n.links)):
+            keys = index.get(fp) if fp else None
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[fp]
+        return True
+
+    def match(self, text: str) -> List[Hashable]:
+        """
+        Ключі needle, що знайдені в text (exact_* і regex). fuzzy тут не перевіряється —
+        їх скорить окремий етап.
+        """
+        if not text or not self._needles:
+            return []
+        found: Dict[Hashable, None] = {}
+        for variant, ac in self._automata.items():
+            s = _prepare(text, variant)
+            for start, end, key in ac.iter_matches(s):
+                if key in found:
+                    continue
+                if self._needles[key].whole_word and not _is_word(s, start, end):
+                    continue
+                found[key] = None
+        if self._regex:
+            s = normalize_strict(text)
+            for key, rx in self._regex.items():
+                if key not in found and rx.search(s):
+                    found[key] = None
+        return list(found)
+
+    def near_duplicates(self, key: Hashable, min_sim: float = NEAR_DUP_MIN_SIM) -> List[Tuple[int, int, float]]:
+        """
+        Кандидати-репости needle з LSH-індексу: [(chat_id, msg_id, схожість)].
+        Точний/фаззі скорер варто запускати лише на них, а не на всіх постах.
+        """
+        n = self._needles.get(key)
+        return NEAR_DUPS.query(n.text, min_sim) if n is not None else []
+
+    def fuzzy_candidates(self, key: Hashable, min_sim: float = NEAR_DUP_MIN_SIM) -> Optional[Set[Tuple[int, int]]]:
+        """
+        {(chat_id, msg_id)} постів, на яких варто скорити fuzzy-needle key (near_duplicates).
+        None — звузити не можна: needle без ознак (лише емодзі/пунктуація) скориться на всіх.
+        """
+        n = self._needles.get(key)
+        if n is None or not features(n.text):
+            return None
+        return {(ch, m) for ch, m, _ in self.near_duplicates(key, min_sim)}
+
+    def fuzzy_needles(self) -> List[Needle]:
+        return [n for n in self._needles.values() if n.mode == "fuzzy" and n.text]
+
+    def match_fuzzy(self, text: str, threshold: float = DEFAULT_FUZZ) -> List[Tuple[Hashable, float]]:
+        """
+        fuzzy-needle, схожі з text не менше свого порогу (fuzz needle або threshold): [(ключ, схожість)].
+        Синхронно, на місці; для пакетів повідомлень — match_messages (score_batch_async).
+        """
+        if not text:
+            return []
+        out: List[Tuple[Hashable, float]] = []
+        for thr, needles in self.fuzzy_groups(threshold).items():
+            out += [(nk, sc) for _, nk, sc in score_batch([(None, text)], needles, thr)]
+        return out
+
+    def fuzzy_groups(self, threshold: float = DEFAULT_FUZZ) -> Dict[float, List[Tuple[Hashable, str]]]:
+        """{поріг: [(ключ, текст)]} fuzzy-needle — для пакетного скорингу по порогах."""
+        groups: Dict[float, List[Tuple[Hashable, str]]] = {}
+        for n in self.fuzzy_needles():
+            groups.setdefault(threshold if n.fuzz is None else n.fuzz, []).append((n.key, n.text))
+        return groups
+
+    def match_message(self, msg, fuzzy: bool = True) -> List[Tuple[Hashable, str]]:
+        """
+        [(ключ needle, етап)] для Telethon-повідомлення; етапи від найдешевшого:
+          origin — репост того самого поста (fwd_from), один пошук у словнику;
+          links  — той самий набір прихованих посилань (MessageEntityTextUrl);
+          text   — match() / match_fuzzy(), лише якщо лишились незнайдені needle.
+        """
+        if not self._needles:
+            return []
+        links = message_links(msg) if self._by_links else frozenset()
+        found = self.match_fields(message_text(msg), message_origin(msg), links, fuzzy=fuzzy)
+        for _, stage in found:
+            self.stats[stage] += 1
+        return found
+
+    async def match_messages(self, msgs: Sequence, threshold: float = DEFAULT_FUZZ,
+                             keys: Optional[Iterable[Hashable]] = None,
+                             fuzzy_filter: Optional[Callable[[object], bool]] = None) -> List[List[Tuple[Hashable, str]]]:
+        """
+        match_message для пакета повідомлень (той самий порядок). origin/links/exact/regex —
+        по кожному; fuzzy — один score_batch_async на поріг для всіх текстів пакета, тож
+        великі пакети рахуються в процесах і event loop не блокується.
+        keys — лише ці needle; fuzzy_filter(msg) -> False — повідомлення не скорити на fuzzy.
+        """
+        wanted = None if keys is None else set(keys)
+        out = [[(k, st) for k, st in self.match_message(m, fuzzy=False) if wanted is None or k in wanted]
+               for m in msgs]
+        for thr, group in self.fuzzy_groups(threshold).items():
+            needles = [(k, t) for k, t in group if wanted is None or k in wanted]
+            posts = [(i, message_text(m)) for i, m in enumerate(msgs)
+                     if message_text(m) and (fuzzy_filter is None or fuzzy_filter(m))]
+            if not needles or not posts:
+                continue
+            for i, nk, _ in await score_batch_async(posts, needles, thr):
+                if all(k != nk for k, _ in out[i]):
+                    out[i].append((nk, "text"))
+                    self.stats["text"] += 1
+        return out
+
+    def match_fields(self, text: str, origin: Optional[Origin] = None,
+                     links: FrozenSet[str] = frozenset(), fuzzy: bool = True) -> List[Tuple[Hashable, str]]:
+        """Те саме, що match_message, але з уже розібраних полів (локальний корпус постів)."""
+        if not self._needles:
+            return []
+        found: Dict[Hashable, str] = {}
+        if origin and self._by_origin:
+            for key in self._by_origin.get(origin, ()):
+                found[key] = "origin"
+        if links and self._by_links and len(found) < len(self._needles):
+            for key in self._by_links.get(links, ()):
+                found.setdefault(key, "links")
+        if text and len(found) < len(self._needles):
+            for key in self.match(text):
+                found.setdefault(key, "text")
+            if fuzzy and any(n.mode == "fuzzy" and n.text and n.key not in found for n in self._needles.values()):
+                for key, _ in self.match_fuzzy(text):
+                    found.setdefault(key, "text")
+        return list(found.items())
+
+
+# спільний матчер процесу (плагіни needle_reply / metrics_watch)
+MATCHER = NeedleMatcher()
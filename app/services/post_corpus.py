@@ -0,0 +1,255 @@
+# app/services/post_corpus.py
+# Локальний корпус нещодавно переглянутих постів каналів моніторингу: нормалізований
+# текст, цілі прихованих посилань і походження репосту (fwd_from), стиснуті zlib.
+# Після зміни needle (/needle_from_reply, /mon_new mode=...) пости вікна перевіряються
+# локально — без жодного запиту до Telegram. Обмеження: вік, к-сть постів на канал
+# і загальний розмір; найстаріші пости витісняються першими.
+# Кожен пост корпусу має MinHash-підпис у near_dup_index: fuzzy-needle скоряться лише на
+# LSH-кандидатах, а витіснені з корпусу пости прибираються й з індексу. Підписи, доіндексація
+# і LSH-запити рахуються в потоці (add_many_async, rematch_async) — не на event loop.
+import os, json, time, zlib, asyncio, logging, threading
+from typing import Collection, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from telethon.tl import types
+
+from app.config import DEFAULT_FIND_WINDOW, DEFAULT_FUZZ
+from app.services.db.core import _conn, _ensure_tables, register_schema
+from app.services.db import core
+from app.services.fuzzy_scorer import score_batch
+from app.services.near_dup_index import INDEX as NEAR_DUPS
+from app.services.needle_matcher import MATCHER, NeedleMatcher, Origin, message_origin
+from app.utils.durations import parse_duration
+from app.utils.text_norm import normalize_strict
+from app.utils.tg_links import link_fingerprint
+
+log = logging.getLogger("services.post_corpus")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS post_corpus (
+  chat_id   INTEGER NOT NULL,
+  msg_id    INTEGER NOT NULL,
+  date      INTEGER NOT NULL,
+  edit_ts   INTEGER NOT NULL,
+  orig_chat INTEGER,            -- fwd_from (channel_id, channel_post) або сам пост каналу
+  orig_post INTEGER,
+  body      BLOB    NOT NULL,   -- zlib(JSON {"t": normalize_strict(text), "u": [цілі MessageEntityTextUrl]})
+  PRIMARY KEY (chat_id, msg_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_post_corpus_date ON post_corpus(date);
+"""
+
+register_schema(DDL)
+
+# скільки тримати пости (за датою публікації) — за замовчуванням find_window
+CORPUS_MAX_AGE = parse_duration(os.getenv("CORPUS_MAX_AGE", DEFAULT_FIND_WINDOW), 72 * 3600.0)
+# не більше стількох останніх постів на канал
+CORPUS_MAX_PER_CHAT = int(os.getenv("CORPUS_MAX_PER_CHAT", "2000") or "0")
+# загальний розмір стиснутих тіл, МБ
+CORPUS_MAX_MB = float(os.getenv("CORPUS_MAX_MB", "64") or "0")
+# як часто запускати витіснення (сек)
+CORPUS_EVICT_EVERY = float(os.getenv("CORPUS_EVICT_EVERY", "300") or "0")
+
+Row = Tuple[int, int, int, Optional[Origin], str, frozenset]  # chat_id, msg_id, date, origin, text, links
+Hit = Tuple[int, int, Hashable, str]                          # chat_id, msg_id, ключ needle, етап
+
+_last_evict = 0.0
+_indexed: Optional[str] = None   # DB_PATH, для якого корпус уже доіндексовано (_backfill)
+_BACKFILL_LOCK = threading.Lock()
+
+
+def _ts(dt) -> int:
+    return int(dt.timestamp()) if dt is not None else 0
+
+
+def _pack(msg: types.Message) -> Optional[tuple]:
+    peer = getattr(msg, "peer_id", None)
+    if not isinstance(peer, types.PeerChannel):
+        return None
+    urls = [e.url for e in getattr(msg, "entities", None) or () if isinstance(e, types.MessageEntityTextUrl)]
+    body = json.dumps({"t": normalize_strict(getattr(msg, "message", None) or ""), "u": urls},
+                      ensure_ascii=False, separators=(",", ":"))
+    origin = message_origin(msg) or (None, None)
+    return (int(peer.channel_id), int(msg.id), _ts(msg.date), _ts(msg.edit_date),
+            origin[0], origin[1], zlib.compress(body.encode("utf-8"), 6))
+
+
+def add_many(msgs: Collection[types.Message]) -> int:
+    """Записує (або оновлює відредаговані) пости каналів. Повертає к-сть записаних."""
+    packed = [(r, m) for r, m in ((_pack(m), m) for m in msgs) if r is not None]
+    if not packed:
+        return 0
+    rows = [r for r, _ in packed]
+    _ensure_tables()
+    with _conn() as c:
+        c.executemany(
+            "INSERT INTO post_corpus(chat_id, msg_id, date, edit_ts, orig_chat, orig_post, body) "
+            "VALUES (?,?,?,?,?,?,?) "
+            "ON CONFLICT(chat_id, msg_id) DO UPDATE SET edit_ts=excluded.edit_ts, orig_chat=excluded.orig_chat, "
+            "orig_post=excluded.orig_post, body=excluded.body WHERE excluded.edit_ts >= post_corpus.edit_ts",
+            rows,
+        )
+    NEAR_DUPS.add_texts((r[0], r[1], getattr(m, "message", None) or "") for r, m in packed)
+    if CORPUS_EVICT_EVERY >= 0 and time.monotonic() - _last_evict >= CORPUS_EVICT_EVERY:
+        evict(chats={r[0] for r in rows})
+    return len(rows)
+
+
+async def add_many_async(msgs: Collection[types.Message]) -> int:
+    """add_many у потоці: стиснення, запис і MinHash-підписи не блокують event loop."""
+    return await asyncio.to_thread(add_many, list(msgs))
+
+
+def evict(now: Optional[float] = None, chats: Optional[Collection[int]] = None) -> int:
+    """
+    Витісняє пости, старші за CORPUS_MAX_AGE; понад CORPUS_MAX_PER_CHAT у каналах chats
+    (None — у всіх); і найстаріші, поки розмір > CORPUS_MAX_MB. Витіснені прибираються
+    й з near_dup_index. Повертає к-сть видалених.
+    """
+    global _last_evict
+    _last_evict = time.monotonic()
+    now = time.time() if now is None else now
+    _ensure_tables()
+    gone: List[Tuple[int, int]] = []
+    with _conn() as c:
+        if CORPUS_MAX_AGE > 0:
+            gone += c.execute("DELETE FROM post_corpus WHERE date < ? RETURNING chat_id, msg_id",
+                              (int(now - CORPUS_MAX_AGE),)).fetchall()
+        if CORPUS_MAX_PER_CHAT > 0:
+            if chats is None:
+                chats = [r[0] for r in c.execute("SELECT DISTINCT chat_id FROM post_corpus")]
+            for chat_id in chats:
+                gone += c.execute(
+                    "DELETE FROM post_corpus WHERE chat_id=? AND msg_id <= "
+                    "(SELECT msg_id FROM post_corpus WHERE chat_id=? ORDER BY msg_id DESC LIMIT 1 OFFSET ?) "
+                    "RETURNING chat_id, msg_id",
+                    (int(chat_id), int(chat_id), CORPUS_MAX_PER_CHAT),
+                ).fetchall()
+        if CORPUS_MAX_MB > 0:
+            limit = int(CORPUS_MAX_MB * 1024 * 1024)
+            total = c.execute("SELECT COALESCE(SUM(length(body)), 0) FROM post_corpus").fetchone()[0]
+            if total > limit:
+                # найстаріші за датою, поки не влізе в ліміт
+                cut, acc = None, total
+                for date, size in c.execute("SELECT date, length(body) FROM post_corpus ORDER BY date"):
+                    acc -= size
+                    cut = date
+                    if acc <= limit:
+                        break
+                if cut is not None:
+                    gone += c.execute("DELETE FROM post_corpus WHERE date <= ? RETURNING chat_id, msg_id",
+                                      (cut,)).fetchall()
+    if gone:
+        NEAR_DUPS.remove_many(gone)
+        log.info("post corpus: evicted %d posts", len(gone))
+    return len(gone)
+
+
+def _backfill() -> int:
+    """Підписи для постів корпусу, яких ще немає в near_dup_index (корпус, записаний до індексу)."""
+    global _indexed
+    if _indexed == core.DB_PATH:
+        return 0
+    with _BACKFILL_LOCK:
+        if _indexed == core.DB_PATH:
+            return 0
+        NEAR_DUPS.load()
+        _ensure_tables()
+        posts = []
+        for chat_id, msg_id, blob in _conn().execute(
+            "SELECT p.chat_id, p.msg_id, p.body FROM post_corpus p WHERE NOT EXISTS "
+            "(SELECT 1 FROM post_fingerprints f WHERE f.chat_id=p.chat_id AND f.msg_id=p.msg_id)"
+        ):
+            posts.append((chat_id, msg_id, json.loads(zlib.decompress(blob))["t"]))
+        n = NEAR_DUPS.add_texts(posts)
+        _indexed = core.DB_PATH
+    if n:
+        log.info("post corpus: %d posts added to near-dup index", n)
+    return n
+
+
+def iter_posts(chats: Optional[Collection[int]] = None, since: Optional[float] = None) -> Iterator[Row]:
+    """Пости корпусу (розпаковані), від новіших; chats/since — фільтри."""
+    _ensure_tables()
+    sql = "SELECT chat_id, msg_id, date, orig_chat, orig_post, body FROM post_corpus WHERE date >= ?"
+    args: list = [int(since or 0)]
+    if chats is not None:
+        chats = [int(x) for x in chats]
+        if not chats:
+            return
+        sql += f" AND chat_id IN ({','.join('?' * len(chats))})"
+        args += chats
+    sql += " ORDER BY date DESC"
+    for chat_id, msg_id, date, oc, op, blob in _conn().execute(sql, args):
+        body = json.loads(zlib.decompress(blob))
+        origin = (oc, op) if oc is not None and op is not None else None
+        yield chat_id, msg_id, date, origin, body["t"], link_fingerprint(body["u"]) if body["u"] else frozenset()
+
+
+def rematch(keys: Optional[Collection[Hashable]] = None, chats: Optional[Collection[int]] = None,
+            since: Optional[float] = None, threshold: float = DEFAULT_FUZZ,
+            matcher: Optional[NeedleMatcher] = None,
+            candidates: Optional[Dict[Hashable, Optional[set]]] = None) -> List[Hit]:
+    """
+    Перевіряє весь корпус (або chats/since) проти needle з matcher (за замовчуванням MATCHER;
+    keys — лише ці). origin/links/exact/regex — по кожному посту; fuzzy — лише на LSH-кандидатах
+    needle (candidates або matcher.fuzzy_candidates), пакетом на кожен поріг через fuzzy_scorer.
+    """
+    matcher = MATCHER if matcher is None else matcher
+    wanted = None if keys is None else set(keys)
+    fuzzy = {thr: [(k, t) for k, t in group if wanted is None or k in wanted]
+             for thr, group in matcher.fuzzy_groups(threshold).items()}
+    fuzzy = {thr: group for thr, group in fuzzy.items() if group}
+    if fuzzy and candidates is None:
+        candidates = _fuzzy_candidates(matcher, fuzzy)
+    hits: List[Hit] = []
+    found: Dict[Tuple[int, int], set] = {}
+    texts: Dict[Tuple[int, int], str] = {}
+    for chat_id, msg_id, _, origin, text, links in iter_posts(chats, since):
+        seen = found.setdefault((chat_id, msg_id), set())
+        for key, stage in matcher.match_fields(text, origin, links, fuzzy=False):
+            if wanted is None or key in wanted:
+                hits.append((chat_id, msg_id, key, stage))
+                seen.add(key)
+        if fuzzy and text:
+            texts[(chat_id, msg_id)] = text
+    for thr, group in fuzzy.items() if texts else ():
+        for key, needle in group:
+            cands = candidates.get(key)
+            posts = list(texts.items()) if cands is None else [(p, texts[p]) for p in cands if p in texts]
+            for post, _, _ in score_batch(posts, [(key, needle)], thr) if posts else ():
+                if key not in found[post]:
+                    hits.append((post[0], post[1], key, "text"))
+    return hits
+
+
+def _fuzzy_candidates(matcher: NeedleMatcher, fuzzy: Dict[float, list]) -> Dict[Hashable, Optional[set]]:
+    _backfill()
+    return {key: matcher.fuzzy_candidates(key) for group in fuzzy.values() for key, _ in group}
+
+
+async def rematch_async(keys: Optional[Collection[Hashable]] = None, chats: Optional[Collection[int]] = None,
+                        since: Optional[float] = None, threshold: float = DEFAULT_FUZZ) -> List[Hit]:
+    """
+    rematch у потоці — event loop Telethon не блокується. Потік бачить лише знімок needle
+    (MATCHER.snapshot): спільний MATCHER змінюється тільки з event loop. Доіндексація корпусу,
+    підняття near_dup_index і LSH-запити теж ідуть у потоці (індекс під власним локом).
+    """
+    matcher = MATCHER.snapshot(keys)
+    return await asyncio.to_thread(rematch, None, chats, since, threshold, matcher)
+
+
+def post_date(chat_id: int, msg_id: int) -> Optional[int]:
+    """Дата публікації поста з корпусу (unix-ts) або None."""
+    _ensure_tables()
+    row = _conn().execute("SELECT date FROM post_corpus WHERE chat_id=? AND msg_id=?",
+                          (int(chat_id), int(msg_id))).fetchone()
+    return row[0] if row else None
+
+
+def stats() -> Dict[str, int]:
+    _ensure_tables()
+    with _conn() as c:
+        posts, chats, size = c.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT chat_id), COALESCE(SUM(length(body)), 0) FROM post_corpus"
+        ).fetchone()
+    return {"posts": posts, "chats": chats, "bytes": size}
@@ -0,0 +1,199 @@
+# app/services/post_finder.py
+# Пошук поста-needle у каналі моніторингу. Режим search: з needle беремо кілька
+# найрідкісніших слів і робимо один messages.search на канал (лише з min_date = початок
+# find_window); локальний матчер перевіряє тільки знайдене. Якщо пошук нічого придатного
+# не дав (зокрема порожня відповідь) — fallback на інкрементальний скан історії (history_scanner).
+# Режим scan — одразу скан.
+# Для кожного пошуку рахуємо, скільки RPC/байт зекономлено проти повного скану вікна.
+import os, re, math, time, asyncio, logging
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional
+
+from telethon import utils
+from telethon.tl import types
+from telethon.tl.functions.messages import SearchRequest
+from telethon.errors import FloodWaitError, RPCError
+
+from app.config import DEFAULT_FIND_MODE
+from app.services import rate_limiter, history_scanner, post_corpus
+from app.services.account_pool import ClientSlot, mark_flood
+from app.services.needle_matcher import MATCHER
+from app.utils.text_norm import normalize_strict
+
+log = logging.getLogger("services.post_finder")
+
+FIND_MODES = ("search", "scan")
+
+# скільки слів needle йде в запит (Telegram шукає пости, що містять усі)
+FIND_SEARCH_TOKENS = int(os.getenv("FIND_SEARCH_TOKENS", "2") or "2")
+# скільки результатів пошуку перевіряємо
+FIND_SEARCH_LIMIT = max(1, min(100, int(os.getenv("FIND_SEARCH_LIMIT", "20") or "20")))
+# оцінка повного скану, поки для каналу немає власних замірів
+FIND_EST_MSG_BYTES = int(os.getenv("FIND_EST_MSG_BYTES", "1200") or "1200")
+FIND_EST_POSTS_PER_DAY = float(os.getenv("FIND_EST_POSTS_PER_DAY", "20") or "20")
+
+_WORD_RE = re.compile(r"\w{4,}")
+_STOP = set("""
+що щоб який яка яке які цей ця це ці того тому також тільки лише вже ще якщо коли тут там
+для або але його її їх наш ваш свій своє мене тебе нас вас вони воно вона буде будуть
+это этот эта эти что чтобы который только уже если когда также тоже для или его ее их наш ваш
+будет быть есть было была были всех всем весь вся всё
+this that with from have your they will what when which there their about more just only
+""".split())
+
+
+@dataclass
+class FindResult:
+    channel_id: int
+    hits: List[types.Message] = field(default_factory=list)
+    mode: str = "search"        # яким способом знайдено/перевірено: search | scan
+    fallback: bool = False      # search не дав придатного результату -> скан
+    query: str = ""
+    rpc: int = 0
+    bytes: int = 0
+    saved_rpc: int = 0          # проти повного скану find_window (оцінка)
+    saved_bytes: int = 0
+    flood: int = 0
+
+
+# сумарна статистика процесу (для /find_stats)
+STATS: Dict[str, int] = {
+    "searches": 0, "search_hits": 0, "fallbacks": 0, "scans": 0,
+    "rpc": 0, "bytes": 0, "saved_rpc": 0, "saved_bytes": 0,
+}
+
+# заміри каналів зі сканів: channel_id -> (байт на пост, постів на секунду)
+_RATES: Dict[int, tuple] = {}
+
+
+def search_tokens(text: str, k: int = FIND_SEARCH_TOKENS) -> List[str]:
+    """
+    Найвиразніші слова needle для messages.search: довші й не службові, з середини тексту.
+    Крайні слова needle можуть бути обрізаними частинами слів поста, тож вони йдуть у запит
+    лише тоді, коли внутрішніх слів не вистачає. Цифри — бонус.
+    """
+    words = _WORD_RE.findall(normalize_strict(text or "").casefold())
+    if not words:
+        return []
+    last = len(words) - 1
+    scored: Dict[str, float] = {}
+    inner = set()
+    for i, w in enumerate(words):
+        if w in _STOP:
+            continue
+        scored[w] = len(w) + (2 if any(ch.isdigit() for ch in w) else 0)
+        if not last or 0 < i < last:
+            inner.add(w)
+    edge = scored.keys() - inner
+    return sorted(scored, key=lambda w: (w in edge, -scored[w]))[:max(1, k)]
+
+
+def _learn(scan: history_scanner.ScanResult) -> None:
+    if scan.fetched > 1 and scan.span > 0:
+        _RATES[scan.channel_id] = (scan.bytes / scan.fetched, scan.fetched / scan.span)
+
+
+def estimate_full_scan(channel_id: int, window: float) -> tuple:
+    """(RPC, байт) повного скану вікна window секунд — за замірами каналу або дефолтами."""
+    per_msg, rate = _RATES.get(channel_id, (FIND_EST_MSG_BYTES, FIND_EST_POSTS_PER_DAY / 86400.0))
+    n = rate * max(0.0, window)
+    return max(1, math.ceil(n / history_scanner.SCAN_PAGE)), int(n * per_msg)
+
+
+async def _verify(key: Hashable, msgs: List[types.Message]) -> List[types.Message]:
+    """
+    Повідомлення, що збігаються з needle key; fuzzy — одним пакетом (MATCHER.match_messages).
+    Для fuzzy-needle скоримо лише LSH-кандидатів (msgs уже в post_corpus, а отже й у
+    near_dup_index); решта етапів — по всіх. LSH-запит — у потоці, на знімку needle.
+    """
+    n = MATCHER.get(key)
+    if n is None or not msgs:
+        return []
+    cands = await asyncio.to_thread(MATCHER.snapshot([key]).fuzzy_candidates, key) if n.mode == "fuzzy" else None
+    found = await MATCHER.match_messages(
+        msgs, keys=[key],
+        fuzzy_filter=None if cands is None else lambda m: (getattr(m.peer_id, "channel_id", None), m.id) in cands,
+    )
+    return [m for m, hits in zip(msgs, found) if hits]
+
+
+async def _scan(slot: ClientSlot, peer, key: Hashable, since: Optional[float], res: FindResult) -> FindResult:
+    scan = await history_scanner.scan_channel(slot, peer, since=since)
+    _learn(scan)
+    await post_corpus.add_many_async(scan.new + scan.edited)
+    res.mode = "scan"
+    res.rpc += scan.rpc
+    res.bytes += scan.bytes
+    res.flood = scan.flood
+    res.hits = await _verify(key, scan.new + scan.edited)
+    STATS["scans"] += 1
+    return res
+
+
+async def find_in_channel(slot: ClientSlot, peer, key: Hashable, since: Optional[float] = None,
+                          mode: str = DEFAULT_FIND_MODE) -> FindResult:
+    """
+    Пости каналу peer, що збігаються з needle key з MATCHER.
+    search: один messages.search за search_tokens(needle). Без придатних токенів, при помилці
+    пошуку, порожній відповіді або коли жоден результат не пройшов перевірку — fallback на скан
+    історії: навіть для exact_* порожня відповідь не остаточна — крайнє слово needle може бути
+    обрізаною частиною слова поста, а пошук Telegram — не знати словоформи.
+    """
+    res = await _find(slot, peer, key, since, mode)
+    STATS["rpc"] += res.rpc
+    STATS["bytes"] += res.bytes
+    return res
+
+
+async def _find(slot: ClientSlot, peer, key: Hashable, since: Optional[float], mode: str) -> FindResult:
+    res = FindResult(utils.get_peer_id(peer, add_mark=False))
+    needle = MATCHER.get(key)
+    if needle is None:
+        return res
+    tokens = search_tokens(needle.text) if mode == "search" else []
+    if not tokens:
+        return await _scan(slot, peer, key, since, res)
+
+    res.query = " ".join(tokens)
+    STATS["searches"] += 1
+    msgs: List[types.Message] = []
+    usable = False
+    try:
+        await rate_limiter.acquire(slot.name, rate_limiter.SEARCH)
+        r = await slot.client(SearchRequest(
+            peer=peer, q=res.query, filter=types.InputMessagesFilterEmpty(),
+            min_date=int(since) if since else None, max_date=None,
+            offset_id=0, add_offset=0, limit=FIND_SEARCH_LIMIT, max_id=0, min_id=0, hash=0,
+        ))
+        res.rpc += 1
+        res.bytes += len(bytes(r))
+        rate_limiter.on_success(slot.name, rate_limiter.SEARCH)
+        msgs = [m for m in getattr(r, "messages", None) or [] if isinstance(m, types.Message)]
+        await post_corpus.add_many_async(msgs)
+        res.hits = await _verify(key, msgs)
+        usable = bool(res.hits)
+    except FloodWaitError as e:
+        log.warning("FLOOD in search: %s channel=%s seconds=%s", slot.name, res.channel_id, e.seconds)
+        mark_flood(slot.client, e.seconds)
+        rate_limiter.on_flood(slot.name, rate_limiter.SEARCH, e.seconds)
+        res.flood = e.seconds
+        return res
+    except RPCError as e:
+        log.info("search failed, falling back to scan: %s channel=%s: %s", slot.name, res.channel_id, e)
+
+    if not usable:
+        STATS["fallbacks"] += 1
+        res.fallback = True
+        return await _scan(slot, peer, key, since, res)
+
+    window = time.time() - since if since else 86400.0
+    full_rpc, full_bytes = estimate_full_scan(res.channel_id, window)
+    res.saved_rpc = max(0, full_rpc - res.rpc)
+    res.saved_bytes = max(0, full_bytes - res.bytes)
+    STATS["search_hits"] += 1 if res.hits else 0
+    STATS["saved_rpc"] += res.saved_rpc
+    STATS["saved_bytes"] += res.saved_bytes
+    log.debug("search: %s channel=%s q=%r found=%d/%d saved rpc=%d bytes=%d",
+              slot.name, res.channel_id, res.query, len(res.hits), len(msgs), res.saved_rpc, res.saved_bytes)
+    return res
+
@@ -0,0 +1,186 @@
+# app/services/rate_limiter.py
+import os
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.services import account_state
+
+log = logging.getLogger("services.rate_limiter")
+
+# сімейства RPC, які лімітуємо окремо
+RESOLVE     = "resolve"      # contacts.ResolveUsername (get_entity за username)
+JOIN        = "join"         # channels.JoinChannel
+IMPORT      = "import"       # messages.ImportChatInvite
+PARTICIPANT = "participant"  # channels.GetParticipant
+HISTORY     = "history"      # messages.GetHistory (сканер історії каналів)
+SEARCH      = "search"       # messages.Search (пошук needle у каналі)
+VIEWS       = "views"        # messages.GetMessagesViews (перегляди знайдених постів)
+
+def _f(name: str, default: str) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return float(default)
+
+# історичні LINK_DELAY_* задають дефолтний темп join/import (середина діапазону)
+_PUBLIC_AVG = (_f("LINK_DELAY_PUBLIC_MIN", "2") + _f("LINK_DELAY_PUBLIC_MAX", "4")) / 2
+_INVITE_AVG = (_f("LINK_DELAY_INVITE_MIN", "6") + _f("LINK_DELAY_INVITE_MAX", "10")) / 2
+
+# (інтервал між токенами, сек; місткість відра) — перевизначаються RL_<FAMILY>_INTERVAL / RL_<FAMILY>_BURST
+_DEFAULTS: Dict[str, Tuple[float, float]] = {
+    RESOLVE:     (_PUBLIC_AVG, 3),
+    JOIN:        (_PUBLIC_AVG, 1),
+    IMPORT:      (_INVITE_AVG, 1),
+    PARTICIPANT: (1.0, 5),
+    HISTORY:     (1.0, 5),
+    SEARCH:      (2.0, 3),
+    VIEWS:       (1.0, 5),
+}
+
+def _limits(family: str) -> Tuple[float, float]:
+    interval, burst = _DEFAULTS.get(family, (1.0, 1))
+    key = family.upper()
+    interval = max(0.0, _f(f"RL_{key}_INTERVAL", str(interval)))
+    burst = max(1.0, _f(f"RL_{key}_BURST", str(burst)))
+    return interval, burst
+
+# адаптивний темп: FLOOD_WAIT стискає інтервал відра, серія успіхів — поступово відпускає
+RL_ADAPT        = os.getenv("RL_ADAPT", "1").lower() in ("1", "true", "yes")
+RL_ADAPT_UP     = max(1.0, _f("RL_ADAPT_UP", "1.5"))      # множник інтервалу на FLOOD_WAIT
+RL_ADAPT_LONG   = _f("RL_ADAPT_LONG", "300")              # FLOOD_WAIT >= цього — множник у квадраті
+RL_ADAPT_DOWN   = min(1.0, _f("RL_ADAPT_DOWN", "0.9"))    # множник після серії успіхів
+RL_ADAPT_STREAK = max(1, int(_f("RL_ADAPT_STREAK", "20")))
+RL_ADAPT_FLOOR  = _f("RL_ADAPT_FLOOR", "0.5")             # нижня межа, частка від дефолту
+RL_ADAPT_CEIL   = _f("RL_ADAPT_CEIL", "10")               # верхня межа, кратна дефолту
+# випадкова добавка до очікування (частка інтервалу) — як колишній throttle між лінками,
+# щоб акаунти не били RPC у рівному ритмі
+RL_JITTER       = max(0.0, _f("RL_JITTER", "0.25"))
+
+
+@dataclass
+class TokenBucket:
+    """
+    Відро токенів із резервуванням: acquire забирає токен одразу (баланс може піти в мінус),
+    а чекає рівно стільки, скільки потрібно, щоб борг відновився. Черговість — FIFO.
+    """
+    interval: float     # сек на один токен
+    capacity: float
+    tokens: float
+    ts: float
+    base: float = 0.0   # дефолтний інтервал (від нього рахуються межі адаптації)
+    streak: int = 0     # успіхів поспіль від останнього FLOOD_WAIT / зміни інтервалу
+    jitter: float = RL_JITTER
+
+    def _refill(self, now: float) -> None:
+        if self.interval <= 0:
+            self.tokens = self.capacity
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) / self.interval)
+        self.ts = now
+
+    def reserve(self, now: float, cost: float = 1.0) -> float:
+        """Резервує cost токенів; повертає, скільки секунд чекати до дозволу (з jitter, якщо чекати треба)."""
+        self._refill(now)
+        self.tokens -= cost
+        if self.tokens >= 0:
+            return 0.0
+        wait = -self.tokens * self.interval
+        return wait + random.uniform(0.0, self.jitter * self.interval) if self.jitter > 0 else wait
+
+    def delay(self, now: float, cost: float = 1.0) -> float:
+        """Скільки чекати, якщо взяти cost токенів зараз (без резервування)."""
+        self._refill(now)
+        short = cost - self.tokens
+        return 0.0 if short <= 0 else short * self.interval
+
+
+_BUCKETS: Dict[Tuple[str, str], TokenBucket] = {}
+
+def _bucket(account: str, family: str) -> TokenBucket:
+    key = (account, family)
+    b = _BUCKETS.get(key)
+    if b is None:
+        interval, burst = _limits(family)
+        b = _BUCKETS[key] = TokenBucket(interval=interval, capacity=burst, tokens=burst,
+                                        ts=time.monotonic(), base=interval)
+    return b
+
+async def acquire(account: str, family: str, cost: float = 1.0) -> float:
+    """
+    Чекає дозволу на RPC сімейства family від акаунта account. Повертає фактичне очікування (сек).
+    Відра незалежні — інші акаунти/методи працюють, поки цей чекає.
+    """
+    wait = _bucket(account, family).reserve(time.monotonic(), cost)
+    if wait > 0:
+        log.debug("rate_limiter: %s/%s waits %.2fs", account, family, wait)
+        await asyncio.sleep(wait)
+    return wait
+
+def delay(account: str, family: str, cost: float = 1.0) -> float:
+    """Скільки зараз довелося б чекати (для планування, без резервування)."""
+    return _bucket(account, family).delay(time.monotonic(), cost)
+
+def _set_interval(account: str, family: str, b: TokenBucket, interval: float) -> None:
+    lo, hi = b.base * RL_ADAPT_FLOOR, b.base * RL_ADAPT_CEIL
+    interval = round(min(hi, max(lo, interval)), 3)
+    b.streak = 0
+    if interval == b.interval:
+        return
+    b._refill(time.monotonic())
+    log.info("rate_limiter: %s/%s interval %.2fs -> %.2fs", account, family, b.interval, interval)
+    b.interval = interval
+    try:
+        account_state.save_interval(account, family, interval)
+    except Exception as e:
+        log.warning("rate_limiter: save_interval failed: %s", e)
+
+def on_flood(account: str, family: str, seconds: int) -> None:
+    """
+    FLOOD_WAIT на RPC сімейства family: журналюємо подію і (RL_ADAPT=1) збільшуємо інтервал
+    відра — сильніше, якщо покарання довге. Сам сон акаунта ставить account_pool.mark_flood.
+    """
+    try:
+        account_state.record_flood(account, family, seconds)
+    except Exception as e:
+        log.warning("rate_limiter: record_flood failed: %s", e)
+    if not RL_ADAPT:
+        return
+    b = _bucket(account, family)
+    factor = RL_ADAPT_UP ** 2 if seconds >= RL_ADAPT_LONG else RL_ADAPT_UP
+    _set_interval(account, family, b, max(b.interval, b.base * RL_ADAPT_FLOOR) * factor)
+
+def on_success(account: str, family: str) -> None:
+    """Успішний RPC: кожні RL_ADAPT_STREAK успіхів поспіль інтервал трохи зменшується."""
+    if not RL_ADAPT:
+        return
+    b = _bucket(account, family)
+    b.streak += 1
+    if b.streak >= RL_ADAPT_STREAK:
+        _set_interval(account, family, b, b.interval * RL_ADAPT_DOWN)
+
+def restore(intervals: Optional[Dict[Tuple[str, str], float]] = None) -> int:
+    """
+    Підтягує навчені інтервали (з account_state, якщо не передано) — викликає start_pool.
+    Повертає кількість відновлених відер.
+    """
+    if intervals is None:
+        intervals = account_state.load_intervals()
+    n = 0
+    for (account, family), interval in intervals.items():
+        b = _bucket(account, family)
+        b.interval = min(b.base * RL_ADAPT_CEIL, max(b.base * RL_ADAPT_FLOOR, float(interval)))
+        n += 1
+    return n
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Стан відер для статусів/логів: {"account/family": {tokens, interval, base}}."""
+    now = time.monotonic()
+    out = {}
+    for (acc, fam), b in _BUCKETS.items():
+        b._refill(now)
+        out[f"{acc}/{fam}"] = {"tokens": round(b.tokens, 2), "interval": b.interval, "base": b.base}
+    return out
@@ -1,30 +1,161 @@
 # app/services/subscription_check.py
+import os
+import time
+import asyncio
 import logging
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
+from telethon.tl import types
 from telethon.tl.functions.channels import GetParticipantRequest
-from telethon.errors import ChannelInvalidError, ChannelPrivateError
+from telethon.tl.functions.messages import CheckChatInviteRequest
+from telethon.errors import (
+    ChannelInvalidError, ChannelPrivateError, UserNotParticipantError, FloodWaitError,
+    InviteHashInvalidError, InviteHashExpiredError,
+)
 
-from app.services.account_pool import iter_pool_clients, session_name
+from app.services import rate_limiter, entity_cache
+from app.services.account_pool import (
+    ClientSlot, account_key, iter_pool_clients, lease_slots, mark_flood, ready_slots, session_name,
+)
+from app.services.joiner import extract_invite_hash, resolve_channel
+from app.services.membership_db import (
+    get_membership, upsert_membership, map_invite_get, map_invite_set, channels_many, not_member_ts,
+)
+from app.utils.tg_links import username_from_url
 
 log = logging.getLogger("services.subscription_check")
 
+# скільки акаунтів перевіряємо одночасно
+SUBCHECK_CONCURRENCY = int(os.getenv("SUBCHECK_CONCURRENCY", "4") or "4")
+# через скільки секунд "not_member" перевіряємо знову (акаунт міг вступити поза ботом)
+SUBCHECK_NOT_MEMBER_TTL = int(os.getenv("SUBCHECK_NOT_MEMBER_TTL", str(6 * 3600)) or "0")
+
+MEMBER = ("joined", "already")
+NOT_MEMBER = "not_member"  # не фінальний: join цим акаунтом усе ще можливий
+
+
+def _known_channel_id(url: str) -> Optional[int]:
+    """channel_id без жодного RPC: invite_map для інвайтів, entity_cache для username."""
+    invite_hash = extract_invite_hash(url)
+    if invite_hash:
+        return map_invite_get(invite_hash)
+    username = username_from_url(url)
+    if username:
+        return entity_cache.channel_ids_many([username]).get(username)
+    return None
+
+
+async def _check_slot(slot: ClientSlot, url: str, invite_hash: Optional[str]) -> Tuple[Optional[bool], Optional[int]]:
+    """
+    Одна перевірка одним акаунтом. Повертає (учасник? | None — невідомо, channel_id | None).
+    Власний user id не потрібен: InputPeerSelf резолвиться без RPC.
+    """
+    client = slot.client
+    cid: Optional[int] = None
+    family = rate_limiter.RESOLVE
+    try:
+        if invite_hash:
+            await rate_limiter.acquire(slot.name, family)
+            res = await client(CheckChatInviteRequest(invite_hash))
+            rate_limiter.on_success(slot.name, family)
+            chat = getattr(res, "chat", None)
+            cid = int(chat.id) if chat is not None and getattr(chat, "id", None) else None
+            if cid:
+                map_invite_set(invite_hash, cid)
+            # ChatInviteAlready — ми вже в чаті; ChatInvite/ChatInvitePeek — ні
+            return isinstance(res, types.ChatInviteAlready), cid
+
+        peer, _, cid = await resolve_channel(client, url)   # флуд резолву враховує сам joiner
+        family = rate_limiter.PARTICIPANT
+        await rate_limiter.acquire(slot.name, family)
+        await client(GetParticipantRequest(peer, types.InputPeerSelf()))
+        rate_limiter.on_success(slot.name, family)
+        return True, cid or None
+    except UserNotParticipantError:
+        rate_limiter.on_success(slot.name, family)
+        return False, cid or None
+    except FloodWaitError as e:
+        log.warning("FLOOD in subscription check: %s url=%s seconds=%s", slot.name, url, e.seconds)
+        mark_flood(client, e.seconds)
+        if family == rate_limiter.PARTICIPANT or invite_hash:
+            rate_limiter.on_flood(slot.name, family, e.seconds)
+        return None, None
+    except (ChannelInvalidError, ChannelPrivateError, InviteHashInvalidError, InviteHashExpiredError):
+        # не канал або недоступний цьому клієнту
+        return None, None
+    except Exception as e:
+        log.debug("subscription check failed: %s url=%s: %s", slot.name, url, e)
+        return None, None
+
+
+async def check_subscribed(url: str, concurrency: int = SUBCHECK_CONCURRENCY) -> Optional[str]:
+    """
+    Чи підписаний бодай один акаунт пулу на канал/чат url. Повертає назву його сесії або None.
+
+    Спершу membership (без RPC): відомий учасник — одразу відповідь, акаунти з відомим
+    статусом пропускаються. Решту питаємо паралельно (не більше concurrency одночасно) і
+    повертаємось на першому позитиві. RPC роблять лише готові акаунти (ready_slots: не в
+    FLOOD_WAIT/too_many, з токеном RESOLVE), і кожен орендований (lease_slots) на час своєї
+    перевірки — конвеєр і воркери черги не отримають його паралельно. Відповіді пишемо в membership ("already"/"not_member"),
+    тож повторна перевірка того самого каналу коштує нуль RPC.
+    """
+    slots = iter_pool_clients()
+    if not slots:
+        return None
+
+    cid = _known_channel_id(url)
+    statuses: Dict[str, str] = dict(channels_many([cid]).get(cid) or {}) if cid is not None else {}
+    for slot in slots:
+        if statuses.get(account_key(slot)) in MEMBER:
+            return slot.name
+
+    # "not_member" старший за SUBCHECK_NOT_MEMBER_TTL — перевіряємо знову
+    if cid is not None and NOT_MEMBER in statuses.values():
+        now = time.time()
+        for acc, ts in not_member_ts(cid).items():
+            if now - ts >= SUBCHECK_NOT_MEMBER_TTL:
+                statuses.pop(acc, None)
+    ready = ready_slots(rate_limiter.RESOLVE)
+    todo: List[ClientSlot] = [s for s in ready if account_key(s) not in statuses]
+    if not todo:
+        return None
+
+    invite_hash = extract_invite_hash(url)
+    sem = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def _one(slot: ClientSlot):
+        async with sem:
+            async with lease_slots([slot]) as held:
+                if not held:
+                    return slot, (None, None)   # поки чекали — акаунт забрав хтось інший
+                return slot, await _check_slot(slot, url, invite_hash)
+
+    tasks = [asyncio.create_task(_one(s)) for s in todo]
+    found: Optional[str] = None
+    try:
+        for fut in asyncio.as_completed(tasks):
+            slot, (member, ch_id) = await fut
+            ch_id = ch_id or cid
+            if member is None:
+                continue
+            if ch_id is not None:
+                key = account_key(slot)
+                # не перетираємо фінальні статуси, що могли з'явитись поки йшов RPC
+                if member or get_membership(key, ch_id) in (None, NOT_MEMBER):
+                    upsert_membership(key, ch_id, "already" if member else NOT_MEMBER)
+            if member:
+                found = session_name(slot.client)
+                break
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return found
+
+
 async def is_already_subscribed_any(url: str) -> Optional[str]:
     """
     Якщо бодай один акаунт із пулу вже підписаний на канал/чат 'url',
     повертає назву його сесії (для статусу). Інакше None.
     """
-    for slot in iter_pool_clients():
-        client = slot.client
-        try:
-            ent = await client.get_entity(url)
-            me = await client.get_me()
-            await client(GetParticipantRequest(ent, me.id))
-            # якщо не впало — ми учасник
-            return session_name(client)
-        except (ChannelInvalidError, ChannelPrivateError):
-            # не канал або недоступний цьому клієнту — пробуємо далі
-            continue
-        except Exception:
-            continue
-    return None
\ No newline at end of file
+    return await check_subscribed(url)
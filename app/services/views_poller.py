@@ -0,0 +1,150 @@
+# app/services/views_poller.py
+# Опитування переглядів знайдених постів моніторів. Пости групуються за каналом, і на
+# кожен канал іде messages.GetMessagesViews на ≤100 id за раз — тож тік mon_interval коштує
+# ~1 RPC на канал, а не на пост. Канали розподіляються між акаунтами пулу, що є в них
+# учасниками (membership), з найменшим навантаженням; акаунти працюють паралельно.
+# Беремо лише готові акаунти пулу (ready_slots з токеном VIEWS) і на час тіку орендуємо ті,
+# кому дісталися канали, — lease/acquire інших задач їх у цей час не видадуть.
+import os, time, asyncio, logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telethon.tl import types
+from telethon.tl.functions.messages import GetMessagesViewsRequest
+from telethon.errors import FloodWaitError, ChannelPrivateError, ChannelInvalidError
+
+from app.services import rate_limiter, entity_cache, monitor_db, views_series
+from app.services.account_pool import ClientSlot, account_key, lease_slots, mark_flood, ready_slots
+from app.services.membership_db import channels_many
+from app.services.subscription_check import MEMBER
+
+log = logging.getLogger("services.views_poller")
+
+# id повідомлень в одному GetMessagesViews (ліміт Telegram — 100)
+VIEWS_BATCH = max(1, min(100, int(os.getenv("VIEWS_BATCH", "100") or "100")))
+
+Batch = Tuple[int, List[monitor_db.FoundPost]]  # (channel_id, пости каналу)
+
+
+@dataclass
+class PollResult:
+    channels: int = 0
+    posts: int = 0
+    updated: int = 0
+    deleted: int = 0
+    rpc: int = 0
+    skipped: int = 0   # канали без доступного акаунта / з помилкою
+    flood: int = 0
+
+
+def assign_channels(channel_ids: Iterable[int], slots: List[ClientSlot]) -> Dict[str, List[int]]:
+    """
+    channel_id -> акаунт: серед учасників каналу — найменш завантажений (к-сть каналів);
+    якщо учасників серед доступних немає — будь-який доступний (публічні канали читаються і так).
+    Повертає {slot.name: [channel_id, ...]}.
+    """
+    by_key = {account_key(s): s for s in slots}
+    load: Dict[str, int] = {s.name: 0 for s in slots}
+    out: Dict[str, List[int]] = defaultdict(list)
+    members = channels_many(channel_ids)
+    cands = {cid: [by_key[a].name for a, st in ch.items() if st in MEMBER and a in by_key] or list(load)
+             for cid, ch in members.items()}
+    # канали з меншою к-стю кандидатів розподіляємо першими
+    for cid in sorted(cands, key=lambda cid: len(cands[cid])):
+        name = min(cands[cid], key=lambda n: load[n])
+        load[name] += 1
+        out[name].append(cid)
+    return out
+
+
+async def input_peer(slot: ClientSlot, channel_id: int, hashes: Dict[int, int]):
+    """InputPeerChannel без RPC: кеш сесії Telethon, інакше access_hash з entity_cache."""
+    try:
+        return await slot.client.get_input_entity(types.PeerChannel(channel_id))
+    except (ValueError, TypeError):
+        ah = hashes.get(channel_id)
+        return types.InputPeerChannel(channel_id, ah) if ah is not None else None
+
+
+async def _poll_account(slot: ClientSlot, batches: List[Batch], res: PollResult,
+                        samples: List[views_series.Sample], deleted: List[int]) -> None:
+    hashes = entity_cache.access_hashes(slot.name, [cid for cid, _ in batches])
+    for cid, posts in batches:
+        peer = await input_peer(slot, cid, hashes)
+        if peer is None:
+            log.debug("views: %s has no access_hash for channel %s", slot.name, cid)
+            res.skipped += 1
+            continue
+        for i in range(0, len(posts), VIEWS_BATCH):
+            part = posts[i:i + VIEWS_BATCH]
+            try:
+                await rate_limiter.acquire(slot.name, rate_limiter.VIEWS)
+                r = await slot.client(GetMessagesViewsRequest(peer=peer, id=[p.msg_id for p in part], increment=False))
+                res.rpc += 1
+                ts = time.time()
+            except FloodWaitError as e:
+                log.warning("FLOOD in views poll: %s channel=%s seconds=%s", slot.name, cid, e.seconds)
+                mark_flood(slot.client, e.seconds)
+                rate_limiter.on_flood(slot.name, rate_limiter.VIEWS, e.seconds)
+                res.flood = max(res.flood, e.seconds)
+                return  # решту каналів цього акаунта — наступним тіком
+            except (ChannelPrivateError, ChannelInvalidError) as e:
+                log.info("views: channel %s unavailable for %s: %s", cid, slot.name, e)
+                res.skipped += 1
+                break
+            rate_limiter.on_success(slot.name, rate_limiter.VIEWS)
+            for p, mv in zip(part, r.views):
+                v = getattr(mv, "views", None)
+                if v is None:
+                    # у відповіді немає лічильника — пост видалено
+                    deleted.append(p.id)
+                    continue
+                samples.append((p.id, monitor_db.iso_ts(p.published_at), ts, v))
+
+
+async def poll_views(monitor_ids: Optional[Iterable[int]] = None,
+                     slots: Optional[List[ClientSlot]] = None) -> PollResult:
+    """
+    Один тік: перегляди всіх знайдених постів (або лише monitor_ids) -> views_series і
+    monitor_channels (max_views, views24 — з ряду, deleted_at). RPC ≈ Σ по каналах ceil(постів / VIEWS_BATCH).
+    slots — акаунти-кандидати (за замовчуванням ready_slots); до кінця тіку орендуються лише ті,
+    кому assign_channels дав канали, — решта пулу лишається вільною.
+    """
+    res = PollResult()
+    posts = monitor_db.found_posts(monitor_ids)
+    if not posts:
+        return res
+    by_channel: Dict[int, List[monitor_db.FoundPost]] = defaultdict(list)
+    for p in posts:
+        by_channel[p.channel_id].append(p)
+    res.channels, res.posts = len(by_channel), len(posts)
+
+    cands = ready_slots(rate_limiter.VIEWS) if slots is None else slots
+    plan = assign_channels(by_channel, cands) if cands else {}
+    by_name = {s.name: s for s in cands}
+    async with lease_slots([by_name[name] for name in plan]) as held:
+        if not held:
+            log.warning("views poll: no ready pool accounts")
+            res.skipped = res.channels
+            return res
+        if len(held) < len(plan):
+            # хтось устиг зайняти частину акаунтів — їхні канали ділимо між орендованими
+            names = {s.name for s in held}
+            lost = [cid for name, cids in plan.items() if name not in names for cid in cids]
+            plan = {name: cids for name, cids in plan.items() if name in names}
+            for name, cids in assign_channels(lost, held).items():
+                plan.setdefault(name, []).extend(cids)
+        samples: List[views_series.Sample] = []
+        deleted: List[int] = []
+        t0 = time.monotonic()
+        await asyncio.gather(*(
+            _poll_account(by_name[name], [(cid, by_channel[cid]) for cid in cids], res, samples, deleted)
+            for name, cids in plan.items()
+        ))
+    v24 = views_series.record_many(samples)
+    res.updated = monitor_db.update_views_many((rid, v, v24.get(rid)) for rid, _, _, v in samples)
+    res.deleted = monitor_db.mark_deleted_many(deleted)
+    log.info("views poll: channels=%d posts=%d updated=%d deleted=%d rpc=%d accounts=%d (%.2fs)",
+             res.channels, res.posts, res.updated, res.deleted, res.rpc, len(plan), time.monotonic() - t0)
+    return res
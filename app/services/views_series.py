@@ -0,0 +1,147 @@
+# app/services/views_series.py
+# Часовий ряд переглядів знайдених постів: (monitor_channels.id, ts, views) у таблиці
+# WITHOUT ROWID з цілими ключами — ~15 байт на точку, без окремого rowid-індексу.
+# Старі точки проріджуються: після SERIES_RAW_AGE лишається остання на годину, після
+# SERIES_HOURLY_AGE — остання на добу. views24 рахується в момент, коли нова точка
+# перетинає «публікація + 24 год» — інтерполяцією між нею й попередньою, без перечитування ряду.
+import os, time, logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import DEFAULT_MON_WINDOW
+from app.services.db.core import _conn, _ensure_tables, register_schema
+from app.services.monitor_db import VIEWS24_AFTER
+from app.utils.durations import parse_duration
+
+log = logging.getLogger("services.views_series")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS views_series (
+  row_id INTEGER NOT NULL,   -- monitor_channels.id
+  ts     INTEGER NOT NULL,   -- unix-ts заміру
+  views  INTEGER NOT NULL,
+  PRIMARY KEY (row_id, ts)
+) WITHOUT ROWID;
+"""
+
+register_schema(DDL)
+
+# сирі точки тримаємо стільки (за замовчуванням mon_window), далі — по одній на годину
+SERIES_RAW_AGE = parse_duration(os.getenv("SERIES_RAW_AGE", DEFAULT_MON_WINDOW), 24 * 3600.0)
+# погодинні — стільки, далі — по одній на добу
+SERIES_HOURLY_AGE = parse_duration(os.getenv("SERIES_HOURLY_AGE", "7d"), 7 * 86400.0)
+# як часто проріджувати (сек)
+SERIES_ROLLUP_EVERY = float(os.getenv("SERIES_ROLLUP_EVERY", "3600") or "0")
+
+Sample = Tuple[int, Optional[float], float, int]  # row_id, published_ts, ts, views
+
+_last_rollup = 0.0
+
+
+def _last_points(c, row_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+    """Остання точка кожного ряду: {row_id: (ts, views)} — один запит по ключу, без скану ряду."""
+    out: Dict[int, Tuple[int, int]] = {}
+    for i in range(0, len(row_ids), 500):
+        part = row_ids[i:i + 500]
+        # «голий» стовпець поруч із MAX() SQLite бере з рядка максимуму
+        for rid, ts, views in c.execute(
+            f"SELECT row_id, MAX(ts), views FROM views_series WHERE row_id IN ({','.join('?' * len(part))}) "
+            "GROUP BY row_id", part,
+        ):
+            out[rid] = (ts, views)
+    return out
+
+
+def _views24(published: Optional[float], prev: Optional[Tuple[int, int]], ts: int, views: int) -> Optional[int]:
+    """views24, якщо точка (ts, views) — перша після публікація+24 год; інакше None."""
+    if not published:
+        return None
+    mark = published + VIEWS24_AFTER
+    if ts < mark or (prev is not None and prev[0] >= mark):
+        return None
+    if prev is None or prev[0] < published:
+        return views
+    t0, v0 = prev
+    return int(round(v0 + (views - v0) * (mark - t0) / (ts - t0))) if ts > t0 else views
+
+
+def record_many(samples: Iterable[Sample]) -> Dict[int, int]:
+    """
+    Записує заміри [(row_id, published_ts, ts, views)] однією транзакцією.
+    Повертає {row_id: views24} для рядів, що щойно перетнули 24 год.
+    """
+    samples = [(int(r), p, int(ts), int(v)) for r, p, ts, v in samples]
+    if not samples:
+        return {}
+    _ensure_tables()
+    v24: Dict[int, int] = {}
+    rows = []
+    with _conn() as c:
+        last = _last_points(c, sorted({s[0] for s in samples}))
+        for rid, published, ts, views in sorted(samples, key=lambda s: (s[0], s[2])):
+            prev = last.get(rid)
+            if prev is not None and ts <= prev[0]:
+                continue
+            v = _views24(published, prev, ts, views)
+            if v is not None:
+                v24[rid] = v
+            rows.append((rid, ts, views))
+            last[rid] = (ts, views)
+        c.executemany("INSERT OR REPLACE INTO views_series(row_id, ts, views) VALUES (?,?,?)", rows)
+    if SERIES_ROLLUP_EVERY >= 0 and time.monotonic() - _last_rollup >= SERIES_ROLLUP_EVERY:
+        rollup()
+    return v24
+
+
+def rollup(now: Optional[float] = None) -> int:
+    """
+    Проріджує старі точки: старші за SERIES_RAW_AGE — остання на годину, старші за
+    SERIES_HOURLY_AGE — остання на добу. Повертає к-сть видалених.
+    """
+    global _last_rollup
+    _last_rollup = time.monotonic()
+    now = time.time() if now is None else now
+    n = 0
+    _ensure_tables()
+    with _conn() as c:
+        for age, bucket in ((SERIES_HOURLY_AGE, 86400), (SERIES_RAW_AGE, 3600)):
+            if age <= 0:
+                continue
+            n += c.execute(
+                "DELETE FROM views_series WHERE ts < :cut AND (row_id, ts) NOT IN ("
+                "SELECT row_id, MAX(ts) FROM views_series WHERE ts < :cut GROUP BY row_id, ts / :b)",
+                {"cut": int(now - age), "b": bucket},
+            ).rowcount
+    if n:
+        log.info("views series: rolled up %d points", n)
+    return n
+
+
+def series(row_id: int, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[int, int]]:
+    """Точки ряду [(ts, views)] за зростанням ts."""
+    _ensure_tables()
+    return [tuple(r) for r in _conn().execute(
+        "SELECT ts, views FROM views_series WHERE row_id=? AND ts >= ? AND ts <= ? ORDER BY ts",
+        (int(row_id), int(since or 0), int(until if until is not None else 2 ** 62)),
+    )]
+
+
+def views_at(row_id: int, ts: float) -> Optional[int]:
+    """Перегляди на момент ts: інтерполяція між сусідніми точками (після останньої — вона сама)."""
+    _ensure_tables()
+    c = _conn()
+    before = c.execute("SELECT ts, views FROM views_series WHERE row_id=? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+                       (int(row_id), int(ts))).fetchone()
+    if before is None:
+        return None
+    after = c.execute("SELECT ts, views FROM views_series WHERE row_id=? AND ts > ? ORDER BY ts LIMIT 1",
+                      (int(row_id), int(ts))).fetchone()
+    if after is None:
+        return before[1]
+    (t0, v0), (t1, v1) = before, after
+    return int(round(v0 + (v1 - v0) * (ts - t0) / (t1 - t0)))
+
+
+def stats() -> Dict[str, int]:
+    _ensure_tables()
+    points, rows = _conn().execute("SELECT COUNT(*), COUNT(DISTINCT row_id) FROM views_series").fetchone()
+    return {"points": points, "series": rows}
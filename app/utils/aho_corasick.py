@@ -0,0 +1,135 @@
+# app/utils/aho_corasick.py
+# Автомат Ахо–Корасік над рядками: усі входження всіх шаблонів за один прохід тексту, O(len(text) + к-сть збігів).
+# Шаблони додаються/прибираються інкрементально (лише гілка трі), fail-посилання
+# перебудовуються ліниво — при першому скануванні після змін.
+import os
+from collections import deque
+from typing import Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+# до скількох різних шаблонів замість проходу автоматом шукаємо кожен str.find (C-цикл)
+AC_FIND_MAX = int(os.getenv("AC_FIND_MAX", "8") or "0")
+
+
+class _Node:
+    __slots__ = ("next", "fail", "out", "dict_link", "depth")
+
+    def __init__(self, depth: int = 0):
+        self.next: Dict[str, "_Node"] = {}
+        self.fail: Optional["_Node"] = None
+        self.out: Set[Hashable] = set()          # ключі шаблонів, що закінчуються саме тут
+        self.dict_link: Optional["_Node"] = None  # найближчий по fail-ланцюжку вузол із out
+        self.depth = depth
+
+
+class AhoCorasick:
+    """
+    Мульти-шаблонний пошук. Ключ — довільний hashable (id needle), шаблон — рядок.
+    Кілька ключів можуть мати однаковий шаблон.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._patterns: Dict[Hashable, str] = {}
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._patterns
+
+    def add(self, key: Hashable, pattern: str) -> None:
+        """Додає (або замінює) шаблон для key. Порожній шаблон ігнорується."""
+        if self._patterns.get(key) == pattern:
+            return
+        if key in self._patterns:
+            self.remove(key)
+        if not pattern:
+            return
+        node = self._root
+        for ch in pattern:
+            nxt = node.next.get(ch)
+            if nxt is None:
+                nxt = node.next[ch] = _Node(node.depth + 1)
+            node = nxt
+        node.out.add(key)
+        self._patterns[key] = pattern
+        self._dirty = True
+
+    def remove(self, key: Hashable) -> bool:
+        pattern = self._patterns.pop(key, None)
+        if pattern is None:
+            return False
+        path = [self._root]
+        for ch in pattern:
+            path.append(path[-1].next[ch])
+        path[-1].out.discard(key)
+        # обрізаємо гілку, що більше нікому не потрібна
+        for i in range(len(path) - 1, 0, -1):
+            node = path[i]
+            if node.out or node.next:
+                break
+            del path[i - 1].next[pattern[i - 1]]
+        self._dirty = True
+        return True
+
+    def _build(self) -> None:
+        """BFS по трі: fail- і dict-посилання. O(сумарної довжини шаблонів)."""
+        root = self._root
+        root.fail = None
+        root.dict_link = None
+        q = deque()
+        for child in root.next.values():
+            child.fail = root
+            child.dict_link = None
+            q.append(child)
+        while q:
+            node = q.popleft()
+            for ch, child in node.next.items():
+                f = node.fail
+                while f is not None and ch not in f.next:
+                    f = f.fail
+                child.fail = f.next[ch] if f is not None else root
+                child.dict_link = child.fail if child.fail.out else child.fail.dict_link
+                q.append(child)
+        self._dirty = False
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Hashable]]:
+        """Yield (start, end, key) для кожного входження; end — виключно."""
+        if not text or not self._patterns:
+            return
+        if len(self._patterns) <= AC_FIND_MAX:
+            yield from self._iter_find(text)
+            return
+        if self._dirty:
+            self._build()
+        root = self._root
+        node = root
+        for i, ch in enumerate(text):
+            while node is not root and ch not in node.next:
+                node = node.fail
+            node = node.next.get(ch, root)
+            hit = node if node.out else node.dict_link
+            while hit is not None:
+                for key in hit.out:
+                    yield i + 1 - hit.depth, i + 1, key
+                hit = hit.dict_link
+
+    def _iter_find(self, text: str) -> Iterator[Tuple[int, int, Hashable]]:
+        """Ті самі входження (у тому ж порядку — за кінцем), але через str.find по кожному шаблону."""
+        found = []
+        for key, pattern in self._patterns.items():
+            i = text.find(pattern)
+            while i >= 0:
+                found.append((i + len(pattern), -len(pattern), i, key))
+                i = text.find(pattern, i + 1)
+        found.sort(key=lambda x: (x[0], x[1]))
+        for end, _, start, key in found:
+            yield start, end, key
+
+    def find_keys(self, text: str) -> Set[Hashable]:
+        """Ключі шаблонів, що бодай раз входять у text."""
+        return {key for _, _, key in self.iter_matches(text)}
+
+    def patterns(self) -> List[Tuple[Hashable, str]]:
+        return list(self._patterns.items())
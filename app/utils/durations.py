@@ -0,0 +1,26 @@
+# app/utils/durations.py
+import re
+from typing import Optional
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_PART_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([smhdw]?)', re.IGNORECASE)
+
+def parse_duration(value, default: Optional[float] = None) -> Optional[float]:
+    """
+    '30m' | '1h30m' | '72h' | '90' (секунди) | 3600 -> секунди.
+    Нерозпізнане — default.
+    """
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    s = str(value).strip().replace(" ", "")
+    if not s:
+        return default
+    total, pos = 0.0, 0
+    for m in _PART_RE.finditer(s):
+        if m.start() != pos:
+            return default
+        total += float(m.group(1)) * _UNITS[(m.group(2) or "s").lower()]
+        pos = m.end()
+    return total if pos == len(s) else default
@@ -0,0 +1,137 @@
+# app/utils/fuzzy.py
+# Фаззі-схожість needle і поста для режиму fuzzy (поріг DEFAULT_FUZZ, 0..100):
+#   score = 100 * (1 - levenshtein(a, b) / max(len(a), len(b)))
+# Дорогу частину відсікаємо заздалегідь: різниця довжин, гістограм символів і спільних біграм
+# дають нижню межу відстані; сама відстань рахується лише в діагональній смузі (Укконен) з
+# виходом, щойно мінімум рядка перевищив k. Поріг -> k = floor((100 - threshold) / 100 * max_len).
+from collections import Counter
+from typing import NamedTuple, Optional
+
+from app.utils.text_norm import normalize_strict, collapse_ws
+
+
+class Prepared(NamedTuple):
+    text: str
+    hist: Counter     # символи
+    grams: Counter    # біграми символів
+
+
+def prepare(text: str) -> Prepared:
+    """Нормалізований текст (пробіли згорнуті, casefold) + гістограми символів і біграм — рахуються один раз."""
+    s = collapse_ws(normalize_strict(text)).casefold()
+    return Prepared(s, Counter(s), Counter(s[i:i + 2] for i in range(len(s) - 1)))
+
+
+def max_distance(la: int, lb: int, threshold: float) -> int:
+    return int((100.0 - threshold) / 100.0 * max(la, lb))
+
+
+def hist_lower_bound(h1: Counter, h2: Counter) -> int:
+    """Нижня межа відстані Левенштейна за гістограмами: max(зайвих у першому, зайвих у другому)."""
+    extra1 = sum((h1 - h2).values())
+    extra2 = sum((h2 - h1).values())
+    return extra1 if extra1 > extra2 else extra2
+
+
+def grams_lower_bound(g1: Counter, g2: Counter, la: int, lb: int) -> int:
+    """
+    Нижня межа за спільними біграмами: одна правка руйнує не більше 2 біграм, тож
+    |спільні| >= max_len - 1 - 2d  =>  d >= (max_len - 1 - |спільні|) / 2.
+    """
+    if len(g1) > len(g2):
+        g1, g2 = g2, g1
+    common = 0
+    for g, c in g1.items():
+        c2 = g2.get(g)
+        if c2:
+            common += c if c < c2 else c2
+    need = max(la, lb) - 1 - common
+    return (need + 1) // 2 if need > 0 else 0
+
+
+def bounded_levenshtein(a: str, b: str, k: int) -> int:
+    """
+    Відстань Левенштейна, якщо вона <= k, інакше k + 1.
+    Рахуємо лише діагоналі, через які шлях вартістю <= k взагалі можливий
+    (|j-i| + |delta-(j-i)| <= k), і виходимо, щойно весь рядок смуги > k.
+    """
+    # спільні префікс/суфікс не впливають на відстань
+    n = min(len(a), len(b))
+    p = 0
+    while p < n and a[p] == b[p]:
+        p += 1
+    a, b = a[p:], b[p:]
+    n -= p
+    s = 0
+    while s < n and a[-1 - s] == b[-1 - s]:
+        s += 1
+    if s:
+        a, b = a[:-s], b[:-s]
+
+    la, lb = len(a), len(b)
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    inf = k + 1
+    if lb - la > k:
+        return inf
+    if la == 0:
+        return lb
+
+    delta = lb - la
+    slack = (k - delta) // 2                 # наскільки шлях може відхилитись від діагоналей 0..delta
+    right = delta + slack
+    prev = [j if j <= right else inf for j in range(lb + 1)]
+    cur = [inf] * (lb + 1)
+    for i in range(1, la + 1):
+        ca = a[i - 1]
+        lo = i - slack if i > slack else 1
+        hi = i + right if i + right < lb else lb
+        left = i if lo == 1 else inf
+        cur[lo - 1] = left
+        row_min = left
+        for j in range(lo, hi + 1):
+            v = prev[j - 1] + (ca != b[j - 1])
+            x = prev[j] + 1
+            if x < v:
+                v = x
+            x = left + 1
+            if x < v:
+                v = x
+            if v > inf:
+                v = inf
+            cur[j] = left = v
+            if v < row_min:
+                row_min = v
+        if hi < lb:
+            cur[hi + 1] = inf
+        if row_min > k:
+            return inf
+        prev, cur = cur, prev
+    return prev[lb] if prev[lb] <= k else inf
+
+
+def score_prepared(a: Prepared, b: Prepared, threshold: float) -> Optional[float]:
+    """Схожість 0..100, якщо вона >= threshold; None — відсічено (без повного підрахунку)."""
+    la, lb = len(a.text), len(b.text)
+    if not la or not lb:
+        return None
+    k = max_distance(la, lb, threshold)
+    if abs(la - lb) > k:
+        return None
+    if hist_lower_bound(a.hist, b.hist) > k:
+        return None
+    if grams_lower_bound(a.grams, b.grams, la, lb) > k:
+        return None
+    d = bounded_levenshtein(a.text, b.text, k)
+    if d > k:
+        return None
+    return 100.0 * (1.0 - d / max(la, lb))
+
+
+def ratio(a: str, b: str) -> float:
+    """Повна схожість 0..100 без відсікання (для діагностики/тестів)."""
+    pa, pb = prepare(a), prepare(b)
+    m = max(len(pa.text), len(pb.text))
+    if not m:
+        return 100.0
+    return 100.0 * (1.0 - bounded_levenshtein(pa.text, pb.text, m) / m)
@@ -0,0 +1,51 @@
+# app/utils/minhash.py
+# MinHash-підпис тексту поста для пошуку майже-дублів (репост із правками):
+# частка однакових позицій двох підписів оцінює схожість Жаккара їхніх наборів ознак.
+# Ознаки не залежать від порядку (слова + лінки), тож переставлені лінки/рядки,
+# замінені емодзі й обрізаний хвіст лише трохи зменшують схожість.
+import re
+from array import array
+from hashlib import blake2b
+from typing import Set
+
+from app.utils.text_norm import normalize_strict
+
+NUM_PERM = 64
+_MASK32 = 0xFFFFFFFF
+
+# NUM_PERM незалежних 32-бітних хешів ознаки = 4 blake2b по 64 байти з різною сіллю
+# (фіксовані — підписи стабільні між запусками і сумісні з тим, що лежить у SQLite)
+_SALTS = tuple(f"minhash{i}".encode() for i in range(NUM_PERM // 16))
+
+_RE_LINK = re.compile(r"(?:https?://|www\.)\S+|t\.me/\S+|@\w{4,}", re.IGNORECASE)
+_RE_WORD = re.compile(r"\w+")
+
+
+def features(text: str) -> Set[str]:
+    """Набір ознак: слова (без емодзі/пунктуації, у нижньому регістрі) і лінки/згадки окремими токенами."""
+    s = normalize_strict(text).casefold()
+    out = {"l:" + m.group(0).rstrip(".,;:!?)") for m in _RE_LINK.finditer(s)}
+    out.update(_RE_WORD.findall(_RE_LINK.sub(" ", s)))
+    return out
+
+
+def signature_features(feats: Set[str]) -> array:
+    """array('I') з NUM_PERM мінімумів; для порожнього набору — усі _MASK32 (ні з чим не схожий)."""
+    if not feats:
+        return array("I", [_MASK32] * NUM_PERM)
+    rows = []
+    for f in feats:
+        data = f.encode("utf-8")
+        rows.append(array("I", b"".join(blake2b(data, digest_size=64, salt=salt).digest() for salt in _SALTS)))
+    # поелементний мінімум по всіх ознаках — у C (zip/min), без циклу Python на кожен хеш
+    return array("I", map(min, zip(*rows)))
+
+
+def signature(text: str) -> array:
+    return signature_features(features(text))
+
+
+def similarity(s1, s2) -> float:
+    """Оцінка схожості Жаккара за двома підписами (0..1)."""
+    same = sum(1 for x, y in zip(s1, s2) if x == y)
+    return same / NUM_PERM
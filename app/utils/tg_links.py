@@ -1,6 +1,6 @@
 # app/utils/tg_links.py
 import re
-from typing import List
+from typing import List, Optional
 
 # characters that often stick to URLs
 _TRIM_LEAD  = "(<[«\"' \u00A0\u200b\u200c\u200d\u2060"
@@ -49,4 +49,66 @@ def parse_links(text: str) -> List[str]:
         raw = m.group(1)
         url = sanitize_link(raw)
         seen[url] = None
-    return list(seen.keys())
\ No newline at end of file
+    return list(seen.keys())
+
+_USERNAME_RE = re.compile(r'^(?:https?://)?(?:www\.)?(?:t\.me|telegram\.me)/([A-Za-z][A-Za-z0-9_]{3,31})(?:/\d+)?/?$',
+                          re.IGNORECASE)
+_NOT_USERNAMES = {"joinchat", "addstickers", "share", "proxy", "socks", "iv", "s", "c"}
+
+def username_from_url(u: str) -> Optional[str]:
+    """
+    'https://t.me/Name' | 't.me/name/123' | '@Name' -> 'name' (нижній регістр).
+    Для інвайтів, t.me/c/..., службових шляхів — None.
+    """
+    u = (u or "").strip()
+    if u.startswith("@"):
+        u = "t.me/" + u[1:]
+    m = _USERNAME_RE.match(u)
+    if not m:
+        return None
+    name = m.group(1).lower()
+    return None if name in _NOT_USERNAMES else name
+
+_POST_RE   = re.compile(r'^https?://t\.me/([A-Za-z0-9_]+)(?:/\d+)?/?$', re.IGNORECASE)
+_C_POST_RE = re.compile(r'^https?://t\.me/c/(\d+)(?:/\d+)?/?$', re.IGNORECASE)
+_INVITE_RE = re.compile(r'^https?://t\.me/\+[\w-]+', re.IGNORECASE)
+
+def norm_tg_link(url: str) -> Optional[str]:
+    """
+    Будь-яке t.me посилання -> посилання на канал:
+      t.me/username/123 -> https://t.me/username (username у нижньому регістрі)
+      t.me/c/<id>/<msg> -> https://t.me/c/<id>
+      t.me/+invite      -> як є
+    Нерозпізнане — None.
+    """
+    if not url:
+        return None
+    # joinchat/<hash> — інвайт; регістр хешу зберігаємо
+    u = sanitize_link(re.sub(r'/joinchat/', '/+', url, flags=re.IGNORECASE))
+    m = _C_POST_RE.match(u)
+    if m:
+        return f"https://t.me/c/{m.group(1)}"
+    m = _POST_RE.match(u)
+    if m:
+        return f"https://t.me/{m.group(1).lower()}"
+    if _INVITE_RE.match(u):
+        return u
+    return None
+
+def link_fingerprint(urls) -> frozenset:
+    """
+    Відбиток набору посилань поста (цілі прихованих гіперпосилань): t.me — до каналу
+    через norm_tg_link, решта — без схеми, з доменом у нижньому регістрі і без хвостового '/'.
+    """
+    out = set()
+    for url in urls:
+        url = (url or "").strip()
+        if not url:
+            continue
+        n = norm_tg_link(url) if re.search(r'(?:t|telegram)\.me/', url, re.IGNORECASE) else None
+        if n is None:
+            rest = re.sub(r'^[a-z]+://', '', url, flags=re.IGNORECASE)
+            host, _, path = rest.partition("/")
+            n = host.lower() + ("/" + path.rstrip("/") if path.rstrip("/") else "")
+        out.add(n)
+    return frozenset(out)
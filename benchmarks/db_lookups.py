@@ -0,0 +1,96 @@
+# benchmarks/db_lookups.py
+# Мікробенчмарк гарячих lookup-ів membership_db / link_queue:
+# "до" — нове sqlite3.connect + busy_timeout на кожен виклик (як було раніше),
+# "core" — той самий SQL через довгоживуче з'єднання app.services.db.core (_conn), без кешу,
+# "кеш" — окремо, для довідки: membership_db як є, з in-memory кешем після preload.
+#
+#   python -m benchmarks.db_lookups [--rows 20000] [--lookups 20000]
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+
+def _old_conn(path: str) -> sqlite3.Connection:
+    c = sqlite3.connect(path)
+    c.execute("PRAGMA busy_timeout=3000;")
+    return c
+
+
+def _old_get_membership(path: str, account: str, channel_id: int):
+    with _old_conn(path) as c:
+        row = c.execute(
+            "SELECT status FROM membership WHERE channel_id=? AND account=? LIMIT 1",
+            (int(channel_id), account),
+        ).fetchone()
+        return row[0] if row else None
+
+
+def _old_url_get(path: str, url: str):
+    with _old_conn(path) as c:
+        row = c.execute("SELECT status FROM url_cache WHERE url=? LIMIT 1", (url,)).fetchone()
+        return row[0] if row else None
+
+
+def _core_get_membership(account: str, channel_id: int):
+    from app.services.db.core import _conn
+    row = _conn().execute(
+        "SELECT status FROM membership WHERE channel_id=? AND account=? LIMIT 1",
+        (int(channel_id), account),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _core_url_get(url: str):
+    from app.services.db.core import _conn
+    row = _conn().execute("SELECT status FROM url_cache WHERE url=? LIMIT 1", (url,)).fetchone()
+    return row[0] if row else None
+
+
+def _rate(fn, keys) -> float:
+    t0 = time.perf_counter()
+    for k in keys:
+        fn(*k)
+    return len(keys) / (time.perf_counter() - t0)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--lookups", type=int, default=20000)
+    args = ap.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_db_"), "bench.sqlite3")
+    os.environ["DB_PATH"] = path
+    from app.services import membership_db
+
+    membership_db.init(path)
+    accounts = [f"acc{i}" for i in range(8)]
+    rnd = random.Random(1)
+    for i in range(args.rows):
+        membership_db.upsert_membership(rnd.choice(accounts), 1000 + i, "joined")
+        membership_db.url_put(f"https://t.me/chan{i}", "already")
+
+    membership_db.init(path)  # прогрів кешу, як при старті бота
+    memb_keys = [(rnd.choice(accounts), 1000 + rnd.randrange(args.rows)) for _ in range(args.lookups)]
+    url_keys = [(f"https://t.me/chan{rnd.randrange(args.rows * 2)}",) for _ in range(args.lookups)]
+
+    rows = [
+        ("get_membership", _rate(lambda a, c: _old_get_membership(path, a, c), memb_keys),
+         _rate(_core_get_membership, memb_keys), _rate(membership_db.get_membership, memb_keys)),
+        ("url_get", _rate(lambda u: _old_url_get(path, u), url_keys),
+         _rate(_core_url_get, url_keys), _rate(membership_db.url_get, url_keys)),
+    ]
+    print(f"sqlite {sqlite3.sqlite_version}; rows={args.rows} lookups={args.lookups}")
+    print(f"{'lookup':<16}{'before/s':>12}{'core/s':>12}{'x':>8}{'cache/s':>12}")
+    for name, before, core, cached in rows:
+        print(f"{name:<16}{before:>12.0f}{core:>12.0f}{core / before:>8.1f}{cached:>12.0f}")
+    print("cache:", membership_db.cache_stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# benchmarks/fuzzy.py
+# Бенчмарк фаззі-скорингу: 10k постів x 50 needle (поріг DEFAULT_FUZZ).
+# "до" — повний Левенштейн на кожну пару (наївно; міряється на вибірці і екстраполюється),
+# "після" — app.utils.fuzzy з відсіканням за довжиною/гістограмою і смуговою відстанню,
+# окремо — те саме в ProcessPoolExecutor (app.services.fuzzy_scorer).
+# Перед замірами перевіряє, що знайдені пари збігаються з наївними на вибірці.
+#
+#   python -m benchmarks.fuzzy [--posts 10000] [--needles 50] [--sample 40]
+import time
+import random
+import asyncio
+import argparse
+
+
+def _naive_ratio(a: str, b: str) -> float:
+    m = max(len(a), len(b))
+    if not m:
+        return 100.0
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return 100.0 * (1.0 - prev[-1] / m)
+
+
+_COMMON = ("і в на у з що не за до це як та але від для по акція знижка сьогодні канал "
+           "підписуйтесь посиланням розіграш деталі ціна доставка").split()
+_SYL = "ка ро ве ні ма ли то ре да зо пу ки ло ва ст ри на ко де ти ля мо бу".split()
+
+
+def _vocab(rnd: random.Random, n: int = 5000) -> list:
+    """Псевдослова зі складів — словник тематичних постів, плюс часті службові слова."""
+    return [''.join(rnd.choice(_SYL) for _ in range(rnd.randint(1, 4))) for _ in range(n)]
+
+
+def _text(rnd: random.Random, vocab: list) -> str:
+    words = []
+    for _ in range(rnd.randint(8, 60)):
+        words.append(rnd.choice(_COMMON) if rnd.random() < 0.35 else rnd.choice(vocab))
+    return " ".join(words)
+
+
+def _mutate(rnd: random.Random, s: str, edits: int) -> str:
+    chars = list(s)
+    for _ in range(edits):
+        op = rnd.random()
+        i = rnd.randrange(len(chars)) if chars else 0
+        if op < 0.4 and chars:
+            chars[i] = rnd.choice("абвгдеєжзиіїй ")
+        elif op < 0.7 and chars:
+            del chars[i]
+        else:
+            chars.insert(i, rnd.choice("🔥✅ !"))
+    return "".join(chars)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--posts", type=int, default=10000)
+    ap.add_argument("--needles", type=int, default=50)
+    ap.add_argument("--sample", type=int, default=40, help="постів для наївного заміру/перевірки")
+    ap.add_argument("--threshold", type=float, default=None)
+    args = ap.parse_args(argv)
+
+    from app.config import DEFAULT_FUZZ
+    from app.utils.fuzzy import prepare
+    from app.services import fuzzy_scorer
+
+    threshold = DEFAULT_FUZZ if args.threshold is None else args.threshold
+    rnd = random.Random(7)
+    vocab = _vocab(rnd)
+    needles = [(f"n{i}", _text(rnd, vocab)) for i in range(args.needles)]
+    posts = []
+    for i in range(args.posts):
+        if rnd.random() < 0.02:  # ~2% постів — злегка відредаговані рекламні пости
+            base = rnd.choice(needles)[1]
+            posts.append((i, _mutate(rnd, base, rnd.randint(0, len(base) // 12))))
+        else:
+            posts.append((i, _text(rnd, vocab)))
+    pairs = len(posts) * len(needles)
+    print(f"corpus: {len(posts)} posts x {len(needles)} needles = {pairs:,} pairs, threshold {threshold}")
+
+    sample = posts[:args.sample]
+    prep_n = [(nk, prepare(nt).text) for nk, nt in needles]
+    t0 = time.perf_counter()
+    naive = set()
+    for pk, pt in sample:
+        p = prepare(pt).text
+        for nk, n in prep_n:
+            if p and _naive_ratio(p, n) >= threshold:
+                naive.add((pk, nk))
+    dt = time.perf_counter() - t0
+    naive_rate = len(sample) * len(needles) / dt
+    print(f"before (naive, sample {len(sample)}): {naive_rate:>12,.0f} pairs/s  -> ~{pairs / naive_rate:,.0f}s for all")
+
+    fast_sample = {(pk, nk) for pk, nk, _ in fuzzy_scorer.score_batch(sample, needles, threshold)}
+    if fast_sample != naive:
+        print(f"MISMATCH: naive={len(naive)} fast={len(fast_sample)}")
+        return 1
+
+    t0 = time.perf_counter()
+    found = fuzzy_scorer.score_batch(posts, needles, threshold)
+    dt = time.perf_counter() - t0
+    print(f"after  (pruned, 1 process):       {pairs / dt:>12,.0f} pairs/s  ({dt:.2f}s, {len(found)} matches)")
+
+    async def _pool():
+        t = time.perf_counter()
+        res = await fuzzy_scorer.score_batch_async(posts, needles, threshold)
+        return res, time.perf_counter() - t
+
+    asyncio.run(_pool())  # прогрів пулу
+    res, dt = asyncio.run(_pool())
+    fuzzy_scorer.shutdown()
+    print(f"after  (pruned, process pool):    {pairs / dt:>12,.0f} pairs/s  ({dt:.2f}s, {len(res)} matches)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
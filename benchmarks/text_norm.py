@@ -0,0 +1,114 @@
+# benchmarks/text_norm.py
+# Мікробенчмарк нормалізації тексту постів:
+# "до" — попередня реалізація app.utils.text_norm (скопійована нижче як еталон),
+# "після" — app.utils.text_norm як є (+ окремо мемо за повідомленням).
+# Перед замірами перевіряє, що результати збігаються символ у символ.
+#
+#   python -m benchmarks.text_norm [--posts 5000] [--rounds 5]
+import re
+import time
+import random
+import argparse
+import unicodedata
+from types import SimpleNamespace
+
+
+# ---------- еталон (стара реалізація) ----------
+
+def _old_strip_invisible(s: str) -> str:
+    if not s:
+        return s or ""
+    for ch in ["\u200b", "\u200c", "\u200d", "\ufeff", "\u2060"]:
+        s = s.replace(ch, "")
+    return s.replace("\r\n", "\n").replace("\r", "\n")
+
+def _old_normalize_strict(s: str) -> str:
+    if s is None:
+        return ""
+    s = _old_strip_invisible(s)
+    s = unicodedata.normalize("NFC", s)
+    s = s.replace("\u00a0", " ")
+    s = "\n".join(line.strip() for line in s.split("\n"))
+    s = re.sub(r"[ \t]+", " ", s)
+    s = re.sub(r"\n{3,}", "\n\n", s)
+    return s.strip()
+
+def _old_collapse_ws(s: str) -> str:
+    return re.sub(r"\s+", " ", s or "").strip()
+
+
+# ---------- корпус, схожий на пости каналів ----------
+
+_WORDS_UA = ("акція знижка сьогодні тільки новий канал підписуйтесь переходьте за посиланням "
+             "розіграш призи деталі у коментарях ціна гривень доставка по всій Україні").split()
+_WORDS_EN = "sale today only new channel follow link giveaway details price free shipping".split()
+_DECOR = ["🔥", "👉", "✅", "💰", "🎁", "⚡️", "\u00a0", "\u200b", "  ", "\t", "e\u0301", "\u2003"]
+_LINKS = ["https://t.me/somechannel", "https://t.me/+AbCdEf123", "@promo_bot", "https://example.com/p?id=42"]
+
+
+def _post(rnd: random.Random) -> str:
+    kind = rnd.random()
+    words = _WORDS_EN if kind < 0.3 else _WORDS_UA
+    lines = []
+    for _ in range(rnd.randint(1, 12)):
+        parts = [rnd.choice(words) for _ in range(rnd.randint(0, 14))]
+        if kind >= 0.3:  # ~70% постів — не-ASCII з емодзі/NBSP/невидимими
+            for _ in range(rnd.randint(0, 3)):
+                parts.insert(rnd.randint(0, len(parts)), rnd.choice(_DECOR))
+        if rnd.random() < 0.3:
+            parts.append(rnd.choice(_LINKS))
+        lines.append(" ".join(parts))
+    sep = "\r\n" if rnd.random() < 0.1 else "\n"
+    text = sep.join(lines)
+    if rnd.random() < 0.3:
+        text = "\n\n\n" + text + "  \n\n"
+    return text
+
+
+def _rate(fn, texts, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for t in texts:
+            fn(t)
+    return len(texts) * rounds / (time.perf_counter() - t0)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--posts", type=int, default=5000)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    from app.utils import text_norm
+
+    rnd = random.Random(1)
+    texts = [_post(rnd) for _ in range(args.posts)]
+    ascii_share = sum(t.isascii() for t in texts) / len(texts)
+
+    bad = [t for t in texts if text_norm.normalize_strict(t) != _old_normalize_strict(t)]
+    bad += [t for t in texts if text_norm.collapse_ws(t) != _old_collapse_ws(t)]
+    if bad:
+        print(f"MISMATCH on {len(bad)} texts, first: {bad[0]!r}")
+        return 1
+
+    print(f"corpus: {len(texts)} posts, avg {sum(map(len, texts)) // len(texts)} chars, ascii {ascii_share:.0%}")
+    old = _rate(_old_normalize_strict, texts, args.rounds)
+    new = _rate(text_norm.normalize_strict, texts, args.rounds)
+    print(f"normalize_strict  before: {old:>10,.0f} posts/s")
+    print(f"normalize_strict  after:  {new:>10,.0f} posts/s  (x{new / old:.1f})")
+    old = _rate(_old_collapse_ws, texts, args.rounds)
+    new = _rate(text_norm.collapse_ws, texts, args.rounds)
+    print(f"collapse_ws       before: {old:>10,.0f} posts/s")
+    print(f"collapse_ws       after:  {new:>10,.0f} posts/s  (x{new / old:.1f})")
+
+    # мемо: ті самі пости перевіряються кількома моніторами/проходами
+    hot = texts[:max(1, text_norm.TEXT_NORM_MEMO)]
+    msgs = [SimpleNamespace(chat_id=-100, id=i, edit_date=None, raw_text=t) for i, t in enumerate(hot)]
+    text_norm.memo_clear()
+    memo = _rate(text_norm.normalize_message, msgs, args.rounds)
+    print(f"normalize_message (memo): {memo:>10,.0f} posts/s  (memo size {text_norm.TEXT_NORM_MEMO})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,15 @@
+# tests/conftest.py
+# Кожен тест, якому потрібна БД, отримує власний SQLite у tmp_path (core.configure),
+# з'єднання потоку закриваються після тесту, шлях повертається до попереднього.
+import pytest
+
+from app.services.db import core
+
+
+@pytest.fixture
+def db(tmp_path):
+    prev = core.DB_PATH
+    path = core.configure(str(tmp_path / "test.sqlite3"))
+    yield path
+    core.close_all()
+    core.configure(prev)
@@ -0,0 +1,47 @@
+# tests/test_aho_corasick.py
+# Автомат і fast path через str.find мають давати ті самі входження, що й наївний пошук.
+import random
+
+import pytest
+
+from app.utils import aho_corasick
+from app.utils.aho_corasick import AhoCorasick
+
+
+def _naive(patterns, text):
+    out = set()
+    for key, p in patterns.items():
+        i = text.find(p)
+        while i >= 0:
+            out.add((i, i + len(p), key))
+            i = text.find(p, i + 1)
+    return out
+
+
+@pytest.mark.parametrize("find_max", [0, 1000])   # 0 — завжди автомат, 1000 — завжди str.find
+def test_matches_str_find(monkeypatch, find_max):
+    monkeypatch.setattr(aho_corasick, "AC_FIND_MAX", find_max)
+    rnd = random.Random(find_max)
+    alphabet = "абвгa b"
+    for _ in range(200):
+        patterns = {i: "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 4)))
+                    for i in range(rnd.randint(1, 12))}
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 60)))
+        ac = AhoCorasick()
+        for key, p in patterns.items():
+            ac.add(key, p)
+        got = list(ac.iter_matches(text))
+        assert set(got) == _naive(patterns, text)
+        assert [end for _, end, _ in got] == sorted(end for _, end, _ in got)
+
+
+def test_remove_rebuilds(monkeypatch):
+    monkeypatch.setattr(aho_corasick, "AC_FIND_MAX", 0)
+    ac = AhoCorasick()
+    ac.add("a", "реєстрація")
+    ac.add("b", "реєстр")
+    assert ac.find_keys("відкрито реєстрацію") == {"b"}
+    assert ac.remove("b")
+    assert not ac.remove("b")
+    assert ac.find_keys("відкрито реєстрацію") == set()
+    assert ac.find_keys("реєстрація триває") == {"a"}
@@ -0,0 +1,49 @@
+# tests/test_fuzzy.py
+# Смугова відстань з раннім виходом проти повного Левенштейна; відсікання не губить пари.
+import random
+
+from app.utils.fuzzy import bounded_levenshtein, prepare, ratio, score_prepared
+
+
+def _levenshtein(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def test_bounded_levenshtein_matches_naive():
+    rnd = random.Random(1)
+    for _ in range(2000):
+        a = "".join(rnd.choice("абв ") for _ in range(rnd.randint(0, 12)))
+        b = "".join(rnd.choice("абв ") for _ in range(rnd.randint(0, 12)))
+        k = rnd.randint(0, 8)
+        d = _levenshtein(a, b)
+        assert bounded_levenshtein(a, b, k) == (d if d <= k else k + 1), (a, b, k)
+
+
+def test_score_prepared_agrees_with_ratio():
+    rnd = random.Random(2)
+    base = "знижка на доставку сьогодні за посиланням у профілі"
+    for _ in range(300):
+        s = list(base)
+        for _ in range(rnd.randint(0, 12)):
+            i = rnd.randrange(len(s))
+            op = rnd.random()
+            if op < 0.4:
+                s[i] = rnd.choice("абвгд ")
+            elif op < 0.7:
+                del s[i]
+            else:
+                s.insert(i, rnd.choice("абвгд "))
+        text = "".join(s)
+        for thr in (70.0, 85.0, 95.0):
+            full = ratio(base, text)
+            sc = score_prepared(prepare(base), prepare(text), thr)
+            if full >= thr:
+                assert sc is not None and abs(sc - full) < 1e-9
+            else:
+                assert sc is None
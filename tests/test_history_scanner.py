@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from telethon.tl import types
+
+from app.services import history_scanner, rate_limiter
+from app.services.account_pool import ClientSlot
+
+PEER = types.InputPeerChannel(channel_id=1, access_hash=0)
+NOW = datetime.now(timezone.utc)
+
+
+class FakeHistory:
+    """GetHistory по списку id каналу: offset_id/min_id/limit — як у Telegram."""
+
+    def __init__(self, ids):
+        self.ids = sorted(ids, reverse=True)
+        self.calls = []
+
+    async def __call__(self, req):
+        self.calls.append((req.offset_id, req.min_id))
+        ids = [i for i in self.ids if (not req.offset_id or i < req.offset_id) and i > req.min_id]
+        msgs = [types.Message(id=i, peer_id=types.PeerChannel(1), date=NOW, message=str(i))
+                for i in ids[:req.limit]]
+        return types.messages.Messages(messages=msgs, topics=[], chats=[], users=[])
+
+
+@pytest.fixture
+def scanner(db, monkeypatch):
+    async def _acquire(*a, **k):
+        return 0.0
+    monkeypatch.setattr(rate_limiter, "acquire", _acquire)
+    monkeypatch.setattr(history_scanner, "SCAN_MAX_PAGES", 2)
+    monkeypatch.setattr(history_scanner, "SCAN_EDIT_LOOKBACK", 0)
+
+    def scan(client):
+        slot = ClientSlot("acc", client=SimpleNamespace())
+        slot.client = client
+        return asyncio.run(history_scanner.scan_channel(slot, PEER, page=10))
+    return scan
+
+
+def test_page_limit_resumes_below_offset(scanner):
+    history_scanner.save_cursor(1, "acc", 100, 100, 0)
+    client = FakeHistory(range(1, 161))
+    res = scanner(client)
+    assert [m.id for m in res.new] == list(range(160, 140, -1))
+    assert history_scanner.get_resume(1, "acc") == (141, 100, 100)
+
+    res = scanner(client)
+    assert client.calls[-2] == (141, 100)
+    assert [m.id for m in res.new] == list(range(140, 120, -1))
+
+    seen = set()
+    while history_scanner.get_resume(1, "acc"):
+        seen.update(m.id for m in scanner(client).new)
+    assert seen == set(range(101, 121))
+    assert history_scanner.get_cursor(1, "acc")[0] == 160
+
+
+def test_no_resume_when_window_fits(scanner):
+    history_scanner.save_cursor(1, "acc", 100, 100, 0)
+    res = scanner(FakeHistory(range(1, 111)))
+    assert [m.id for m in res.new] == list(range(110, 100, -1))
+    assert history_scanner.get_resume(1, "acc") is None
+    assert history_scanner.get_cursor(1, "acc")[:2] == (110, 110)
@@ -0,0 +1,133 @@
+# tests/test_job_scheduler.py
+import asyncio
+
+import pytest
+
+from app.services import job_scheduler
+from app.services.job_scheduler import Job, JobScheduler
+
+
+@pytest.fixture
+def sched(db, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "SCHED_JITTER", 0.0)
+    s = JobScheduler()
+    s._loaded = True
+    return s
+
+
+def _job(next_fire=100.0, interval=60.0, until=1000.0, cost=1, kind="t", ref=1):
+    return Job(f"{kind}:{ref}", kind, ref, interval, until, next_fire, cost)
+
+
+def test_advance_from_planned_time(sched):
+    job = _job(next_fire=100.0)
+    assert sched._advance(job, now=105.0)
+    assert job.next_fire == 160.0          # від запланованого, не від фактичного
+
+
+def test_advance_skips_missed_intervals(sched):
+    job = _job(next_fire=100.0)
+    assert sched._advance(job, now=290.0)
+    assert job.next_fire == 340.0          # 160/220/280 пропущені, не пачкою
+
+
+def test_advance_last_fire_at_window_end(sched):
+    job = _job(next_fire=950.0)
+    assert sched._advance(job, now=951.0)
+    assert job.next_fire == 1000.0
+    assert not sched._advance(job, now=1001.0)
+
+
+def test_jitter_does_not_accumulate(sched, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "SCHED_JITTER", 0.1)
+    monkeypatch.setattr(job_scheduler.random, "uniform", lambda a, b: b)   # завжди максимальний зсув
+    job = _job(next_fire=100.0, until=10 ** 6)
+    for _ in range(50):
+        assert sched._advance(job, now=job.next_fire)
+    assert job.planned == 100.0 + 50 * 60.0
+    assert job.next_fire == job.planned + 6.0      # зсув одного інтервалу, не 50-ти
+
+
+def test_planned_survives_reload(sched, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "SCHED_JITTER", 0.1)
+    job = sched.schedule("t", 1, 60.0, 10 ** 10, first_fire=10 ** 9)
+    sched._advance(job, now=10 ** 9)
+    sched._save([job])
+    other = JobScheduler()
+    other.load(now=0.0)
+    loaded = other.get(job.job_id)
+    assert (loaded.planned, loaded.next_fire) == (job.planned, job.next_fire)
+    assert loaded.planned == 10 ** 9 + 60.0
+
+
+def test_start_uses_running_loop(sched):
+    async def main():
+        task = sched.start()
+        assert sched.start() is task
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_pop_due_respects_budget(sched, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "SCHED_RPC_BUDGET", 5)
+    for ref, cost in enumerate((3, 3, 1), 1):
+        job = _job(next_fire=float(ref), cost=cost, ref=ref)
+        sched._jobs[job.job_id] = job
+        sched._push(job)
+    due = sched._pop_due(now=10.0)
+    assert [j.ref for j in due] == [1]     # друга (cost 3) вже не влазить — чекає тіку
+    assert sched.stats["deferred"] == 1
+    assert [j.ref for j in sched._pop_due(now=10.0)] == [2, 3]
+
+
+def test_pop_due_first_job_over_budget_still_runs(sched, monkeypatch):
+    monkeypatch.setattr(job_scheduler, "SCHED_RPC_BUDGET", 2)
+    job = _job(next_fire=1.0, cost=50)
+    sched._jobs[job.job_id] = job
+    sched._push(job)
+    assert sched._pop_due(now=10.0) == [job]
+
+
+def test_pop_due_skips_stale_running_and_future(sched):
+    a, b, c = _job(1.0, ref=1), _job(2.0, ref=2), _job(50.0, ref=3)
+    for j in (a, b, c):
+        sched._jobs[j.job_id] = j
+        sched._push(j)
+    sched._push(a)                          # старий запис a застарів (ver)
+    b.running = True
+    assert sched._pop_due(now=10.0) == [a]
+    assert sched._pop_due(now=10.0) == []
+
+
+def test_slow_handler_does_not_block_others(sched):
+    order = []
+    gate = asyncio.Event()
+
+    async def slow(job):
+        await gate.wait()
+        order.append("slow")
+
+    async def fast(job):
+        order.append("fast")
+        return False
+
+    sched.register("slow", slow)
+    sched.register("fast", fast)
+
+    async def main():
+        sched.schedule("slow", 1, 60.0, 10 ** 10, first_fire=0.0)
+        sched.schedule("fast", 1, 60.0, 10 ** 10, first_fire=0.0)
+        assert await sched.tick() == 2
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert order == ["fast"]
+        assert sched.get("fast:1") is None            # завершилась, не чекаючи slow
+        assert sched.get("slow:1").running
+        gate.set()
+        await sched.join()
+        job = sched.get("slow:1")
+        assert order == ["fast", "slow"] and not job.running and job.next_fire > 0
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+# tests/test_link_queue.py
+import pytest
+
+from app.services import link_queue
+from app.services.db.core import _conn
+
+
+@pytest.fixture
+def lq(db):
+    link_queue.init(db)
+    return link_queue
+
+
+def _state(item_id):
+    return _conn().execute("SELECT state, claim_owner FROM link_queue WHERE id=?", (item_id,)).fetchone()
+
+
+def test_enqueue_bulk_skips_active_duplicates(lq):
+    assert lq.enqueue_bulk(["a", "b", "a"], None, None, None, chunk=2) == (2, 1)
+    assert lq.enqueue_bulk(["b", "c"], None, None, None) == (1, 1)
+
+
+def test_enqueue_bulk_inside_open_transaction(lq):
+    c = _conn()
+    c.execute("UPDATE link_queue SET last_error='x' WHERE 0")   # неявна транзакція цього ж з'єднання
+    assert c.in_transaction
+    assert lq.enqueue_bulk(["a", "b"], "batch", 1, 2) == (2, 0)
+    assert not c.in_transaction
+    assert c.execute("SELECT COUNT(*) FROM link_queue WHERE state='queued'").fetchone()[0] == 2
+
+
+def test_claim_due_is_exclusive_and_ordered(lq):
+    lq.enqueue_bulk(["a", "b", "c"], None, None, None)
+    first = lq.claim_due("w1", limit=2)
+    second = lq.claim_due("w2", limit=5)
+    assert [r[1] for r in first] == ["a", "b"]
+    assert [r[1] for r in second] == ["c"]
+    assert lq.claim_due("w3", limit=5) == []
+    assert _state(first[0][0]) == ("processing", "w1")
+
+
+def test_claim_due_waits_for_next_try(lq):
+    lq.enqueue_bulk(["later"], None, None, None, delay_sec=3600)
+    assert lq.claim_due("w1", limit=5) == []
+
+
+def test_reap_expired_returns_stale_claims(lq):
+    lq.enqueue_bulk(["a", "b"], None, None, None)
+    stale, live = lq.claim_due("w1", limit=2, lease_sec=60)
+    with _conn() as c:
+        c.execute("UPDATE link_queue SET claim_until=0 WHERE id=?", (stale[0],))
+    assert lq.reap_expired() == 1
+    assert _state(stale[0]) == ("queued", None)
+    assert _state(live[0]) == ("processing", "w1")
+    # власник, що втратив оренду, вже не може її подовжити чи закрити
+    assert not lq.extend_claim(stale[0], "w1")
+    assert not lq.mark_done(stale[0], owner="w1")
+    assert lq.mark_done(live[0], owner="w1")
+    assert [r[0] for r in lq.claim_due("w2")] == [stale[0]]
+    assert lq.reap_expired() == 0
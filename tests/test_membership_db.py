@@ -0,0 +1,55 @@
+# tests/test_membership_db.py
+import sqlite3
+import time
+
+import pytest
+
+from app.services import membership_db
+
+
+@pytest.fixture
+def mdb(db, monkeypatch):
+    monkeypatch.setattr(membership_db, "MEMB_CACHE_CHECK", 0.0)
+    monkeypatch.setitem(membership_db._STATS, "invalidations", 0)
+    membership_db.init(db)
+    yield db
+    membership_db.cache_clear()
+
+
+def _other_process(path, sql, args):
+    # окреме з'єднання — так само бачить БД інший процес
+    c = sqlite3.connect(path)
+    with c:
+        c.execute(sql, args)
+    c.close()
+
+
+def test_cached_reads_are_read_only_copies(mdb):
+    membership_db.upsert_membership("a", 1, "joined")
+    view = membership_db.channels_many([1])[1]
+    view["b"] = "joined"
+    assert membership_db.get_membership("b", 1) is None
+    with pytest.raises(TypeError):
+        membership_db._channel(1)["b"] = "joined"
+
+
+def test_complete_cache_sees_other_process_writes(mdb):
+    assert membership_db._CHANNELS.complete and membership_db._URLS.complete
+    assert membership_db.any_final_for_channel(5) is None
+    assert membership_db.url_get("https://t.me/x") is None
+    _other_process(mdb, "INSERT INTO membership(channel_id, account, status, ts) VALUES (?,?,?,?)",
+                   (5, "acc", "joined", int(time.time())))
+    _other_process(mdb, "INSERT INTO url_cache(url, status, ts) VALUES (?,?,?)",
+                   ("https://t.me/x", "invalid", int(time.time())))
+    assert membership_db.any_final_for_channel(5) == "joined"
+    assert membership_db.channels_many([5]) == {5: {"acc": "joined"}}
+    assert membership_db.url_get("https://t.me/x") == "invalid"
+    assert membership_db.cache_stats()["invalidations"] == 1
+
+
+def test_own_writes_keep_cache(mdb):
+    membership_db.upsert_membership("a", 1, "joined")
+    membership_db.url_put("https://t.me/y", "already")
+    assert membership_db.get_membership("a", 1) == "joined"
+    assert membership_db.url_get("https://t.me/y") == "already"
+    assert membership_db.cache_stats()["invalidations"] == 0
@@ -0,0 +1,145 @@
+# tests/test_pipeline.py
+# process_links_pipeline на фейковому пулі: ensure_join/probe підмінено, membership —
+# словник у пам'яті, тож перевіряється лише логіка конвеєра (порядок, прогрес, ретраї, overflow).
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.flows.batch_links import pipeline
+from app.flows.batch_links.plan import PlannedLink
+from app.services import account_pool as ap
+
+
+class _Progress:
+    def __init__(self):
+        self.statuses = Counter()
+        self.actors = []
+
+    def add_status(self, status):
+        self.statuses[status] += 1
+
+    def set_current(self, url, actor=None):
+        self.actors.append((url, actor))
+
+
+@pytest.fixture
+def pool(db, monkeypatch):
+    made = []
+
+    def make(*names):
+        for n in names:
+            slot = ap.ClientSlot(name=n, client=SimpleNamespace())
+            made.append(slot)
+            ap._register_slot(slot)
+        return made
+
+    membership = {}
+    monkeypatch.setattr(pipeline, "get_membership", lambda who, cid: membership.get((who, cid)))
+    monkeypatch.setattr(pipeline, "upsert_membership", lambda who, cid, st: membership.__setitem__((who, cid), st))
+    monkeypatch.setattr(pipeline, "any_final_for_channel", lambda cid: None)
+    monkeypatch.setattr(pipeline, "url_put", lambda url, st: None)
+    monkeypatch.setattr(pipeline, "bump_cooldown", lambda slot, sec: None)
+
+    async def probe(client, url):
+        return None, None, None, None
+
+    monkeypatch.setattr(pipeline, "probe_channel_id", probe)
+    yield make
+    ap._POOL.clear()
+    ap._IN_POOL.clear()
+    ap._READY.clear()
+
+
+def _pending(urls):
+    return [PlannedLink(i, u, "public") for i, u in enumerate(urls, 1)]
+
+
+def _run(pending, progress, message=None):
+    results = [None] * len(pending)
+    message = message or SimpleNamespace(id=1, chat_id=10)
+    asyncio.run(pipeline.process_links_pipeline(message, pending, progress, results))
+    return results
+
+
+def test_results_keep_link_order(pool, monkeypatch):
+    pool("a", "b")
+    urls = [f"https://t.me/ch{i}" for i in range(6)]
+
+    async def ensure_join(client, url):
+        # пізніші лінки завершуються раніше
+        await asyncio.sleep(0.01 * (6 - int(url[-1])))
+        return "joined", "t", "public", None, None
+
+    monkeypatch.setattr(pipeline, "ensure_join", ensure_join)
+    progress = _Progress()
+    results = _run(_pending(urls), progress)
+    assert [r.split(" — ")[0] for r in results] == [f"{i}. {u}" for i, u in enumerate(urls, 1)]
+    assert progress.statuses == Counter(joined=6)
+
+
+def test_progress_counts_by_status(pool, monkeypatch):
+    pool("a")
+    outcome = {"u1": "joined", "u2": "already", "u3": "requested", "u4": "invalid", "u5": "private"}
+
+    async def ensure_join(client, url):
+        return outcome[url], None, "public", None, None
+
+    monkeypatch.setattr(pipeline, "ensure_join", ensure_join)
+    progress = _Progress()
+    _run(_pending(list(outcome)), progress)
+    assert progress.statuses == Counter(joined=1, already=2, invalid=2)
+
+
+def test_failed_account_is_excluded_and_link_requeued(pool, monkeypatch):
+    a, b = pool("a", "b")
+    calls = []
+
+    async def ensure_join(client, url):
+        who = "a" if client is a.client else "b"
+        calls.append(who)
+        return ("flood_wait_5" if who == "a" else "joined"), None, "public", None, None
+
+    monkeypatch.setattr(pipeline, "ensure_join", ensure_join)
+    progress = _Progress()
+    results = _run(_pending(["u1"]), progress)   # a — перший у купі (зареєстрований раніше)
+    assert calls == ["a", "b"]
+    assert "[b]" in results[0] and progress.statuses == Counter(joined=1)
+    assert a.next_ready > b.next_ready          # a спить на FLOOD_WAIT
+
+
+def test_all_accounts_failed_keeps_last_line(pool, monkeypatch):
+    pool("a", "b")
+
+    async def ensure_join(client, url):
+        return "blocked", None, "public", None, None
+
+    monkeypatch.setattr(pipeline, "ensure_join", ensure_join)
+    progress = _Progress()
+    results = _run(_pending(["u1"]), progress)
+    assert "🚫" in results[0]
+    assert progress.statuses == Counter(invalid=1)
+
+
+def test_overflow_goes_to_link_queue(pool, monkeypatch):
+    for slot in pool("a"):
+        ap._set_ready_after(slot, 3600)           # акаунт у кулдауні
+    monkeypatch.setattr(pipeline, "BATCH_LEASE_TIMEOUT", 0.05)
+    queued = []
+
+    async def enqueue(urls, batch_id, origin_chat, origin_msg):
+        queued.append((list(urls), batch_id, origin_chat, origin_msg))
+        return len(urls), 0
+
+    async def ensure_join(client, url):
+        raise AssertionError("no account should be leased")
+
+    monkeypatch.setattr(pipeline, "lq_enqueue", enqueue)
+    monkeypatch.setattr(pipeline, "ensure_join", ensure_join)
+    progress = _Progress()
+    results = _run(_pending(["u1", "u2"]), progress, SimpleNamespace(id=7, chat_id=70))
+    assert queued == [(["u1", "u2"], "batch:7", 70, 7)]
+    assert all("у черзі" in r for r in results)
+    assert progress.statuses == Counter(flood_wait=2)
+
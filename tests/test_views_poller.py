@@ -0,0 +1,60 @@
+# tests/test_views_poller.py
+# poll_views на фейковому пулі: GetMessagesViews підмінено (_poll_account), перевіряється
+# лише, які акаунти орендуються на час тіку.
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import account_pool as ap, monitor_db, views_poller
+
+
+@pytest.fixture
+def pool(db, monkeypatch):
+    def make(*names):
+        slots = [ap.ClientSlot(name=n, client=SimpleNamespace()) for n in names]
+        for s in slots:
+            ap._register_slot(s)
+        return slots
+
+    monkeypatch.setattr(views_poller, "channels_many", lambda cids: {cid: {} for cid in cids})
+    monkeypatch.setattr(monitor_db, "update_views_many", lambda rows: len(list(rows)))
+    monkeypatch.setattr(monitor_db, "mark_deleted_many", lambda ids: len(list(ids)))
+    yield make
+    ap._POOL.clear()
+    ap._IN_POOL.clear()
+    ap._READY.clear()
+
+
+def _posts(*channels):
+    return [monitor_db.FoundPost(i, 1, cid, 100 + i, None, 0, None) for i, cid in enumerate(channels, 1)]
+
+
+def _run(monkeypatch, posts, slots=None):
+    busy = {}
+
+    async def poll_account(slot, batches, res, samples, deleted):
+        busy[slot.name] = sorted(s.name for s in ap._POOL if s.busy)
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(views_poller, "_poll_account", poll_account)
+    monkeypatch.setattr(monitor_db, "found_posts", lambda ids=None: posts)
+    res = asyncio.run(views_poller.poll_views(slots=slots))
+    return res, busy
+
+
+def test_leases_only_assigned_slots(pool, monkeypatch):
+    slots = pool("a", "b", "c")
+    res, busy = _run(monkeypatch, _posts(7, 7))
+    assert list(busy) == ["a"]
+    assert busy["a"] == ["a"]
+    assert res.channels == 1 and res.skipped == 0
+    assert not any(s.busy for s in slots)
+
+
+def test_channels_of_taken_slot_go_to_held(pool, monkeypatch):
+    a, b = pool("a", "b")
+    a.busy = True
+    res, busy = _run(monkeypatch, _posts(7, 8), slots=[a, b])
+    assert list(busy) == ["b"]
+    assert res.skipped == 0
@@ -0,0 +1,73 @@
+# tests/test_views_series.py
+import pytest
+
+from app.services import views_series
+from app.services.monitor_db import VIEWS24_AFTER
+from app.services.views_series import _views24
+
+PUB = 1_000_000
+MARK = PUB + VIEWS24_AFTER
+
+
+def test_views24_before_mark():
+    assert _views24(PUB, None, MARK - 1, 100) is None
+
+
+def test_views24_without_published():
+    assert _views24(None, None, MARK + 10, 100) is None
+
+
+def test_views24_interpolates_across_mark():
+    prev = (MARK - 100, 1000)
+    assert _views24(PUB, prev, MARK + 100, 2000) == 1500
+
+
+def test_views24_only_first_point_after_mark():
+    assert _views24(PUB, (MARK, 1000), MARK + 60, 2000) is None
+
+
+def test_views24_first_point_ever_after_mark():
+    assert _views24(PUB, None, MARK + 3600, 700) == 700
+    assert _views24(PUB, (PUB - 10, 5), MARK + 3600, 700) == 700
+
+
+@pytest.fixture
+def series_db(db, monkeypatch):
+    monkeypatch.setattr(views_series, "SERIES_ROLLUP_EVERY", -1)   # rollup лише явно
+    monkeypatch.setattr(views_series, "SERIES_RAW_AGE", 2 * 3600.0)
+    monkeypatch.setattr(views_series, "SERIES_HOURLY_AGE", 2 * 86400.0)
+    return db
+
+
+def test_record_many_reports_views24_once(series_db):
+    assert views_series.record_many([(1, PUB, MARK - 100, 1000)]) == {}
+    assert views_series.record_many([(1, PUB, MARK + 100, 2000)]) == {1: 1500}
+    assert views_series.record_many([(1, PUB, MARK + 200, 2100)]) == {}
+    # точка не новіша за останню — ігнорується
+    views_series.record_many([(1, PUB, MARK - 50, 1)])
+    assert [ts for ts, _ in views_series.series(1)] == [MARK - 100, MARK + 100, MARK + 200]
+
+
+def test_rollup_keeps_last_point_per_bucket(series_db):
+    now = 10 * 86400
+    day = now - 5 * 86400                  # старше SERIES_HOURLY_AGE — по одній на добу
+    hour = now - 10 * 3600                 # старше SERIES_RAW_AGE — по одній на годину
+    hour -= hour % 3600
+    raw = now - 600                        # свіжі — не чіпаємо
+    day -= day % 86400
+    points = [(1, None, ts, v) for v, ts in enumerate(
+        [day + 60, day + 7200, day + 40000,
+         hour + 10, hour + 1200, hour + 3000,
+         raw, raw + 60, raw + 120])]
+    views_series.record_many(points)
+    removed = views_series.rollup(now)
+    assert removed == 4
+    assert [ts for ts, _ in views_series.series(1)] == [day + 40000, hour + 3000, raw, raw + 60, raw + 120]
+    assert views_series.rollup(now) == 0
+
+
+def test_views_at_interpolates(series_db):
+    views_series.record_many([(1, None, 100, 10), (1, None, 200, 30)])
+    assert views_series.views_at(1, 50) is None
+    assert views_series.views_at(1, 150) == 20
+    assert views_series.views_at(1, 500) == 30